@@ -0,0 +1,84 @@
+"""Synthetic relations for the benchmarks
+
+Relations are generated from a seed, so the same parameters always
+give the same relation. The first attribute of every relation is a
+key numbering the tuples, which keeps the cardinality exact in spite
+of set semantics. The remaining attributes draw their values from a
+Zipf distribution, where a skew of 0 is uniform and larger skews make
+a few values ever more common.
+"""
+import bisect
+import itertools
+import random
+
+import rel.relation as r
+
+
+def _zipf(rng, distinct, skew):
+    # Returns a function drawing values from 0 up to distinct - 1.
+    if skew == 0:
+        return lambda: rng.randrange(distinct)
+
+    weights = [1.0 / (rank ** skew) for rank in range(1, distinct + 1)]
+    cumulative = list(itertools.accumulate(weights))
+    total = cumulative[-1]
+    return lambda: bisect.bisect_left(cumulative, rng.random() * total)
+
+
+def names(prefix, order):
+    return ["{0}{1}".format(prefix, i) for i in range(order)]
+
+
+def relation(cardinality, order, skew=0.0, distinct=None, seed=0, prefix="a"):
+    """A relation of integers with the given cardinality and order
+
+    The values of every attribute but the first are drawn from distinct
+    values, by default a tenth of the cardinality.
+
+    """
+    rng = random.Random(seed)
+    distinct = distinct or max(1, cardinality // 10)
+    draw = _zipf(rng, distinct, skew)
+    attribute_names = names(prefix, order)
+
+    tuples = [dict(zip(attribute_names,
+                       [i] + [draw() for _ in range(order - 1)]))
+              for i in range(cardinality)]
+    return r.Relation([(int, name) for name in attribute_names], tuples)
+
+
+def pair(cardinality, order, overlap, skew=0.0, seed=0):
+    """Two relations sharing a join attribute k
+
+    The overlap is the fraction of the tuples on the right whose value
+    of k is found on the left. Values of k on the left are drawn with
+    the given skew, and the rest of the attributes are distinct
+    between the two sides.
+
+    """
+    rng = random.Random(seed)
+    distinct = max(1, cardinality // 10)
+    draw = _zipf(rng, distinct, skew)
+
+    left_names = ["k"] + names("l", max(1, order - 1))
+    right_names = ["k"] + names("r", max(1, order - 1))
+
+    left = [dict(zip(left_names,
+                     [draw(), i] + [rng.randrange(distinct)
+                                    for _ in range(len(left_names) - 2)]))
+            for i in range(cardinality)]
+    keys = sorted(set(t["k"] for t in left))
+
+    right = []
+    for i in range(cardinality):
+        if rng.random() < overlap:
+            k = rng.choice(keys)
+        else:
+            # Keys outside the range used on the left never match.
+            k = distinct + rng.randrange(distinct)
+        right.append(dict(zip(right_names,
+                              [k, i] + [rng.randrange(distinct)
+                                        for _ in range(len(right_names) - 2)])))
+
+    return (r.Relation([(int, name) for name in left_names], left),
+            r.Relation([(int, name) for name in right_names], right))
@@ -0,0 +1,223 @@
+"""Benchmarks of the relational operators
+
+Runs every operator over synthetic relations for each combination of
+the parameters given on the command line, and reports the throughput,
+in input tuples per second, and the peak memory allocated by the
+operator. Timings are the best of a number of repeats, while memory
+is traced in a separate run as tracing slows everything down.
+
+The results are compared against a baseline file, and any case whose
+throughput dropped or whose memory grew by more than the tolerance is
+reported as a regression, making the script exit with a non-zero
+status. The baseline is updated by running with --save.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 1000,10000 --skews 0,1.5 --save
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+import sympy
+
+from benchmarks import generators
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "baseline.json")
+
+
+# Each benchmark takes the parameters of a case and returns the
+# number of input tuples along with a function running the operator.
+
+def bench_project(n, order, skew, overlap):
+    rel = generators.relation(n, order, skew)
+    names = generators.names("a", order)[1:]
+    return n, lambda: rel.project(names)
+
+
+def bench_select_callable(n, order, skew, overlap):
+    rel = generators.relation(n, order, skew)
+    limit = n // 20
+    return n, lambda: rel.select(lambda t: t["a1"] < limit)
+
+
+def bench_select_sympy(n, order, skew, overlap):
+    rel = generators.relation(n, order, skew)
+    expr = sympy.Symbol("a1") < n // 20
+    return n, lambda: rel.select(expr)
+
+
+def bench_rename(n, order, skew, overlap):
+    rel = generators.relation(n, order, skew)
+    mapping = dict((name, "b" + name[1:])
+                   for name in generators.names("a", order))
+    return n, lambda: rel.rename(mapping)
+
+
+def bench_product(n, order, skew, overlap):
+    # Both sides are kept at the square root of the cardinality so that
+    # the product has about as many tuples as the other cases.
+    side = max(1, math.isqrt(n))
+    left = generators.relation(side, order, skew, prefix="a")
+    right = generators.relation(side, order, skew, seed=1, prefix="b")
+    return side * side, lambda: left.product(right)
+
+
+def bench_join(n, order, skew, overlap):
+    left, right = generators.pair(n, order, overlap, skew)
+    return 2 * n, lambda: left.join(right)
+
+
+def bench_equi_join(n, order, skew, overlap):
+    left, right = generators.pair(n, order, overlap, skew)
+    right = right.rename({"k": "j"})
+    return 2 * n, lambda: left.equi_join(right, [("k", "j")])
+
+
+def bench_candidate_keys(n, order, skew, overlap):
+    rel = generators.relation(n, order, skew)
+    return n, lambda: list(rel.candidate_keys)
+
+
+benchmarks = [
+    ("project", bench_project),
+    ("select_callable", bench_select_callable),
+    ("select_sympy", bench_select_sympy),
+    ("rename", bench_rename),
+    ("product", bench_product),
+    ("join", bench_join),
+    ("equi_join", bench_equi_join),
+    ("candidate_keys", bench_candidate_keys),
+]
+
+
+def measure(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def case_name(operator, n, order, skew, overlap):
+    name = "{0}/n={1}/order={2}/skew={3}".format(operator, n, order, skew)
+    if overlap is not None:
+        name += "/overlap={0}".format(overlap)
+    return name
+
+
+def run(sizes, orders, skews, overlaps, operators, repeat):
+    results = {}
+    for (operator, bench) in benchmarks:
+        if operators and operator not in operators:
+            continue
+        for n in sizes:
+            for order in orders:
+                for skew in skews:
+                    # Only joins depend on the overlap of the keys.
+                    for overlap in (overlaps if "join" in operator else [None]):
+                        count, fn = bench(n, order, skew, overlap)
+                        seconds, peak = measure(fn, repeat)
+                        name = case_name(operator, n, order, skew, overlap)
+                        results[name] = {
+                            "seconds": seconds,
+                            "throughput": count / seconds if seconds else float("inf"),
+                            "peak": peak,
+                        }
+                        report(name, results[name])
+    return results
+
+
+def report(name, result, baseline=None):
+    line = "{0:<60} {1:>14,.0f} tuples/s {2:>12,} bytes".format(
+        name, result["throughput"], result["peak"])
+    if baseline is not None:
+        line += "  {0:>+7.1%} {1:>+7.1%}".format(
+            result["throughput"] / baseline["throughput"] - 1,
+            result["peak"] / max(1, baseline["peak"]) - 1)
+    print(line)
+
+
+def compare(results, baseline, tolerance):
+    """Returns the names of the cases which regressed"""
+    print()
+    print("Compared to the baseline (throughput, peak memory):")
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        result, base = results[name], baseline[name]
+        report(name, result, base)
+        if (result["throughput"] < base["throughput"] * (1 - tolerance) or
+                result["peak"] > base["peak"] * (1 + tolerance)):
+            regressions.append(name)
+    return regressions
+
+
+def _list(convert):
+    return lambda text: [convert(part) for part in text.split(",") if part]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=_list(int), default=[1000, 10000])
+    parser.add_argument("--orders", type=_list(int), default=[3])
+    parser.add_argument("--skews", type=_list(float), default=[0.0, 1.2])
+    parser.add_argument("--overlaps", type=_list(float), default=[0.1, 0.9])
+    parser.add_argument("--operators", type=_list(str), default=[],
+                        help="only run these operators")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="the relative change reported as a regression")
+    parser.add_argument("--save", action="store_true",
+                        help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.orders, args.skews, args.overlaps,
+                  args.operators, args.repeat)
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print()
+        print("Regressions:")
+        for name in regressions:
+            print("  " + name)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
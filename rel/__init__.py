@@ -1,4 +1,4 @@
 """Relational experiments library"""
 
 from rel.relation import Relation, Dee, Doe
-from rel.structure import MappingTuple, values
\ No newline at end of file
+from rel.structure import MappingTuple, PositionalTuple, values, compact_values
@@ -0,0 +1,149 @@
+"""Aggregates for summarizing relations
+
+An aggregate reduces the tuples of a group to a single value. Each
+aggregate keeps a state per group which is updated with every tuple
+of the group, and finally turned into the value of the aggregate. As
+all the aggregates of a summary are updated together, the relation is
+only scanned once no matter how many aggregates are computed.
+"""
+
+
+def _common_type(values, default):
+    # The most specific type all the values are instances of.
+    types = set(type(v) for v in values)
+    if len(types) == 0:
+        return default
+    if len(types) == 1:
+        return types.pop()
+
+    for candidate in type(values[0]).__mro__:
+        if all(issubclass(t, candidate) for t in types):
+            return candidate
+    return object
+
+
+class Aggregate(object):
+    """Base class of the aggregates
+
+    The name is the attribute being aggregated, which is ignored by
+    aggregates such as Count working on whole tuples.
+    """
+
+    # The kind of reduction, used for picking vectorized
+    # implementations. Custom reducers have none.
+    vectorized = None
+
+    def __init__(self, name=None):
+        self.name = name
+
+    def initial(self):
+        raise NotImplementedError
+
+    def step(self, state, t):
+        raise NotImplementedError
+
+    def final(self, state):
+        return state
+
+    def domain(self, attribute, values):
+        # The domain of the result, given the attribute being
+        # aggregated and the values computed for all the groups.
+        default = attribute.type if attribute is not None else object
+        return _common_type(values, default)
+
+    def __repr__(self):
+        return "{0}({1})".format(type(self).__name__,
+                                 "" if self.name is None else repr(self.name))
+
+
+class Count(Aggregate):
+    vectorized = "count"
+
+    def initial(self):
+        return 0
+
+    def step(self, state, t):
+        return state + 1
+
+    def domain(self, attribute, values):
+        return int
+
+
+class Sum(Aggregate):
+    vectorized = "sum"
+
+    def initial(self):
+        return 0
+
+    def step(self, state, t):
+        return state + t[self.name]
+
+
+class Min(Aggregate):
+    vectorized = "min"
+
+    def initial(self):
+        return None
+
+    def step(self, state, t):
+        v = t[self.name]
+        return v if state is None or v < state else state
+
+    def domain(self, attribute, values):
+        return attribute.type
+
+
+class Max(Aggregate):
+    vectorized = "max"
+
+    def initial(self):
+        return None
+
+    def step(self, state, t):
+        v = t[self.name]
+        return v if state is None or v > state else state
+
+    def domain(self, attribute, values):
+        return attribute.type
+
+
+class Avg(Aggregate):
+    vectorized = "avg"
+
+    def initial(self):
+        return (0, 0)
+
+    def step(self, state, t):
+        return (state[0] + t[self.name], state[1] + 1)
+
+    def final(self, state):
+        return state[0] / state[1]
+
+    def domain(self, attribute, values):
+        return _common_type(values, float)
+
+
+class Reduce(Aggregate):
+    """A custom aggregate folding a function over the values
+
+    The function is called with the state so far and the next value,
+    starting from the initial value. Unless a domain is given it is
+    inferred from the results.
+    """
+
+    def __init__(self, name, function, initial, domain=None):
+        Aggregate.__init__(self, name)
+        self.function = function
+        self._initial = initial
+        self._domain = domain
+
+    def initial(self):
+        return self._initial
+
+    def step(self, state, t):
+        return self.function(state, t[self.name])
+
+    def domain(self, attribute, values):
+        if self._domain is not None:
+            return self._domain
+        return _common_type(values, object)
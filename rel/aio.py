@@ -0,0 +1,305 @@
+"""Building and consuming relations from asyncio code
+
+Rows arriving from asynchronous sources, such as message consumers or
+database cursors, can be collected into a relation without first
+buffering them all, and without blocking the event loop while they
+are validated. Tuples are validated a chunk at the time, and control
+is handed back to the event loop between chunks.
+
+An async stream is the asynchronous counterpart of a stream relation.
+Selections, projections, renames and hash joins against an ordinary
+relation are applied one tuple at the time as the tuples arrive, so a
+pipeline interleaves with whatever other I/O the loop is doing. Tuples
+are only pulled from the source when the consumer asks for them, which
+keeps a slow consumer from being flooded by a fast source.
+"""
+import asyncio
+import collections
+
+from rel.predicate import as_function
+from rel.relation import Relation
+from rel.stream import iter_tuples
+from rel.structure import MappingTuple
+
+
+# The number of tuples handled between handing control back to the
+# event loop.
+CHUNK = 1024
+
+# The number of tuples a builder accepts ahead of validating them
+# before producers have to wait.
+MAX_PENDING = 4 * CHUNK
+
+
+async def _iterate(source, chunk=CHUNK):
+    # Iterates over an iterable or an async iterable, yielding to the
+    # event loop after every chunk of tuples.
+    count = 0
+    if hasattr(source, "__aiter__"):
+        async for t in source:
+            yield t
+            count += 1
+            if count % chunk == 0:
+                await asyncio.sleep(0)
+    else:
+        for t in source:
+            yield t
+            count += 1
+            if count % chunk == 0:
+                await asyncio.sleep(0)
+
+
+async def _mapping_tuples(tuples):
+    # Tuples from untrusted sources may be plain mappings.
+    async for t in tuples:
+        yield t if isinstance(t, MappingTuple) else MappingTuple(t)
+
+
+async def aiter_tuples(relation, chunk=CHUNK):
+    """Iterates over the tuples of a relation from a coroutine
+
+    Lazy relations are evaluated as they are iterated over, and the
+    event loop gets to run other tasks after every chunk of tuples.
+
+    """
+    async for t in _iterate(iter_tuples(relation), chunk):
+        yield t
+
+
+class _Chunks(object):
+    # Validates tuples a chunk at the time, by building a relation
+    # from each chunk, and collects the validated tuples.
+
+    def __init__(self, attributes):
+        self.attributes = attributes
+        self.tuples = set()
+        self.pending = []
+
+    def add(self, t):
+        self.pending.append(t)
+
+    def flush(self):
+        if self.pending:
+            self.tuples |= Relation(self.attributes, self.pending).tuples
+            self.pending = []
+
+    def relation(self):
+        self.flush()
+        return Relation._trusted(self.attributes, self.tuples)
+
+
+async def build(attributes, source, chunk=CHUNK):
+    """Builds a relation from an iterable or an async iterable
+
+    The tuples are validated as they arrive, and invalid tuples raise
+    the same exceptions as they would when passed to Relation. The
+    source is only read as fast as the tuples can be validated.
+
+    """
+    chunks = _Chunks(list(Relation._parse_attr(attributes)))
+    async for t in _iterate(source, chunk):
+        chunks.add(t)
+        if len(chunks.pending) >= chunk:
+            chunks.flush()
+    return chunks.relation()
+
+
+class Builder(object):
+    """Collects tuples pushed by producers into a relation
+
+    Producers put tuples into the builder while it validates them in
+    the background. Once more than max_pending tuples are waiting to
+    be validated, putting another tuple waits until there is room. The
+    builder is used as an async context manager, and the relation is
+    available once the block has been left:
+
+        async with Builder(attributes) as builder:
+            async for row in consumer:
+                await builder.put(row)
+        relation = builder.relation
+
+    """
+
+    def __init__(self, attributes, chunk=CHUNK, max_pending=MAX_PENDING):
+        self._attributes = list(Relation._parse_attr(attributes))
+        self._chunk = chunk
+        self._queue = asyncio.Queue(max_pending)
+        self._task = None
+        self._done = object()
+        self._error = None
+        self.relation = None
+
+    async def __aenter__(self):
+        self._task = asyncio.ensure_future(self._collect())
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            # The collecting task is waited for, so that it is done
+            # with the queue by the time the block is left.
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            return False
+        await self._queue.put(self._done)
+        self.relation = await self._task
+        return False
+
+    async def put(self, t):
+        """Adds a tuple, waiting while too many are pending"""
+        if self._error is not None:
+            raise self._error
+        await self._queue.put(t)
+
+    async def _collect(self):
+        chunks = _Chunks(self._attributes)
+        while True:
+            t = await self._queue.get()
+            if t is self._done:
+                if self._error is not None:
+                    raise self._error
+                return chunks.relation()
+            if self._error is not None:
+                continue
+            chunks.add(t)
+            if len(chunks.pending) >= self._chunk:
+                try:
+                    chunks.flush()
+                except Exception as e:
+                    # The queue is still drained, so that producers
+                    # waiting for room find out about the error on
+                    # their next put rather than waiting forever.
+                    self._error = e
+                await asyncio.sleep(0)
+
+
+class AsyncStream(object):
+    """A relation whose tuples arrive asynchronously
+
+    The source is a function returning a fresh iterator or async
+    iterator over the tuples, called every time the stream is iterated
+    over. Like stream relations, async streams may contain duplicates
+    until they are materialized. Tuples from untrusted sources are
+    validated when the stream is materialized.
+
+    """
+
+    def __init__(self, attributes, source, chunk=CHUNK, trusted=False):
+        self._attributes = set(Relation._parse_attr(attributes))
+        self._source = source
+        self._chunk = chunk
+        self._trusted = trusted
+
+    @classmethod
+    def from_relation(cls, relation, chunk=CHUNK):
+        """Streams the tuples of a relation, lazy or not"""
+        return cls(relation.attributes, lambda: iter_tuples(relation), chunk,
+                   trusted=True)
+
+    @property
+    def attributes(self):
+        return self._attributes
+
+    @property
+    def attribute_names(self):
+        return [attr.name for attr in self._attributes]
+
+    @property
+    def order(self):
+        return len(self._attributes)
+
+    def __aiter__(self):
+        tuples = _iterate(self._source(), self._chunk)
+        if self._trusted:
+            return tuples.__aiter__()
+        return _mapping_tuples(tuples).__aiter__()
+
+    def __repr__(self):
+        return "AsyncStream({0})".format(repr(self._attributes))
+
+    def _stage(self, attributes, stage, trusted=None):
+        if trusted is None:
+            trusted = self._trusted
+        return AsyncStream(attributes, lambda: stage(self.__aiter__()),
+                           self._chunk, trusted)
+
+    def select(self, expr):
+        predicate = as_function(expr, self._attributes)
+
+        async def stage(tuples):
+            async for t in tuples:
+                if predicate(t):
+                    yield t
+        return self._stage(self._attributes, stage)
+
+    def project(self, attribute_names):
+        names = set(attribute_names)
+        attr = set(a for a in self._attributes if a.name in names)
+
+        async def stage(tuples):
+            async for t in tuples:
+                yield t.project(names)
+        return self._stage(attr, stage)
+
+    def rename(self, mapping):
+        mapping = dict(mapping)
+        attr = set(a.rename(mapping.get(a.name, a.name))
+                   for a in self._attributes)
+
+        async def stage(tuples):
+            async for t in tuples:
+                yield t.rename(mapping)
+        return self._stage(attr, stage)
+
+    def distinct(self):
+        """Removes duplicates from the stream"""
+        async def stage(tuples):
+            seen = set()
+            async for t in tuples:
+                if t not in seen:
+                    seen.add(t)
+                    yield t
+        return self._stage(self._attributes, stage)
+
+    def join(self, other):
+        """Naturally joins the stream with an ordinary relation
+
+        The relation is hashed on the attributes in common once, after
+        which each tuple of the stream probes the hash table as it
+        arrives.
+
+        """
+        common = self._attributes & other.attributes
+        names = sorted(attr.name for attr in common)
+        attributes = self._attributes | other.attributes
+
+        chunk = self._chunk
+
+        def key(t):
+            return tuple(t[name] for name in names)
+
+        async def stage(tuples):
+            # The table is built a chunk at a time, handing control
+            # back to the event loop in between.
+            table = collections.defaultdict(list)
+            async for t in _iterate(iter_tuples(other), chunk):
+                table[key(t)].append(t)
+            async for t in tuples:
+                for match in table.get(key(t), ()):
+                    yield t.union(match)
+
+        # Attributes sharing a name but not a domain leave tuples which
+        # have to be validated.
+        unique = len(set(attr.name for attr in attributes)) == len(attributes)
+        return self._stage(attributes, stage, self._trusted and unique)
+
+    async def materialize(self):
+        """Reads the whole stream into an ordinary relation"""
+        if not self._trusted:
+            return await build(self._attributes, self, self._chunk)
+        tuples = set()
+        async for t in self:
+            tuples.add(t)
+        return Relation._trusted(self._attributes, tuples)
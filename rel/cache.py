@@ -0,0 +1,183 @@
+"""Caching the results of relational operators
+
+Relations never change, so an operator applied to the same relations
+with the same arguments always gives the same result. The cache keeps
+results keyed by the operator, the arguments and the fingerprints of
+the relations involved, and hands out the earlier result when the
+same call is made again.
+
+The cache is bounded by an estimate of the memory taken by the
+results it holds, evicting the least recently used results once it
+grows beyond it. Arguments which can't be hashed make the call bypass
+the cache, and functions passed as predicates only match themselves,
+not other functions doing the same thing.
+
+Caching is opt-in. Either call operators through a cache explicitly,
+
+    cache = ResultCache()
+    cache.call(relation, "project", ["a", "b"])
+
+or enable it for every operator of every relation:
+
+    rel.cache.enable()
+"""
+import collections
+import functools
+import sys
+
+from rel import operators
+from rel.relation import Relation
+
+
+# The default bound on the estimated size of the cached results.
+MAX_BYTES = 64 * 2 ** 20
+
+
+CacheStats = collections.namedtuple(
+    "CacheStats", ["hits", "misses", "bypasses", "evictions", "entries", "bytes"])
+
+
+def _key(value, relations):
+    # Turns an argument into something hashable, replacing relations
+    # by their fingerprints. Raises TypeError for arguments which
+    # can't be hashed.
+    if isinstance(value, Relation):
+        relations.append(value)
+        return ("relation", value.fingerprint)
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,
+                tuple(_key(v, relations) for v in value))
+    if isinstance(value, dict):
+        return ("dict", frozenset((k, _key(v, relations))
+                                  for (k, v) in value.items()))
+    if isinstance(value, set):
+        return ("set", frozenset(_key(v, relations) for v in value))
+    hash(value)
+    return value
+
+
+def estimate_size(relation):
+    """A rough estimate of the memory taken by a relation in bytes"""
+    size = sys.getsizeof(relation.tuples)
+    for t in relation.tuples:
+        # Tuples of a relation are much alike, so the first one is
+        # taken to be representative.
+        per_tuple = sys.getsizeof(t) + sum(sys.getsizeof(v) for v in t.values())
+        return size + per_tuple * relation.cardinality
+    return size
+
+
+class _Entry(object):
+    __slots__ = ("result", "relations", "size")
+
+    def __init__(self, result, relations, size):
+        self.result = result
+        self.relations = relations
+        self.size = size
+
+
+class ResultCache(object):
+    """A least recently used cache of the results of operators"""
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._hits = self._misses = self._bypasses = self._evictions = 0
+
+    @property
+    def stats(self):
+        return CacheStats(self._hits, self._misses, self._bypasses,
+                          self._evictions, len(self._entries), self._bytes)
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _same(self, relations, entry):
+        # Fingerprints can collide, so the relations are compared
+        # before handing out a result. Comparing is cheap for the
+        # common case of the very same relations.
+        return all(a is b or a == b
+                   for (a, b) in zip(relations, entry.relations))
+
+    def call(self, relation, operator, *args, **kwargs):
+        """Applies an operator to a relation, reusing earlier results"""
+        compute = functools.partial(getattr(type(relation), operator),
+                                    relation, *args, **kwargs)
+        return self._call(compute, operator, relation, args, kwargs)
+
+    def _call(self, compute, operator, relation, args, kwargs):
+        relations = []
+        try:
+            key = (operator, _key(relation, relations), _key(args, relations),
+                   _key(kwargs, relations))
+        except TypeError:
+            self._bypasses += 1
+            return compute()
+
+        entry = self._entries.get(key)
+        if entry is not None and self._same(relations, entry):
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.result
+
+        self._misses += 1
+        result = compute()
+        if isinstance(result, Relation):
+            self._store(key, _Entry(result, relations, estimate_size(result)))
+        return result
+
+    def _store(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self._evictions += 1
+
+
+default = ResultCache()
+
+
+def _wrap(name, cache, fn):
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        compute = functools.partial(fn, self, *args, **kwargs)
+        return cache._call(compute, name, self, args, kwargs)
+    return wrapper
+
+
+def enable(cache=None):
+    """Caches the results of the operators of every relation
+
+    The default cache is used unless another is given. Caching can be
+    enabled and disabled independently of instrumentation.
+
+    """
+    # An empty cache is falsy, as it has no entries.
+    if cache is None:
+        cache = default
+    operators.install(__name__, dict(
+        (name, functools.partial(_wrap, name, cache))
+        for name in operators.OPERATORS))
+    return cache
+
+
+def disable():
+    """Stops caching, restoring the operators"""
+    operators.uninstall(__name__)
+
+
+def enabled():
+    return operators.installed(__name__)
@@ -0,0 +1,323 @@
+"""Columnar storage of relations
+
+A columnar relation keeps one numpy array for each attribute rather
+than a set of mapping tuples. Attributes with a numeric domain are
+stored in typed arrays, while everything else falls back to arrays of
+Python objects. Conversion between the two forms is explicit and
+lossless, so a columnar relation can always be turned back into an
+ordinary relation.
+"""
+import numpy
+
+from rel import predicate
+from rel.relation import Attribute, Relation, Dee, Doe
+from rel.structure import MappingTuple
+
+# Domains that have a typed numpy counterpart. Any other domain is
+# stored as Python objects.
+_dtypes = {
+    bool: numpy.bool_,
+    int: numpy.int64,
+    float: numpy.float64,
+    complex: numpy.complex128,
+}
+
+# The Python types of the values in arrays of each kind of dtype.
+_scalar_types = {
+    "b": bool,
+    "i": int,
+    "f": float,
+    "c": complex,
+}
+
+
+def _to_array(values, domain):
+    dtype = _dtypes.get(domain)
+
+    # A typed array is only used if every value is exactly of the
+    # domain type, storing a subclass (such as a bool in an integer
+    # attribute) as its base type would lose information.
+    if dtype is not None and all(type(v) is domain for v in values):
+        try:
+            return numpy.array(values, dtype=dtype)
+        except OverflowError:
+            # Python integers are unbounded whereas int64 is not.
+            pass
+
+    # Values are assigned one at the time so that numpy doesn't try
+    # to unpack values which happen to be sequences.
+    column = numpy.empty(len(values), dtype=object)
+    for (i, v) in enumerate(values):
+        column[i] = v
+    return column
+
+
+def _codes(column):
+    # Replaces each value in a column with a small integer, such
+    # that two values get the same code if and only if they are
+    # equal.
+    if column.dtype != object:
+        return numpy.unique(column, return_inverse=True)[1].reshape(-1)
+
+    table = {}
+    return numpy.fromiter((table.setdefault(v, len(table)) for v in column),
+                          dtype=numpy.int64, count=len(column))
+
+
+def _unique_rows(columns, length):
+    # Returns the indices of the first occurrence of each distinct
+    # row in the order they occur.
+    if len(columns) == 0:
+        return numpy.arange(min(length, 1))
+
+    codes = numpy.column_stack([_codes(column) for column in columns])
+    first = numpy.unique(codes, axis=0, return_index=True)[1]
+    return numpy.sort(first)
+
+
+class ColumnarRelation(object):
+    """A relation stored as one numpy array per attribute"""
+
+    def __init__(self, attributes, columns, length, unique=False):
+        self._attributes = set(attributes)
+        self._attributes_by_name = dict((attr.name, attr)
+                                        for attr in self._attributes)
+        self._columns = dict(columns)
+        self._length = length
+
+        # Set semantics are enforced by removing duplicate rows,
+        # unless the caller already knows that they are distinct.
+        if not unique:
+            names = sorted(self._columns)
+            keep = _unique_rows([self._columns[n] for n in names], length)
+            if len(keep) != length:
+                self._columns = dict((n, c[keep])
+                                     for (n, c) in self._columns.items())
+                self._length = len(keep)
+
+    @classmethod
+    def from_relation(cls, relation):
+        attributes = set(relation.attributes)
+        names = sorted(attr.name for attr in attributes)
+        rows = [tuple(t[name] for name in names) for t in relation.tuples]
+
+        columns = {}
+        for (i, name) in enumerate(names):
+            domain = relation.attribute(name).type
+            columns[name] = _to_array([row[i] for row in rows], domain)
+
+        return cls(attributes, columns, len(rows), unique=True)
+
+    def to_relation(self):
+        if self.order == 0:
+            return Dee if self._length > 0 else Doe
+        return Relation(self._attributes, self._rows())
+
+    def _rows(self):
+        names = sorted(self._columns)
+        # tolist turns numpy scalars back into their Python
+        # counterparts.
+        columns = [self._columns[name].tolist() for name in names]
+        for row in zip(*columns):
+            yield MappingTuple(tuple(zip(names, row)))
+
+    @property
+    def tuples(self):
+        return set(self._rows())
+
+    @property
+    def attributes(self):
+        return self._attributes
+
+    @property
+    def attribute_names(self):
+        return [attr.name for attr in self._attributes]
+
+    def attribute(self, name):
+        return self._attributes_by_name.get(name)
+
+    def column(self, name):
+        return self._columns[name]
+
+    @property
+    def cardinality(self):
+        return self._length
+
+    @property
+    def order(self):
+        return len(self._attributes)
+
+    def __len__(self):
+        return self.cardinality
+
+    def __eq__(self, other):
+        return (
+            self.attributes == other.attributes and
+            self.tuples == other.tuples
+        )
+
+    def __repr__(self):
+        return "ColumnarRelation({0}, {1})".format(repr(self._attributes),
+                                                   self._length)
+
+    @property
+    def candidate_keys(self):
+        return self.to_relation().candidate_keys
+
+    def _take(self, attributes, indices, unique=True):
+        columns = dict((attr.name, self._columns[attr.name][indices])
+                       for attr in attributes)
+        return ColumnarRelation(attributes, columns, len(indices),
+                                unique=unique)
+
+    def project(self, attribute_names):
+        if len(attribute_names) == 0:
+            return Doe if self.cardinality == 0 else Dee
+
+        attr = set(self.attribute(name) for name in attribute_names)
+        columns = dict((a.name, self._columns[a.name]) for a in attr)
+        return ColumnarRelation(attr, columns, self._length)
+
+    def select(self, expr):
+        if predicate.is_tautology(expr):
+            return self
+        elif predicate.is_contradiction(expr):
+            return self._take(self._attributes, numpy.arange(0))
+        elif callable(expr):
+            mask = numpy.fromiter((bool(expr(t)) for t in self._rows()),
+                                  dtype=bool, count=self._length)
+        elif predicate.is_expression(expr):
+            compiled = predicate.compile_columns(expr, self._attributes)
+            mask = None
+            if compiled is not None:
+                mask = compiled(self._columns, self._length)
+            if mask is None:
+                compiled = predicate.compile_predicate(expr, self._attributes)
+                mask = numpy.fromiter((bool(compiled(t)) for t in self._rows()),
+                                      dtype=bool, count=self._length)
+        else:
+            return None
+
+        return self._take(self._attributes, numpy.flatnonzero(mask))
+
+    def rename(self, mapping):
+        mapping = dict(mapping)
+        attr = set(a.rename(mapping.get(a.name, a.name))
+                   for a in self._attributes)
+        columns = dict((mapping.get(n, n), c)
+                       for (n, c) in self._columns.items())
+        return ColumnarRelation(attr, columns, self._length, unique=True)
+
+    def product(self, other):
+        if not isinstance(other, ColumnarRelation):
+            other = ColumnarRelation.from_relation(other)
+
+        # The identity law, Dee is the identity of the product.
+        if other.order == 0 and other.cardinality == 1:
+            return self
+
+        # Tuples sharing an attribute can't be combined, as with the
+        # tuples of ordinary relations.
+        shared = set(self._columns) & set(other._columns)
+        if shared:
+            raise RuntimeError("found duplicate keys in {0}"
+                               .format(sorted(shared)))
+
+        attr = self._attributes | other._attributes
+        n, m = self._length, other._length
+
+        # Each row on the left is repeated once for every row on the
+        # right, while the right side is repeated as a whole once for
+        # every row on the left. When either side is empty so is the
+        # product, which is the null law.
+        columns = dict((name, numpy.repeat(c, m))
+                       for (name, c) in self._columns.items())
+        columns.update((name, numpy.tile(c, n))
+                       for (name, c) in other._columns.items())
+        return ColumnarRelation(attr, columns, n * m, unique=True)
+
+    def summarize(self, by, **aggregates):
+        """Groups the relation and computes aggregates for each group
+
+        See Relation.summarize. The built-in aggregates over numeric
+        columns are computed with numpy, one vectorized pass per
+        aggregate, anything else is summarized as tuples.
+
+        """
+        if isinstance(by, str):
+            by = (by, )
+        by = tuple(by)
+        names = sorted(aggregates)
+        aggs = [aggregates[name] for name in names]
+
+        if not self._vectorizable(by, names, aggs):
+            summary = self.to_relation().summarize(by, **aggregates)
+            return ColumnarRelation.from_relation(summary)
+
+        # Each group is identified by the index of its first row,
+        # and every row is mapped to the number of its group.
+        if by:
+            codes = numpy.column_stack([_codes(self._columns[n]) for n in by])
+            first, inverse = numpy.unique(codes, axis=0, return_index=True,
+                                          return_inverse=True)[1:]
+            inverse = inverse.reshape(-1)
+        else:
+            first = numpy.zeros(1, dtype=numpy.int64)
+            inverse = numpy.zeros(self._length, dtype=numpy.int64)
+
+        groups = len(first)
+        counts = numpy.bincount(inverse, minlength=groups)
+
+        attr = set(self.attribute(name) for name in by)
+        columns = dict((name, self._columns[name][first]) for name in by)
+
+        for (name, a) in zip(names, aggs):
+            if a.vectorized == "count":
+                attr.add(Attribute(int, name))
+                columns[name] = counts
+                continue
+
+            column = self._columns[a.name]
+            if a.vectorized == "min":
+                result = column[first].copy()
+                numpy.minimum.at(result, inverse, column)
+            elif a.vectorized == "max":
+                result = column[first].copy()
+                numpy.maximum.at(result, inverse, column)
+            else:
+                dtype = numpy.int64 if column.dtype == bool else column.dtype
+                result = numpy.zeros(groups, dtype=dtype)
+                numpy.add.at(result, inverse, column)
+                if a.vectorized == "avg":
+                    result = result / counts
+
+            if a.vectorized in ("min", "max"):
+                domain = self.attribute(a.name).type
+            else:
+                domain = _scalar_types[result.dtype.kind]
+            attr.add(Attribute(domain, name))
+            columns[name] = result
+
+        return ColumnarRelation(attr, columns, groups, unique=True)
+
+    def _vectorizable(self, by, names, aggs):
+        if self._length == 0 or set(by) & set(names):
+            return False
+
+        for a in aggs:
+            if a.vectorized is None:
+                return False
+            if a.vectorized == "count":
+                continue
+
+            column = self._columns[a.name]
+            if column.dtype == object:
+                return False
+            # Python integers never overflow, int64 sums might. The
+            # magnitude is taken on Python integers, as the absolute
+            # value of the smallest int64 wraps around.
+            if a.vectorized in ("sum", "avg") and column.dtype.kind == "i":
+                largest = max(column.max().item(), -column.min().item())
+                if largest * self._length >= 2 ** 63:
+                    return False
+        return True
@@ -0,0 +1,143 @@
+"""Discovery of keys and functional dependencies
+
+Both searches are level-wise walks over the lattice of attribute sets
+in the style of TANE. Every attribute set is represented by its
+stripped partition: the tuples of the relation grouped by their values
+for the attributes, leaving out the groups consisting of a single
+tuple. An attribute set is a key exactly when its stripped partition
+is empty, and X functionally determines A exactly when adding A to X
+doesn't split any group of X.
+
+The partition of a set on one level is computed by refining the
+partition of one of its subsets on the previous level, so the relation
+itself is only scanned once, when the partitions of the single
+attributes are built. Supersets of keys are never visited.
+"""
+import collections
+import itertools
+
+
+FunctionalDependency = collections.namedtuple("FunctionalDependency",
+                                              ["lhs", "rhs"])
+
+
+def _partition_of(rows, name):
+    groups = collections.defaultdict(list)
+    for (i, t) in enumerate(rows):
+        groups[t[name]].append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def _product(first, second):
+    # Refines the first partition by the second one. Two tuples end
+    # up in the same group only if they share a group in both.
+    owner = {}
+    for (i, group) in enumerate(first):
+        for row in group:
+            owner[row] = i
+
+    result = []
+    for group in second:
+        split = collections.defaultdict(list)
+        for row in group:
+            if row in owner:
+                split[owner[row]].append(row)
+        result.extend(g for g in split.values() if len(g) > 1)
+    return result
+
+
+def _error(partition):
+    # The number of tuples that would have to be removed for the
+    # attributes to become a key.
+    return sum(len(g) for g in partition) - len(partition)
+
+
+def _next_level(level):
+    # Joins the sets of the level sharing all but their last
+    # attribute. A set is only kept if all its subsets one attribute
+    # smaller are on the level.
+    keys = sorted(level)
+    for (i, x) in enumerate(keys):
+        for y in keys[i + 1:]:
+            if x[:-1] != y[:-1]:
+                break
+            candidate = x + y[-1:]
+            subsets = itertools.combinations(candidate, len(candidate) - 1)
+            if all(s in level for s in subsets):
+                yield candidate, x, y
+
+
+def _search(relation, dependencies):
+    rows = list(relation.tuples)
+    # Attribute sets are handled as tuples of positions in the list of
+    # names, which keeps the results in the order of the names.
+    names = list(relation.attribute_names)
+    positions = range(len(names))
+
+    singles = [_partition_of(rows, name) for name in names]
+
+    everything = [list(range(len(rows)))] if len(rows) > 1 else []
+    level = {(): everything}
+    # The attributes functionally determined by each set on the
+    # current level.
+    determined = {(): set()}
+
+    keys, found = [], []
+
+    while level:
+        candidates = {}
+
+        for (x, partition) in sorted(level.items()):
+            # The attributes determined by some proper subset are
+            # determined by one of the immediate subsets.
+            implied = set()
+            for s in itertools.combinations(x, len(x) - 1) if x else ():
+                implied |= determined[s]
+
+            rest = [a for a in positions if a not in x and a not in implied]
+            lhs = frozenset(names[i] for i in x)
+
+            if len(partition) == 0:
+                keys.append(set(lhs))
+                found.extend(FunctionalDependency(lhs, names[a])
+                             for a in rest)
+                continue
+
+            if dependencies:
+                error = _error(partition)
+                for a in rest:
+                    if _error(_product(partition, singles[a])) == error:
+                        found.append(FunctionalDependency(lhs, names[a]))
+                        implied.add(a)
+
+            determined[x] = implied | set(x)
+            candidates[x] = partition
+
+        level = {}
+        if () in candidates:
+            # The first level consists of the single attributes, whose
+            # partitions have already been built.
+            for a in positions:
+                level[(a, )] = singles[a]
+        else:
+            for (candidate, x, y) in _next_level(candidates):
+                level[candidate] = _product(candidates[x], singles[y[-1]])
+
+        determined = dict((x, determined[x]) for x in candidates)
+
+    return keys, found
+
+
+def candidate_keys(relation):
+    """Returns the minimal sets of attributes which are keys"""
+    return _search(relation, False)[0]
+
+
+def functional_dependencies(relation):
+    """Returns the minimal non-trivial functional dependencies
+
+    Each dependency is a pair of a set of attribute names, the left
+    hand side, and the single attribute name they determine.
+
+    """
+    return _search(relation, True)[1]
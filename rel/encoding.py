@@ -0,0 +1,352 @@
+"""Dictionary encoding of attributes with few distinct values
+
+An encoded attribute stores a small integer code in every tuple in
+place of its value. The codes index a dictionary of the distinct
+values, shared by all the tuples of a relation, so that each value is
+kept only once no matter how many tuples have it.
+
+Values are only decoded when they are read from a tuple. Tuples
+sharing an encoding compare their codes rather than their values,
+selections on an encoded attribute evaluate the predicate once for
+every distinct value rather than once for every tuple, and joins on
+attributes sharing a dictionary hash and compare the codes.
+"""
+import operator
+
+from rel.structure import Header, MappingTuple, PositionalTuple
+
+
+# Attributes with at most this many distinct values are encoded when
+# no attributes are named.
+MAX_DISTINCT = 1024
+
+
+class Dictionary(object):
+    """The distinct values of an attribute, numbered from zero"""
+
+    def __init__(self, values=()):
+        # Values are keyed along with their type, as values such as 1
+        # and True are equal but have to decode to what was encoded.
+        # Such values get different codes, which then can't be compared
+        # in place of the values, and the dictionary is aliased.
+        self._codes = {}
+        self._equal = {}
+        self.values = []
+        self.aliased = False
+        for v in values:
+            self.code(v)
+
+    def code(self, value):
+        """Returns the code of a value, adding it if it is new"""
+        key = (type(value), value)
+        code = self._codes.get(key)
+        if code is None:
+            code = len(self.values)
+            self._codes[key] = code
+            self.values.append(value)
+            if self._equal.setdefault(value, code) != code:
+                self.aliased = True
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return "Dictionary({0})".format(repr(self.values))
+
+    def matching(self, predicate):
+        """The codes of the values satisfying a predicate"""
+        return frozenset(code for (code, v) in enumerate(self.values)
+                         if predicate(v))
+
+
+class Encoding(object):
+    """The header of encoded tuples along with their dictionaries
+
+    The dictionaries are given by position, with None for values
+    stored as they are. Like headers, encodings are shared by all the
+    tuples encoded the same way, and remember the encodings derived
+    from them by projecting, renaming and combining tuples.
+    """
+    __slots__ = ("header", "dictionaries", "_encoded",
+                 "_projections", "_renames", "_unions")
+
+    def __init__(self, header, dictionaries):
+        self.header = header
+        self.dictionaries = tuple(dictionaries)
+        self._encoded = tuple(d for d in self.dictionaries if d is not None)
+        self._projections = {}
+        self._renames = {}
+        self._unions = {}
+
+    def __repr__(self):
+        return "Encoding({0}, {1})".format(repr(self.header),
+                                           repr(self.dictionaries))
+
+    @property
+    def aliased(self):
+        """Whether equal values may have been given different codes"""
+        return any(d.aliased for d in self._encoded)
+
+    def project(self, names):
+        names = frozenset(names)
+        projection = self._projections.get(names)
+        if projection is None:
+            header, positions = self.header.project(names)
+            encoding = Encoding(header, (self.dictionaries[i] for i in positions))
+            projection = (encoding, positions)
+            self._projections[names] = projection
+        return projection
+
+    def rename(self, mapping):
+        header = self.header.rename(mapping)
+        renamed = self._renames.get(header)
+        if renamed is None:
+            renamed = Encoding(header, self.dictionaries)
+            self._renames[header] = renamed
+        return renamed
+
+    def union(self, other):
+        # The names of the other encoding which aren't already in this
+        # one are appended, returning their positions along with the
+        # combined encoding.
+        combined = self._unions.get(other)
+        if combined is None:
+            positions = self.header.positions
+            extra = tuple(i for (i, name) in enumerate(other.header.names)
+                          if name not in positions)
+            header = Header(self.header.names +
+                            tuple(other.header.names[i] for i in extra))
+            encoding = Encoding(header, self.dictionaries +
+                                tuple(other.dictionaries[i] for i in extra))
+            combined = (encoding, extra)
+            self._unions[other] = combined
+        return combined
+
+
+class EncodedTuple(PositionalTuple):
+    """A positional tuple storing codes for some of its values
+
+    Encoded tuples hash and compare equal to other mapping tuples with
+    the same names and values.
+    """
+    __slots__ = ("_encoding", )
+
+    def __init__(self, encoding, codes):
+        PositionalTuple.__init__(self, encoding.header, codes)
+        self._encoding = encoding
+
+    @classmethod
+    def _make(cls, encoding, codes):
+        # Creates a tuple from codes known to fit the encoding.
+        t = cls.__new__(cls)
+        t._header = encoding.header
+        t._encoding = encoding
+        t._values = codes
+        t._hash = None
+        return t
+
+    def __reduce__(self):
+        return (EncodedTuple, (self._encoding, self._values))
+
+    def _decoded(self, i):
+        d = self._encoding.dictionaries[i]
+        v = self._values[i]
+        return v if d is None else d.values[v]
+
+    @property
+    def _fields(self):
+        names = self._header.names
+        return tuple((names[i], self._decoded(i)) for i in self._header.order)
+
+    def __getitem__(self, name):
+        return self._decoded(self._header.positions[name])
+
+    def __repr__(self):
+        if len(self._values) == 0:
+            return "MappingTuple.Empty"
+        return "EncodedTuple({0})".format(dict(self._fields))
+
+    def __hash__(self):
+        # The hash has to agree with that of plain tuples, and is
+        # therefore computed from the values rather than the codes,
+        # but only once for every tuple.
+        if self._hash is None:
+            self._hash = hash(self._fields)
+        return self._hash
+
+    def __eq__(self, other):
+        if (isinstance(other, EncodedTuple) and other._encoding is self._encoding
+                and not self._encoding.aliased):
+            return self._values == other._values
+        return isinstance(other, MappingTuple) and self._fields == other._fields
+
+    def project(self, names):
+        fixed_names = set(getattr(name, "name", name) for name in names)
+        if len(fixed_names) == 0:
+            return MappingTuple.Empty
+
+        encoding, positions = self._encoding.project(fixed_names)
+        values = self._values
+        return EncodedTuple._make(encoding, tuple(values[i] for i in positions))
+
+    def rename(self, mapping):
+        return EncodedTuple._make(self._encoding.rename(mapping), self._values)
+
+    def union(self, other):
+        if not isinstance(other, EncodedTuple):
+            return MappingTuple.union(self, other)
+
+        encoding, extra = self._encoding.union(other._encoding)
+        values = other._values
+        return EncodedTuple._make(encoding,
+                                  self._values + tuple(values[i] for i in extra))
+
+    rho = rename
+    pi = project
+
+
+def low_cardinality(tuples, names, max_distinct=MAX_DISTINCT):
+    """The names of the attributes with few distinct values"""
+    distinct = dict((name, set()) for name in names)
+    for t in tuples:
+        for name in list(distinct):
+            seen = distinct[name]
+            seen.add(t[name])
+            if len(seen) > max_distinct:
+                del distinct[name]
+    return set(distinct)
+
+
+def encode_tuples(tuples, names, encoded, dictionaries=None):
+    """Encodes the attributes named in encoded
+
+    The dictionaries passed are filled with the dictionary of each
+    encoded attribute, and dictionaries already in there are reused,
+    which lets several relations share their codes.
+
+    """
+    if dictionaries is None:
+        dictionaries = {}
+
+    header = Header(sorted(names))
+    for name in encoded:
+        if name not in dictionaries:
+            dictionaries[name] = Dictionary()
+    encoding = Encoding(header, (dictionaries[name] if name in encoded else None
+                                 for name in header.names))
+    slots = tuple(zip(header.names, encoding.dictionaries))
+
+    for t in tuples:
+        yield EncodedTuple._make(encoding,
+                                 tuple(t[name] if d is None else d.code(t[name])
+                                       for (name, d) in slots))
+
+
+def decode_tuples(tuples):
+    for t in tuples:
+        if isinstance(t, EncodedTuple):
+            yield PositionalTuple(t._header,
+                                  (t._decoded(i) for i in range(len(t._values))))
+        else:
+            yield t
+
+
+def uniform(tuples):
+    """The encoding shared by all the tuples
+
+    Returns None unless the tuples are all encoded the same way.
+
+    """
+    first = next(iter(tuples), None)
+    if not isinstance(first, EncodedTuple):
+        return None
+
+    encoding = first._encoding
+    for t in tuples:
+        if t.__class__ is not EncodedTuple or t._encoding is not encoding:
+            return None
+    return encoding
+
+
+class _Single(object):
+    # Stands in for a tuple when checking a single value of a
+    # comparison on several attributes, where every other attribute
+    # compares equal.
+    __slots__ = ("comparison", "name", "value")
+
+    def __init__(self, comparison, name, value):
+        self.comparison = comparison
+        self.name = name
+        self.value = value
+
+    def __getitem__(self, name):
+        if name == self.name:
+            return self.value
+        return self.comparison.values[name]
+
+
+def select(tuples, comparison):
+    """Answers a comparison by evaluating it on the distinct values
+
+    Returns the matching tuples, or None if the compared attributes
+    aren't encoded.
+
+    """
+    encoding = uniform(tuples)
+    if encoding is None:
+        return None
+
+    names = list(comparison.names)
+    if not names:
+        return None
+    positions = [encoding.header.positions[name] for name in names]
+    dictionaries = [encoding.dictionaries[i] for i in positions]
+    if any(d is None for d in dictionaries):
+        return None
+
+    try:
+        # Each attribute is checked on its own, which is all a
+        # comparison or a match needs.
+        allowed = [d.matching(lambda v, name=name:
+                              comparison(_Single(comparison, name, v)))
+                   for (name, d) in zip(names, dictionaries)]
+    except TypeError:
+        return None
+
+    if len(positions) == 1:
+        i, codes = positions[0], allowed[0]
+        return [t for t in tuples if t._values[i] in codes]
+
+    checks = list(zip(positions, allowed))
+    return [t for t in tuples
+            if all(t._values[i] in codes for (i, codes) in checks)]
+
+
+def join_keys(build, build_names, probe, probe_names):
+    """Functions computing join keys from codes, where possible
+
+    Codes can be used when each pair of attributes being joined on
+    shares a dictionary without aliases, or is stored unencoded on both
+    sides. Returns None otherwise.
+
+    """
+    left, right = uniform(build), uniform(probe)
+    if left is None or right is None:
+        return None
+
+    left_positions = [left.header.positions[name] for name in build_names]
+    right_positions = [right.header.positions[name] for name in probe_names]
+    for (i, j) in zip(left_positions, right_positions):
+        d = left.dictionaries[i]
+        if d is not right.dictionaries[j] or d is not None and d.aliased:
+            return None
+
+    # The keys are the codes themselves, picked out the same way on
+    # both sides.
+    left_key = operator.itemgetter(*left_positions)
+    right_key = operator.itemgetter(*right_positions)
+    return (lambda t: left_key(t._values), lambda t: right_key(t._values))
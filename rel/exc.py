@@ -5,3 +5,9 @@ class ValueOutsideDomain(RuntimeError):
 
 class InvalidTuple(RuntimeError):
     pass
+
+class IncompatibleHeaders(RuntimeError):
+    pass
+
+class UntrustedFile(RuntimeError):
+    pass
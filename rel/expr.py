@@ -0,0 +1,348 @@
+"""A small expression language for predicates
+
+Expressions are built from attribute references and constants using
+the usual Python operators:
+
+    from rel.expr import attr
+    (attr("age") >= 18) & (attr("country") == "se")
+
+Comparisons, arithmetic and the boolean connectives &, | and ~ build
+expression trees rather than evaluating anything. A tree can be
+inspected, which lets selections use indexes and lets the planner
+split and move predicates, and it is compiled into a single Python
+function the first time it is evaluated.
+
+Unlike sympy expressions, these compare any values Python can compare,
+such as strings, and cost nothing to import.
+"""
+import operator
+
+
+_comparisons = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+_arithmetic = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "//": operator.floordiv,
+    "%": operator.mod,
+}
+
+
+def _wrap(value):
+    if isinstance(value, Expression):
+        return value
+    return Const(value)
+
+
+class Expression(object):
+    """Base class of the nodes of expressions
+
+    As == builds a comparison, expressions hash by identity and have
+    no truth value, which catches accidental use of and, or and not
+    in place of &, | and ~.
+    """
+
+    _fn = None
+
+    __hash__ = object.__hash__
+
+    def __bool__(self):
+        raise TypeError("The truth value of an expression is undefined, "
+                        "use &, | and ~ to combine expressions")
+
+    def __getstate__(self):
+        # The compiled function is rebuilt rather than pickled.
+        state = dict(self.__dict__)
+        state.pop("_fn", None)
+        return state
+
+    def attributes(self):
+        """The names of the attributes the expression refers to"""
+        names = set()
+        for child in self.children():
+            names |= child.attributes()
+        return frozenset(names)
+
+    def children(self):
+        return ()
+
+    def compile(self):
+        """Returns a function evaluating the expression on a tuple"""
+        if self._fn is None:
+            constants = {}
+            source = "lambda t: " + self._source(constants)
+            constants["__builtins__"] = {}
+            self._fn = eval(compile(source, "<rel.expr>", "eval"), constants)
+        return self._fn
+
+    def __call__(self, t):
+        return self.compile()(t)
+
+    def _source(self, constants):
+        # The Python source of the expression, with constants bound
+        # to names in constants.
+        raise NotImplementedError
+
+    # Comparisons
+
+    def __eq__(self, other):
+        return Compare(self, "==", _wrap(other))
+
+    def __ne__(self, other):
+        return Compare(self, "!=", _wrap(other))
+
+    def __lt__(self, other):
+        return Compare(self, "<", _wrap(other))
+
+    def __le__(self, other):
+        return Compare(self, "<=", _wrap(other))
+
+    def __gt__(self, other):
+        return Compare(self, ">", _wrap(other))
+
+    def __ge__(self, other):
+        return Compare(self, ">=", _wrap(other))
+
+    def isin(self, values):
+        return In(self, values)
+
+    # Connectives
+
+    def __and__(self, other):
+        return And(self, _wrap(other))
+
+    def __rand__(self, other):
+        return And(_wrap(other), self)
+
+    def __or__(self, other):
+        return Or(self, _wrap(other))
+
+    def __ror__(self, other):
+        return Or(_wrap(other), self)
+
+    def __invert__(self):
+        return Not(self)
+
+    # Arithmetic
+
+    def __add__(self, other):
+        return Arithmetic(self, "+", _wrap(other))
+
+    def __radd__(self, other):
+        return Arithmetic(_wrap(other), "+", self)
+
+    def __sub__(self, other):
+        return Arithmetic(self, "-", _wrap(other))
+
+    def __rsub__(self, other):
+        return Arithmetic(_wrap(other), "-", self)
+
+    def __mul__(self, other):
+        return Arithmetic(self, "*", _wrap(other))
+
+    def __rmul__(self, other):
+        return Arithmetic(_wrap(other), "*", self)
+
+    def __truediv__(self, other):
+        return Arithmetic(self, "/", _wrap(other))
+
+    def __rtruediv__(self, other):
+        return Arithmetic(_wrap(other), "/", self)
+
+    def __floordiv__(self, other):
+        return Arithmetic(self, "//", _wrap(other))
+
+    def __rfloordiv__(self, other):
+        return Arithmetic(_wrap(other), "//", self)
+
+    def __mod__(self, other):
+        return Arithmetic(self, "%", _wrap(other))
+
+    def __rmod__(self, other):
+        return Arithmetic(_wrap(other), "%", self)
+
+    def __neg__(self):
+        return Arithmetic(Const(0), "-", self)
+
+
+class Attr(Expression):
+    """The value of an attribute"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def attributes(self):
+        return frozenset([self.name])
+
+    def _source(self, constants):
+        return "t[{0}]".format(_bind(constants, self.name))
+
+    def __repr__(self):
+        return self.name
+
+
+class Const(Expression):
+    def __init__(self, value):
+        self.value = value
+
+    def _source(self, constants):
+        return _bind(constants, self.value)
+
+    def __repr__(self):
+        return repr(self.value)
+
+
+def _bind(constants, value):
+    name = "c{0}".format(len(constants))
+    constants[name] = value
+    return name
+
+
+class Compare(Expression):
+    def __init__(self, lhs, op, rhs):
+        if op not in _comparisons:
+            raise ValueError("Unknown comparison {0}".format(repr(op)))
+        self.lhs = lhs
+        self.op = op
+        self.rhs = rhs
+
+    def children(self):
+        return (self.lhs, self.rhs)
+
+    def _source(self, constants):
+        return "({0} {1} {2})".format(self.lhs._source(constants), self.op,
+                                      self.rhs._source(constants))
+
+    def __repr__(self):
+        return "({0} {1} {2})".format(self.lhs, self.op, self.rhs)
+
+
+class In(Expression):
+    """Checks that a value is one of a collection of values"""
+
+    def __init__(self, operand, values):
+        self.operand = operand
+        try:
+            self.values = frozenset(values)
+        except TypeError:
+            self.values = tuple(values)
+
+    def children(self):
+        return (self.operand, )
+
+    def _source(self, constants):
+        return "({0} in {1})".format(self.operand._source(constants),
+                                     _bind(constants, self.values))
+
+    def __repr__(self):
+        return "({0} in {1})".format(self.operand, sorted(self.values, key=repr))
+
+
+class Arithmetic(Expression):
+    def __init__(self, lhs, op, rhs):
+        if op not in _arithmetic:
+            raise ValueError("Unknown operator {0}".format(repr(op)))
+        self.lhs = lhs
+        self.op = op
+        self.rhs = rhs
+
+    def children(self):
+        return (self.lhs, self.rhs)
+
+    def _source(self, constants):
+        return "({0} {1} {2})".format(self.lhs._source(constants), self.op,
+                                      self.rhs._source(constants))
+
+    def __repr__(self):
+        return "({0} {1} {2})".format(self.lhs, self.op, self.rhs)
+
+
+class _Connective(Expression):
+    keyword = None
+
+    def __init__(self, *operands):
+        # Nested connectives of the same kind are flattened.
+        flat = []
+        for operand in operands:
+            if type(operand) is type(self):
+                flat.extend(operand.operands)
+            else:
+                flat.append(operand)
+        self.operands = tuple(flat)
+
+    def children(self):
+        return self.operands
+
+    def _source(self, constants):
+        joined = " {0} ".format(self.keyword).join(o._source(constants)
+                                                   for o in self.operands)
+        return "({0})".format(joined)
+
+    def __repr__(self):
+        symbol = " & " if self.keyword == "and" else " | "
+        return "({0})".format(symbol.join(repr(o) for o in self.operands))
+
+
+class And(_Connective):
+    keyword = "and"
+
+
+class Or(_Connective):
+    keyword = "or"
+
+
+class Not(Expression):
+    def __init__(self, operand):
+        self.operand = operand
+
+    def children(self):
+        return (self.operand, )
+
+    def _source(self, constants):
+        return "(not {0})".format(self.operand._source(constants))
+
+    def __repr__(self):
+        return "~{0}".format(self.operand)
+
+
+def attr(name):
+    return Attr(name)
+
+
+def attrs(names):
+    """Attribute references for a whitespace separated string of names"""
+    return tuple(Attr(name) for name in names.split())
+
+
+def const(value):
+    return Const(value)
+
+
+def conjuncts(expr):
+    """The operands of a conjunction, or the expression itself"""
+    if isinstance(expr, And):
+        return list(expr.operands)
+    return [expr]
+
+
+def conjoin(expressions):
+    if len(expressions) == 1:
+        return expressions[0]
+    return And(*expressions)
+
+
+def equated(expr):
+    """The names of two attributes compared for equality, or None"""
+    if (isinstance(expr, Compare) and expr.op == "==" and
+            isinstance(expr.lhs, Attr) and isinstance(expr.rhs, Attr)):
+        return (expr.lhs.name, expr.rhs.name)
+    return None
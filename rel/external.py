@@ -0,0 +1,303 @@
+"""Joins in bounded memory
+
+The operators of Relation hold both of their inputs, and any hash
+table built from them, in memory. An external join instead sorts each
+input on the attributes joined on, and whenever the tuples read so far
+outgrow the memory budget, the sorted tuples are spilled to a
+temporary file as a run. The runs of each input are merged back into a
+single sorted sequence, and the two sequences are merged with each
+other, pairing up the tuples with equal join keys.
+
+Sorting only works for domains whose values are totally ordered, such
+as numbers, strings and dates. Other domains, such as frozensets, are
+joined by partitioning both inputs on the hashes of their join keys
+into files, and hash joining each pair of partitions in turn.
+
+Only the tuples of the left input sharing a single join key, or a
+single partition, are held in memory at once, along with a buffer for
+every file being read. Joins without any attributes in common are
+products, computed by reading the left input a block at the time and
+streaming the spilled right input past each block.
+
+The result is a stream relation, computed anew every time it is
+iterated over, which can be materialized if it fits in memory.
+"""
+import collections
+import datetime
+import decimal
+import heapq
+import itertools
+import numbers
+import pickle
+import sys
+import tempfile
+
+from rel.stream import StreamRelation, iter_tuples
+
+
+# The default bound on the estimated memory taken by the tuples held
+# while sorting an input.
+MEMORY = 64 * 2 ** 20
+
+# The number of runs merged at once. More runs are first merged into
+# fewer, larger runs.
+FAN_IN = 64
+
+# The number of partitions inputs which can't be sorted are split into.
+PARTITIONS = 64
+
+# Domains whose values are totally ordered, along with the values of
+# the other domains in the same group.
+_TOTALLY_ORDERED = (
+    (numbers.Real, decimal.Decimal),
+    (str, ),
+    (bytes, ),
+    (datetime.datetime, ),
+    (datetime.date, ),
+    (datetime.time, ),
+    (datetime.timedelta, ),
+)
+
+
+def _size(t):
+    # A rough estimate of the memory taken by a tuple in bytes.
+    return sys.getsizeof(t) + sum(sys.getsizeof(v) for v in t.values())
+
+
+def _trusted(relation):
+    # Whether the tuples of a relation are known to be valid, which
+    # only streams from unknown sources aren't.
+    if isinstance(relation, StreamRelation):
+        return relation._trusted
+    return True
+
+
+def _sortable(left, right):
+    # Whether the values of two domains can be merged in sorted order,
+    # which needs them to be totally ordered among each other. Dates
+    # are checked first, as datetimes are dates as well but can't be
+    # compared with them. Domains made up of several types are
+    # hashed instead.
+    if not isinstance(left, type) or not isinstance(right, type):
+        return False
+    for group in _TOTALLY_ORDERED:
+        if issubclass(left, group) or issubclass(right, group):
+            return issubclass(left, group) and issubclass(right, group)
+    return False
+
+
+class _Run(object):
+    # A sequence of tuples spilled to a temporary file.
+
+    def __init__(self, directory, tuples=()):
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self._pickler = pickle.Pickler(self._file, pickle.HIGHEST_PROTOCOL)
+        for t in tuples:
+            self.add(t)
+
+    def add(self, t):
+        self._pickler.dump(t)
+        # The pickler would otherwise remember every tuple.
+        self._pickler.clear_memo()
+
+    def __iter__(self):
+        self._file.seek(0)
+        unpickler = pickle.Unpickler(self._file)
+        while True:
+            try:
+                yield unpickler.load()
+            except EOFError:
+                return
+
+    def close(self):
+        self._file.close()
+
+
+class _Sorted(object):
+    # The tuples of an input sorted on a key, either in memory or as
+    # runs on disk.
+
+    def __init__(self, tuples, key, memory, directory):
+        self.key = key
+        self.runs = []
+        self.tuples = None
+
+        block, used = [], 0
+        for t in tuples:
+            block.append(t)
+            used += _size(t)
+            if used > memory:
+                block.sort(key=key)
+                self.runs.append(_Run(directory, block))
+                block, used = [], 0
+        block.sort(key=key)
+
+        if not self.runs:
+            self.tuples = block
+            return
+        if block:
+            self.runs.append(_Run(directory, block))
+
+        while len(self.runs) > FAN_IN:
+            merged = self.runs[:FAN_IN]
+            self.runs = self.runs[FAN_IN:]
+            self.runs.append(_Run(directory, heapq.merge(*merged, key=key)))
+            for run in merged:
+                run.close()
+
+    def __iter__(self):
+        if self.tuples is not None:
+            return iter(self.tuples)
+        return heapq.merge(*self.runs, key=self.key)
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+
+
+def _merge(left, right, left_key, right_key):
+    # Pairs up the tuples of two sorted sequences with equal keys.
+    left = itertools.groupby(left, key=left_key)
+    right = itertools.groupby(right, key=right_key)
+    l, r = next(left, None), next(right, None)
+    while l is not None and r is not None:
+        if l[0] == r[0]:
+            group = list(l[1])
+            for b in r[1]:
+                for a in group:
+                    yield a.union(b)
+            l, r = next(left, None), next(right, None)
+        elif l[0] < r[0]:
+            l = next(left, None)
+        else:
+            r = next(right, None)
+
+
+def _blocks(tuples, memory):
+    block, used = [], 0
+    for t in tuples:
+        block.append(t)
+        used += _size(t)
+        if used > memory:
+            yield block
+            block, used = [], 0
+    if block:
+        yield block
+
+
+def _product(left, right, memory, directory):
+    # A block nested loop, reading the right input once for every
+    # block of the left.
+    right = _Sorted(iter_tuples(right), lambda t: 0, memory // 2, directory)
+    try:
+        for block in _blocks(iter_tuples(left), memory // 2):
+            for b in right:
+                for a in block:
+                    yield a.union(b)
+    finally:
+        right.close()
+
+
+def _sort_merge(left, right, left_key, right_key, memory, directory):
+    # Each input gets half of the budget, as a left input small
+    # enough to be sorted in memory is kept there while the right
+    # input is sorted.
+    l = _Sorted(iter_tuples(left), left_key, memory // 2, directory)
+    try:
+        r = _Sorted(iter_tuples(right), right_key, memory // 2, directory)
+        try:
+            for t in _merge(l, r, left_key, right_key):
+                yield t
+        finally:
+            r.close()
+    finally:
+        l.close()
+
+
+def _hash_join(build, probe, build_key, probe_key):
+    table = collections.defaultdict(list)
+    for t in build:
+        table[build_key(t)].append(t)
+    for b in probe:
+        for a in table.get(probe_key(b), ()):
+            yield a.union(b)
+
+
+def _partitioned(tuples, key, directory):
+    runs = [_Run(directory) for _ in range(PARTITIONS)]
+    for t in tuples:
+        runs[hash(key(t)) % PARTITIONS].add(t)
+    return runs
+
+
+def _grace_hash(left, right, left_key, right_key, memory, directory):
+    # A left input fitting in the budget is joined in memory, otherwise
+    # both inputs are partitioned so that equal keys end up in the same
+    # pair of partitions.
+    tuples = iter_tuples(left)
+    blocks = _blocks(tuples, memory // 2)
+    first = next(blocks, [])
+    rest = next(blocks, None)
+    if rest is None:
+        for t in _hash_join(first, iter_tuples(right), left_key, right_key):
+            yield t
+        return
+
+    l = _partitioned(itertools.chain(first, rest, tuples), left_key, directory)
+    try:
+        r = _partitioned(iter_tuples(right), right_key, directory)
+        try:
+            for (a, b) in zip(l, r):
+                for t in _hash_join(a, b, left_key, right_key):
+                    yield t
+        finally:
+            for run in r:
+                run.close()
+    finally:
+        for run in l:
+            run.close()
+
+
+def join(left, right, on=None, memory=MEMORY, directory=None):
+    """Joins two relations in bounded memory
+
+    Without on, the relations are joined naturally like Relation.join,
+    otherwise on gives pairs of attribute names like
+    Relation.equi_join. The inputs may be relations, lazy relations or
+    stream relations. Memory is the budget, in bytes, for the tuples
+    of an input held while sorting it, and the runs spilled to disk
+    are placed in the given directory or the default temporary one.
+
+    Returns a stream relation of the joined tuples.
+
+    """
+    attributes = set(left.attributes) | set(right.attributes)
+    if on is None:
+        common = set(left.attributes) & set(right.attributes)
+        left_names = right_names = sorted(attr.name for attr in common)
+    else:
+        on = list(on)
+        left_names = [a for (a, _) in on]
+        right_names = [b for (_, b) in on]
+
+    left_domains = dict((attr.name, attr.type) for attr in left.attributes)
+    right_domains = dict((attr.name, attr.type) for attr in right.attributes)
+    sortable = all(_sortable(left_domains[a], right_domains[b])
+                   for (a, b) in zip(left_names, right_names))
+    left_key = lambda t: tuple(t[name] for name in left_names)
+    right_key = lambda t: tuple(t[name] for name in right_names)
+
+    def source():
+        if not left_names:
+            return _product(left, right, memory, directory)
+        elif sortable:
+            return _sort_merge(left, right, left_key, right_key,
+                               memory, directory)
+        return _grace_hash(left, right, left_key, right_key,
+                           memory, directory)
+
+    # Attributes sharing a name but not a domain leave tuples which
+    # have to be validated.
+    unique = len(set(attr.name for attr in attributes)) == len(attributes)
+    return StreamRelation(attributes, source,
+                          _trusted(left) and _trusted(right) and unique)
@@ -0,0 +1,113 @@
+"""Secondary indexes on the attributes of relations
+
+A hash index maps the values of its attributes to the tuples having
+them, answering equality lookups without looking at any other tuple.
+A sorted index keeps the tuples ordered by the values of its
+attributes, which also allows finding all the tuples within a range
+of values of the first attribute.
+"""
+import bisect
+import collections
+
+from rel.predicate import Between, Match
+
+
+class HashIndex(object):
+    kind = "hash"
+
+    def __init__(self, tuples, names):
+        self.names = tuple(names)
+        self._table = collections.defaultdict(list)
+        for t in tuples:
+            self._table[tuple(t[name] for name in self.names)].append(t)
+
+    def lookup(self, key):
+        """Returns the tuples with the given values for the attributes"""
+        return self._table.get(tuple(key), ())
+
+
+class SortedIndex(object):
+    kind = "sorted"
+
+    def __init__(self, tuples, names):
+        self.names = tuple(names)
+        entries = sorted(((tuple(t[name] for name in self.names), t)
+                          for t in tuples),
+                         key=lambda entry: entry[0])
+        self._keys = [key for (key, _) in entries]
+        self._leading = [key[0] for key in self._keys]
+        self._tuples = [t for (_, t) in entries]
+
+    def lookup(self, key):
+        """Returns the tuples with the given values for the attributes"""
+        key = tuple(key)
+        start = bisect.bisect_left(self._keys, key)
+        end = bisect.bisect_right(self._keys, key)
+        return self._tuples[start:end]
+
+    def range(self, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        """Returns the tuples whose first attribute lies in a range
+
+        Leaving out a bound makes the range open in that direction.
+
+        """
+        if low is None:
+            start = 0
+        elif low_inclusive:
+            start = bisect.bisect_left(self._leading, low)
+        else:
+            start = bisect.bisect_right(self._leading, low)
+
+        if high is None:
+            end = len(self._leading)
+        elif high_inclusive:
+            end = bisect.bisect_right(self._leading, high)
+        else:
+            end = bisect.bisect_left(self._leading, high)
+
+        return self._tuples[start:end]
+
+
+kinds = {
+    "hash": HashIndex,
+    "sorted": SortedIndex,
+}
+
+
+def lookup(index, comparison):
+    """Answers a comparison using an index
+
+    Returns the matching tuples, or None if the index can't answer
+    the comparison.
+
+    """
+    if isinstance(comparison, Match):
+        # Matches on several attributes can only be answered by an
+        # index on exactly those attributes.
+        if set(comparison.values) != set(index.names):
+            return None
+        return index.lookup(comparison.values[name] for name in index.names)
+
+    if comparison.name != index.names[0]:
+        return None
+
+    if isinstance(comparison, Between):
+        if index.kind != "sorted":
+            return None
+        return index.range(comparison.low, comparison.high,
+                           comparison.low_inclusive, comparison.high_inclusive)
+
+    op, value = comparison.op, comparison.value
+    if op == "==":
+        if len(index.names) == 1:
+            return index.lookup((value, ))
+        if index.kind == "sorted":
+            return index.range(value, value)
+        return None
+
+    if index.kind != "sorted":
+        return None
+
+    if op in ("<", "<="):
+        return index.range(high=value, high_inclusive=(op == "<="))
+    return index.range(low=value, low_inclusive=(op == ">="))
@@ -0,0 +1,275 @@
+"""Instrumentation of the relational operators
+
+While instrumentation is enabled, every call of an operator on a
+relation is recorded along with the time it took, the cardinalities
+of the relations going in and out, the number of tuples validated and,
+optionally, the peak memory allocated by the call. Operators calling
+other operators, such as inner_join calling product and select, are
+recorded as a tree which can be printed much like EXPLAIN ANALYZE:
+
+    with instrument.recording() as session:
+        a.inner_join(b, expr).project(["x"])
+    print(session.explain())
+
+Hooks are called with every record as it completes, for forwarding
+the measurements elsewhere.
+
+Enabling the instrumentation wraps the operators of Relation, and
+disabling it puts the original operators back. When it is off the
+operators are exactly what they would be without this module, so it
+costs nothing.
+"""
+import contextlib
+import functools
+import threading
+import time
+import tracemalloc
+
+from rel import operators
+
+
+PROPERTIES = ("super_keys", "candidate_keys", "functional_dependencies")
+
+
+class Record(object):
+    """The measurements of a single call of an operator"""
+
+    def __init__(self, operator, inputs):
+        self.operator = operator
+        self.inputs = inputs
+        self.output = None
+        self.seconds = 0.0
+        self.validated = 0
+        self.peak = None
+        self.error = None
+        self.children = []
+
+    @property
+    def total_validated(self):
+        """The tuples validated by this call and the calls it made"""
+        return self.validated + sum(c.total_validated for c in self.children)
+
+    def walk(self, depth=0):
+        yield (depth, self)
+        for child in self.children:
+            for entry in child.walk(depth + 1):
+                yield entry
+
+    def describe(self):
+        parts = ["in: " + ", ".join(str(n) for n in self.inputs)]
+        if self.output is not None:
+            parts.append("out: {0}".format(self.output))
+        parts.append("time: {0:.3f} ms".format(self.seconds * 1000))
+        if self.total_validated:
+            parts.append("validated: {0}".format(self.total_validated))
+        if self.peak is not None:
+            parts.append("peak: {0} bytes".format(self.peak))
+        if self.error is not None:
+            parts.append("error: " + self.error)
+        return "{0}  ({1})".format(self.operator, "  ".join(parts))
+
+    def __repr__(self):
+        return "Record({0!r}, {1!r})".format(self.operator, self.inputs)
+
+
+def explain(records):
+    """Formats trees of records as indented text"""
+    lines = []
+    for record in records:
+        for (depth, r) in record.walk():
+            lines.append("  " * depth + r.describe())
+    return "\n".join(lines)
+
+
+class Session(object):
+    """The records of the top level calls made while recording"""
+
+    def __init__(self):
+        self.records = []
+
+    def explain(self):
+        return explain(self.records)
+
+
+class _State(threading.local):
+    def __init__(self):
+        # The records of the calls in progress, innermost last, and
+        # the sessions collecting the finished top level records.
+        self.stack = []
+        self.sessions = []
+
+
+_state = _State()
+_hooks = []
+_memory = False
+
+
+def add_hook(hook):
+    """Calls hook with every record once its call has completed"""
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+def _cardinality(value):
+    return getattr(value, "cardinality", None)
+
+
+def _begin(operator, inputs):
+    record = Record(operator, inputs)
+    if _memory and tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        _note_peak(peak)
+        tracemalloc.reset_peak()
+        record._base = current
+        record.peak = 0
+    _state.stack.append(record)
+    record._start = time.perf_counter()
+    return record
+
+
+def _note_peak(peak):
+    # The peak traced since the last reset belongs to every call in
+    # progress, as the peak is reset whenever a call starts or ends.
+    for record in _state.stack:
+        if record.peak is not None:
+            record.peak = max(record.peak, peak - record._base)
+
+
+def _end(record, output):
+    record.seconds = time.perf_counter() - record._start
+    # Operators such as top_k give lists of tuples.
+    if isinstance(output, list):
+        record.output = len(output)
+    else:
+        record.output = _cardinality(output)
+    _state.stack.pop()
+
+    if record.peak is not None:
+        peak = tracemalloc.get_traced_memory()[1]
+        record.peak = max(record.peak, peak - record._base)
+        _note_peak(peak)
+        tracemalloc.reset_peak()
+
+    if _state.stack:
+        _state.stack[-1].children.append(record)
+    else:
+        for session in _state.sessions:
+            session.records.append(record)
+
+    for hook in _hooks:
+        hook(record)
+
+
+def _record(operator, fn, self, args, kwargs):
+    inputs = [self.cardinality]
+    inputs.extend(n for n in map(_cardinality, args) if n is not None)
+    record = _begin(operator, inputs)
+    output = None
+    try:
+        output = fn(self, *args, **kwargs)
+        return output
+    except Exception as e:
+        record.error = repr(e)
+        raise
+    finally:
+        _end(record, output)
+
+
+def _wrap_operator(name, fn):
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        return _record(name, fn, self, args, kwargs)
+    return wrapper
+
+
+def _wrap_property(name, prop):
+    @functools.wraps(prop.fget)
+    def fget(self):
+        # Properties such as super_keys are generators, which are
+        # consumed so that the record covers the actual work.
+        return _record(name, lambda self: _materialized(prop.fget(self)),
+                       self, (), {})
+    return property(fget, doc=prop.__doc__)
+
+
+def _materialized(value):
+    if hasattr(value, "__next__"):
+        return list(value)
+    return value
+
+
+def _wrap_check(fn):
+    @functools.wraps(fn)
+    def wrapper(self):
+        record = _begin("validate", [len(self._tuples)])
+        record.validated = len(self._tuples)
+        try:
+            fn(self)
+        except Exception as e:
+            record.error = repr(e)
+            raise
+        finally:
+            _end(record, None)
+    return wrapper
+
+
+def enable(memory=False):
+    """Starts recording the operators
+
+    With memory, the peak memory allocated by each call is traced as
+    well, which slows the operators down considerably.
+
+    """
+    global _memory
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    if enabled():
+        return
+
+    wrappers = dict((name, functools.partial(_wrap_operator, name))
+                    for name in operators.OPERATORS)
+    wrappers.update((name, functools.partial(_wrap_property, name))
+                    for name in PROPERTIES)
+    wrappers["_check_tuples"] = _wrap_check
+    operators.install(__name__, wrappers)
+
+
+def disable():
+    """Stops recording, restoring the original operators"""
+    global _memory
+    operators.uninstall(__name__)
+    _memory = False
+
+
+def enabled():
+    return operators.installed(__name__)
+
+
+@contextlib.contextmanager
+def recording(memory=False):
+    """Records the operators called within the block
+
+    Yields a session collecting the records of the top level calls.
+    Instrumentation is disabled again on leaving the block, unless it
+    was already enabled.
+
+    """
+    was_enabled = enabled()
+    started_tracing = memory and not tracemalloc.is_tracing()
+    enable(memory)
+
+    session = Session()
+    _state.sessions.append(session)
+    try:
+        yield session
+    finally:
+        _state.sessions.remove(session)
+        if not was_enabled:
+            disable()
+        if started_tracing:
+            tracemalloc.stop()
@@ -0,0 +1,78 @@
+"""Wrapping the operators of relations
+
+Instrumentation and caching both work by replacing the operators of
+Relation with wrappers. Each of them installs its wrappers here as a
+layer, and the operators are rebuilt from the original methods with
+every installed layer applied in the order they were installed. A
+layer can thus be removed at any time without disturbing the others,
+whatever order they were installed in.
+"""
+from rel.relation import Relation
+
+
+# The operators of relations, including aliases which would otherwise
+# bypass a wrapped operator.
+OPERATORS = (
+    "project", "select", "rename", "product",
+    "union", "minus", "difference", "intersect", "intersection",
+    "summarize", "group_by",
+    "equi_join", "inner_join", "join", "semijoin", "antijoin",
+    "divide", "great_divide", "join_all", "external_join",
+    "order_by", "limit", "top_k",
+)
+
+# The attributes as they were before any layer was installed, keyed by
+# name along with the class defining them.
+_originals = {}
+# The installed layers, innermost first, as pairs of an owner and a
+# dictionary from attribute names to functions wrapping them.
+_layers = []
+
+
+def _defining_class(name):
+    for cls in Relation.__mro__:
+        if name in cls.__dict__:
+            return cls
+
+
+def _rebuild(name):
+    cls, attribute = _originals[name]
+    for (_, wrappers) in _layers:
+        if name in wrappers:
+            attribute = wrappers[name](attribute)
+    setattr(cls, name, attribute)
+
+    if not any(name in wrappers for (_, wrappers) in _layers):
+        del _originals[name]
+
+
+def install(owner, wrappers):
+    """Wraps attributes of Relation as the outermost layer
+
+    The wrappers map the names of attributes to functions taking the
+    attribute as it stands and giving its replacement. Installing a
+    layer for an owner which already has one replaces it.
+
+    """
+    uninstall(owner)
+    for name in wrappers:
+        if name not in _originals:
+            cls = _defining_class(name)
+            _originals[name] = (cls, cls.__dict__[name])
+    _layers.append((owner, dict(wrappers)))
+    for name in wrappers:
+        _rebuild(name)
+
+
+def uninstall(owner):
+    """Removes the layer of an owner, leaving the other layers be"""
+    for (i, (o, wrappers)) in enumerate(_layers):
+        if o == owner:
+            del _layers[i]
+            for name in wrappers:
+                _rebuild(name)
+            return
+
+
+def installed(owner):
+    return any(o == owner for (o, _) in _layers)
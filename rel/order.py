@@ -0,0 +1,184 @@
+"""Ordering the tuples of relations
+
+Relations are sets, and their tuples come in no particular order. An
+ordering lists the tuples sorted on one or more attributes, each of
+them ascending or descending. Ties are kept in the order the tuples
+were produced in, which makes sorting on several keys stable.
+
+Orderings are lazy. Nothing is sorted until the tuples are asked for,
+and limiting an ordering to its first tuples keeps no more than that
+many tuples around at any time, by passing all of them through a
+bounded heap rather than sorting them all.
+
+Values are ordered according to the domain of their attribute. Domains
+whose values can't be compared with each other, such as object,
+complex or domains made up of several types, get an ordering of their
+own.
+"""
+import functools
+import heapq
+import numbers
+
+from rel.relation import Relation
+
+
+def _orderable(domain):
+    if not isinstance(domain, type):
+        return False
+    return (domain.__lt__ is not object.__lt__ and
+            not (issubclass(domain, numbers.Complex) and
+                 not issubclass(domain, numbers.Real)))
+
+
+@functools.total_ordering
+class _Mixed(object):
+    # Orders values of different types by the name of their type
+    # first, and values which can't be compared at all by their
+    # representation.
+    __slots__ = ("value", )
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        a, b = self.value, other.value
+        if type(a) is not type(b):
+            if isinstance(a, numbers.Real) and isinstance(b, numbers.Real):
+                return a < b
+            return type(a).__name__ < type(b).__name__
+        try:
+            return a < b
+        except TypeError:
+            return repr(a) < repr(b)
+
+
+def _complex_key(value):
+    return (value.real, value.imag)
+
+
+def sort_key(attribute):
+    """The function turning values of an attribute into sort keys"""
+    domain = attribute.type
+    if _orderable(domain):
+        return None
+    if isinstance(domain, type) and issubclass(domain, numbers.Complex):
+        return _complex_key
+    return _Mixed
+
+
+class _Descending(object):
+    # Reverses the order of a key.
+    __slots__ = ("key", )
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+def _directions(names, descending):
+    if isinstance(descending, bool):
+        return [descending] * len(names)
+    descending = list(descending)
+    if len(descending) != len(names):
+        raise ValueError("Expected a direction for each of {0}".format(names))
+    return descending
+
+
+def _names(names):
+    if isinstance(names, str):
+        return [names]
+    return list(names)
+
+
+class Ordered(object):
+    """The tuples of a relation in order
+
+    The source is a function returning an iterator over the tuples to
+    order. Iterating over the ordering sorts them, up to the limit if
+    there is one.
+
+    """
+
+    def __init__(self, attributes, source, names, descending=False, limit=None):
+        self.attributes = set(attributes)
+        self.names = _names(names)
+        self.descending = _directions(self.names, descending)
+        self._source = source
+        self._limit = limit
+        self._tuples = None
+
+        by_name = dict((attr.name, attr) for attr in self.attributes)
+        missing = [name for name in self.names if name not in by_name]
+        if missing:
+            raise KeyError("Can't order by {0}, the attributes are {1}"
+                           .format(missing, sorted(by_name)))
+        self._keys = [sort_key(by_name[name]) for name in self.names]
+
+    def limit(self, n):
+        """Keeps only the first n tuples of the ordering"""
+        if self._limit is not None:
+            n = min(n, self._limit)
+        return Ordered(self.attributes, self._source, self.names,
+                       self.descending, n)
+
+    def _key(self):
+        # A function from tuples to sort keys, along with whether to
+        # reverse the order. Descending keys only need wrapping when
+        # the directions are mixed.
+        names, keys = self.names, self._keys
+        reverse = all(self.descending)
+        wrapped = [(name, key, desc and not reverse)
+                   for (name, key, desc) in zip(names, keys, self.descending)]
+
+        def key(t):
+            parts = []
+            for (name, convert, desc) in wrapped:
+                v = t[name]
+                if convert is not None:
+                    v = convert(v)
+                parts.append(_Descending(v) if desc else v)
+            return tuple(parts)
+        return key, reverse
+
+    def _ordered(self):
+        key, reverse = self._key()
+        tuples = self._source()
+        if self._limit is None:
+            return sorted(tuples, key=key, reverse=reverse)
+        if reverse:
+            return heapq.nlargest(self._limit, tuples, key=key)
+        return heapq.nsmallest(self._limit, tuples, key=key)
+
+    @property
+    def tuples(self):
+        """The ordered tuples as a list"""
+        if self._tuples is None:
+            self._tuples = self._ordered()
+        return self._tuples
+
+    def __iter__(self):
+        return iter(self.tuples)
+
+    def __len__(self):
+        return len(self.tuples)
+
+    def __getitem__(self, i):
+        return self.tuples[i]
+
+    def to_relation(self):
+        """The tuples of the ordering as a relation, forgetting the order"""
+        return Relation._trusted(self.attributes, self.tuples)
+
+    def __repr__(self):
+        keys = ", ".join("{0} {1}".format(name, "desc" if desc else "asc")
+                         for (name, desc) in zip(self.names, self.descending))
+        limit = "" if self._limit is None else ", limit={0}".format(self._limit)
+        return "Ordered({0}{1})".format(keys, limit)
@@ -0,0 +1,155 @@
+"""Parallel execution of relational operators
+
+The executor splits the bodies of relations into partitions and runs
+an operator on each partition in a pool of worker processes, after
+which the partial results are merged. Joins partition both sides by
+a hash of the values being joined on, so that matching tuples always
+end up in the same partition.
+
+Sending tuples to other processes means pickling them, which isn't
+free. Relations below a threshold are therefore handled in the
+calling process. Predicates passed to select have to be picklable,
+which rules out lambdas but not functions defined at the top level of
+a module.
+"""
+import concurrent.futures
+import itertools
+import os
+
+from rel.predicate import is_contradiction, is_tautology
+from rel.relation import Relation, _combined
+
+
+# The number of tuples, or pairs of tuples for products, below which
+# operators are run serially.
+THRESHOLD = 10000
+
+
+def _chunks(tuples, n):
+    tuples = list(tuples)
+    # Empty inputs give no chunks rather than chunks of no tuples.
+    size = max(1, -(-len(tuples) // n))
+    return [tuples[i:i + size] for i in range(0, len(tuples), size)]
+
+
+def _hash_partition(tuples, names, n):
+    parts = [[] for _ in range(n)]
+    for t in tuples:
+        parts[hash(tuple(t[name] for name in names)) % n].append(t)
+    return parts
+
+
+# The functions run by the workers. Each receives the attributes and
+# tuples of its partition and returns the resulting tuples.
+
+def _select_part(attributes, tuples, expr):
+    return list(Relation._trusted(attributes, tuples).select(expr).tuples)
+
+
+def _join_part(left, right, on):
+    l = Relation._trusted(*left)
+    r = Relation._trusted(*right)
+    if on is None:
+        return list(l.join(r).tuples)
+    return list(l.equi_join(r, on).tuples)
+
+
+def _product_part(left, right):
+    l = Relation._trusted(*left)
+    r = Relation._trusted(*right)
+    return list(l.product(r).tuples)
+
+
+class ParallelExecutor(object):
+    """Runs select, join and product over a pool of processes
+
+    The pool is started the first time it is needed and shut down by
+    close, or when leaving the executor as a context manager.
+
+    """
+
+    def __init__(self, max_workers=None, threshold=THRESHOLD, partitions=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.threshold = threshold
+        self.partitions = partitions or self.max_workers
+        self._pool = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _serial(self, size):
+        return size < self.threshold or self.partitions < 2
+
+    def _map(self, fn, *arguments):
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(self.max_workers)
+        results = self._pool.map(fn, *arguments)
+        return itertools.chain.from_iterable(results)
+
+    def select(self, relation, expr):
+        if (is_tautology(expr) or is_contradiction(expr) or
+                self._serial(relation.cardinality)):
+            return relation.select(expr)
+
+        attributes = relation.attributes
+        parts = _chunks(relation.tuples, self.partitions)
+        tuples = self._map(_select_part,
+                           itertools.repeat(attributes, len(parts)),
+                           parts,
+                           itertools.repeat(expr, len(parts)))
+        return Relation._trusted(attributes, tuples)
+
+    def _join(self, left, right, left_names, right_names, on):
+        n = self.partitions
+        left_parts = _hash_partition(left.tuples, left_names, n)
+        right_parts = _hash_partition(right.tuples, right_names, n)
+
+        # Partitions that are empty on either side can't produce any
+        # tuples and are never sent to the workers.
+        pairs = [((left.attributes, l), (right.attributes, r))
+                 for (l, r) in zip(left_parts, right_parts) if l and r]
+
+        tuples = self._map(_join_part,
+                           [l for (l, _) in pairs],
+                           [r for (_, r) in pairs],
+                           itertools.repeat(on, len(pairs)))
+        return _combined(left.attributes | right.attributes, tuples)
+
+    def join(self, left, right):
+        """Joins two relations naturally, see Relation.join"""
+        if (left.attributes_disjoint(right) or
+                self._serial(left.cardinality + right.cardinality)):
+            return left.join(right)
+
+        names = sorted(attr.name for attr in left.attributes & right.attributes)
+        return self._join(left, right, names, names, None)
+
+    def equi_join(self, left, right, on):
+        """Equi-joins two relations, see Relation.equi_join"""
+        if len(on) == 0 or self._serial(left.cardinality + right.cardinality):
+            return left.equi_join(right, on)
+
+        left_names, right_names = zip(*on)
+        return self._join(left, right, left_names, right_names, list(on))
+
+    def product(self, left, right):
+        """The product of two relations, see Relation.product"""
+        if self._serial(left.cardinality * right.cardinality):
+            return left.product(right)
+
+        # Every partition of the left side is combined with the whole
+        # of the right side.
+        parts = _chunks(left.tuples, self.partitions)
+        other = (right.attributes, right.tuples)
+        tuples = self._map(_product_part,
+                           [(left.attributes, part) for part in parts],
+                           itertools.repeat(other, len(parts)))
+        return _combined(left.attributes | right.attributes, tuples)
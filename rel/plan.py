@@ -0,0 +1,517 @@
+"""Lazy evaluation of relational expressions
+
+Rather than evaluating every operator as soon as it is applied, a lazy
+relation records the operators as a tree, the logical plan. Only when
+the result is actually needed is the plan rewritten, using the laws of
+relational algebra, and then evaluated. This way a selection on a
+product can, for instance, be turned into a join before the product is
+ever built.
+"""
+import itertools
+
+from rel.predicate import (as_function, conjoin as _conjoin,
+                           conjuncts as _conjuncts,
+                           equated as _equated, is_boolean, is_contradiction,
+                           is_native, is_tautology,
+                           referenced as _referenced)
+from rel.relation import Relation
+from rel.structure import distinct
+
+
+def _names(attributes):
+    return frozenset(attr.name for attr in attributes)
+
+
+class Node(object):
+    """A node in a logical plan"""
+
+    children = ()
+
+    def with_children(self, *children):
+        return self
+
+    # The rewrite rules return an equivalent but cheaper node, or
+    # the node itself if none of the rules apply. The rules are
+    # split in two phases, selections are pushed down before
+    # projections are.
+
+    def push_selections(self):
+        return self
+
+    def push_projections(self):
+        return self
+
+    def execute(self):
+        raise NotImplementedError
+
+    def stream(self):
+        # The tuples of the node one at the time. Nodes which can
+        # produce their tuples without evaluating all of them first
+        # override this, letting limits and orderings stop early.
+        return iter(self.execute().tuples)
+
+    def describe(self):
+        return type(self).__name__
+
+    def explain(self, depth=0):
+        lines = ["  " * depth + self.describe()]
+        for child in self.children:
+            lines.append(child.explain(depth + 1))
+        return "\n".join(lines)
+
+
+class Scan(Node):
+    """A leaf of the plan reading an already evaluated relation"""
+
+    def __init__(self, relation):
+        self.relation = relation
+        self.attributes = relation.attributes
+
+    def execute(self):
+        return self.relation
+
+    def stream(self):
+        return iter(self.relation.tuples)
+
+    @property
+    def is_dee(self):
+        return self.relation.order == 0 and self.relation.cardinality == 1
+
+    @property
+    def is_empty(self):
+        return self.relation.cardinality == 0
+
+    def describe(self):
+        return "Scan(order={0}, cardinality={1})".format(
+            self.relation.order, self.relation.cardinality)
+
+
+def _empty(attributes):
+    return Scan(Relation(attributes, ()))
+
+
+class Select(Node):
+    def __init__(self, child, expr):
+        self.child = child
+        self.expr = expr
+        self.attributes = child.attributes
+
+    @property
+    def children(self):
+        return (self.child, )
+
+    def with_children(self, child):
+        return Select(child, self.expr)
+
+    def push_selections(self):
+        expr, child = self.expr, self.child
+
+        # Tautologies and contradictions.
+        if is_tautology(expr):
+            return child
+        if is_contradiction(expr):
+            return _empty(self.attributes)
+
+        if _referenced(expr) is None:
+            return self
+
+        # Selections written the same way are merged, as long as sympy
+        # can conjoin them.
+        if (isinstance(child, Select) and
+                (is_boolean(child.expr) and is_boolean(expr) or
+                 is_native(child.expr) and is_native(expr))):
+            return Select(child.child, _conjoin(_conjuncts(child.expr) +
+                                                _conjuncts(expr)))
+
+        # A selection can always be moved below a projection, as the
+        # predicate can only refer to attributes that survived it.
+        if isinstance(child, Project):
+            return Project(Select(child.child, expr), child.names)
+
+        if isinstance(child, (Product, Join, EquiJoin)):
+            return self._push_into(child)
+
+        return self
+
+    def _push_into(self, child):
+        left_names = _names(child.left.attributes)
+        right_names = _names(child.right.attributes)
+
+        left, right, pairs, rest = [], [], [], []
+        for conjunct in _conjuncts(self.expr):
+            names = _referenced(conjunct)
+            pair = _equated(conjunct)
+
+            if names <= left_names:
+                left.append(conjunct)
+            elif names <= right_names:
+                right.append(conjunct)
+            elif (pair is not None and
+                  not isinstance(child, Join) and
+                  pair[0] in left_names and pair[1] in right_names):
+                pairs.append(pair)
+            elif (pair is not None and
+                  not isinstance(child, Join) and
+                  pair[1] in left_names and pair[0] in right_names):
+                pairs.append((pair[1], pair[0]))
+            else:
+                rest.append(conjunct)
+
+        if not (left or right or pairs):
+            return self
+
+        l = Select(child.left, _conjoin(left)) if left else child.left
+        r = Select(child.right, _conjoin(right)) if right else child.right
+
+        # An equality between the two sides of a product turns the
+        # product into an equi-join.
+        if isinstance(child, Join):
+            node = Join(l, r)
+        elif isinstance(child, EquiJoin) or pairs:
+            on = tuple(getattr(child, "on", ())) + tuple(pairs)
+            node = EquiJoin(l, r, on)
+        else:
+            node = Product(l, r)
+
+        if rest:
+            return Select(node, _conjoin(rest))
+        return node
+
+    def execute(self):
+        return self.child.execute().select(self.expr)
+
+    def stream(self):
+        predicate = as_function(self.expr, self.attributes)
+        return (t for t in self.child.stream() if predicate(t))
+
+    def describe(self):
+        return "Select({0})".format(self.expr)
+
+
+class Project(Node):
+    def __init__(self, child, names):
+        self.child = child
+        self.names = frozenset(names)
+        self.attributes = set(attr for attr in child.attributes
+                              if attr.name in self.names)
+
+    @property
+    def children(self):
+        return (self.child, )
+
+    def with_children(self, child):
+        return Project(child, self.names)
+
+    def push_projections(self):
+        child, names = self.child, self.names
+        child_names = _names(child.attributes)
+
+        # Projecting onto all attributes is the identity.
+        if names == child_names:
+            return child
+
+        # Projecting a relation onto nothing is either Dee or Doe,
+        # which for a scan we can tell right away.
+        if len(names) == 0 and isinstance(child, Scan):
+            return Scan(child.relation.project(()))
+
+        if isinstance(child, Project):
+            return Project(child.child, names)
+
+        if isinstance(child, Select):
+            needed = _referenced(child.expr)
+            if needed is not None and names | needed < child_names:
+                inner = Project(child.child, names | needed)
+                return Project(Select(inner, child.expr), names)
+
+        if isinstance(child, Product):
+            # The projection of a product is the product of the
+            # projections.
+            return Product(Project(child.left, names & _names(child.left.attributes)),
+                           Project(child.right, names & _names(child.right.attributes)))
+
+        if isinstance(child, (Join, EquiJoin)):
+            # The attributes being joined on have to be kept until
+            # after the join.
+            if isinstance(child, Join):
+                needed = names | (_names(child.left.attributes) &
+                                  _names(child.right.attributes))
+            else:
+                needed = names | set(n for pair in child.on for n in pair)
+
+            left_names = _names(child.left.attributes)
+            right_names = _names(child.right.attributes)
+            if needed & left_names < left_names or needed & right_names < right_names:
+                pushed = child.with_children(Project(child.left, needed & left_names),
+                                             Project(child.right, needed & right_names))
+                return Project(pushed, names)
+
+        return self
+
+    def execute(self):
+        return self.child.execute().project(sorted(self.names))
+
+    def stream(self):
+        if len(self.names) == 0:
+            return iter(self.execute().tuples)
+        return distinct(t.project(self.names) for t in self.child.stream())
+
+    def describe(self):
+        return "Project({0})".format(", ".join(sorted(self.names)))
+
+
+class Rename(Node):
+    def __init__(self, child, mapping):
+        self.child = child
+        self.mapping = dict(mapping)
+        self.attributes = set(attr.rename(self.mapping.get(attr.name, attr.name))
+                              for attr in child.attributes)
+
+    @property
+    def children(self):
+        return (self.child, )
+
+    def with_children(self, child):
+        return Rename(child, self.mapping)
+
+    def execute(self):
+        return self.child.execute().rename(self.mapping)
+
+    def stream(self):
+        return (t.rename(self.mapping) for t in self.child.stream())
+
+    def describe(self):
+        pairs = sorted(self.mapping.items())
+        return "Rename({0})".format(", ".join("{0} -> {1}".format(a, b)
+                                              for (a, b) in pairs))
+
+
+class Limit(Node):
+    """Keeps any n of the tuples of its child"""
+
+    def __init__(self, child, n):
+        self.child = child
+        self.n = n
+        self.attributes = child.attributes
+
+    @property
+    def children(self):
+        return (self.child, )
+
+    def with_children(self, child):
+        return Limit(child, self.n)
+
+    def execute(self):
+        return Relation._trusted(self.attributes, self.stream())
+
+    def stream(self):
+        # Only as many tuples as needed are taken from the child.
+        return itertools.islice(self.child.stream(), self.n)
+
+    def describe(self):
+        return "Limit({0})".format(self.n)
+
+
+class _Binary(Node):
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.attributes = left.attributes | right.attributes
+
+    @property
+    def children(self):
+        return (self.left, self.right)
+
+    def with_children(self, left, right):
+        return type(self)(left, right)
+
+    def _laws(self):
+        left, right = self.left, self.right
+
+        # Dee is the identity of both products and joins.
+        if isinstance(right, Scan) and right.is_dee:
+            return left
+        if isinstance(left, Scan) and left.is_dee:
+            return right
+
+        # And anything combined with an empty relation is empty.
+        if ((isinstance(left, Scan) and left.is_empty) or
+                (isinstance(right, Scan) and right.is_empty)):
+            return _empty(self.attributes)
+
+        return self
+
+    def push_selections(self):
+        return self._laws()
+
+    def push_projections(self):
+        return self._laws()
+
+
+class Product(_Binary):
+    def execute(self):
+        return self.left.execute().product(self.right.execute())
+
+
+class Join(_Binary):
+    def _laws(self):
+        rewritten = _Binary._laws(self)
+        if rewritten is not self:
+            return rewritten
+
+        if _names(self.left.attributes).isdisjoint(_names(self.right.attributes)):
+            return Product(self.left, self.right)
+
+        return self
+
+    def execute(self):
+        return self.left.execute().join(self.right.execute())
+
+
+class EquiJoin(_Binary):
+    def __init__(self, left, right, on):
+        _Binary.__init__(self, left, right)
+        self.on = tuple(tuple(pair) for pair in on)
+
+    def with_children(self, left, right):
+        return EquiJoin(left, right, self.on)
+
+    def execute(self):
+        return self.left.execute().equi_join(self.right.execute(),
+                                             list(self.on))
+
+    def describe(self):
+        return "EquiJoin({0})".format(", ".join("{0} = {1}".format(a, b)
+                                                for (a, b) in self.on))
+
+
+def _rewrite(node, rule):
+    node = node.with_children(*[_rewrite(child, rule)
+                                for child in node.children])
+    rewritten = getattr(node, rule)()
+    if rewritten is node:
+        return node
+    return _rewrite(rewritten, rule)
+
+
+def optimize(node):
+    """Rewrites a plan into an equivalent plan that is cheaper to execute"""
+    # Moving a selection below a projection and moving a projection
+    # below a selection undo each other. The selections are therefore
+    # pushed all the way down before any projections are moved.
+    node = _rewrite(node, "push_selections")
+    return _rewrite(node, "push_projections")
+
+
+def _node(relation):
+    if isinstance(relation, LazyRelation):
+        return relation._node
+    return Scan(relation)
+
+
+class LazyRelation(object):
+    """A relation which is only evaluated when its body is needed
+
+    Applying operators to a lazy relation builds up a logical plan
+    rather than evaluating them. The plan is optimized and executed
+    the first time the body of the relation is needed, such as when
+    taking its length, iterating over it or comparing it to another
+    relation.
+
+    """
+
+    def __init__(self, node):
+        self._node = node
+        self._result = None
+
+    @property
+    def plan(self):
+        return optimize(self._node)
+
+    def explain(self):
+        return self.plan.explain()
+
+    def evaluate(self):
+        if self._result is None:
+            self._result = self.plan.execute()
+        return self._result
+
+    # The header is known without evaluating the plan.
+
+    @property
+    def attributes(self):
+        return self._node.attributes
+
+    @property
+    def attribute_names(self):
+        return [attr.name for attr in self.attributes]
+
+    @property
+    def order(self):
+        return len(self.attributes)
+
+    # Everything concerning the body on the other hand forces
+    # evaluation.
+
+    @property
+    def tuples(self):
+        return self.evaluate().tuples
+
+    @property
+    def cardinality(self):
+        return self.evaluate().cardinality
+
+    def __len__(self):
+        return self.cardinality
+
+    def __iter__(self):
+        return iter(self.tuples)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyRelation):
+            other = other.evaluate()
+        return self.evaluate() == other
+
+    def __repr__(self):
+        return "LazyRelation({0})".format(self._node.describe())
+
+    def project(self, attribute_names):
+        return LazyRelation(Project(self._node, attribute_names))
+
+    def select(self, expr):
+        return LazyRelation(Select(self._node, expr))
+
+    def rename(self, mapping):
+        return LazyRelation(Rename(self._node, mapping))
+
+    def product(self, other):
+        return LazyRelation(Product(self._node, _node(other)))
+
+    def join(self, other):
+        return LazyRelation(Join(self._node, _node(other)))
+
+    def equi_join(self, other, on):
+        if len(on) == 0:
+            return self.product(other)
+        return LazyRelation(EquiJoin(self._node, _node(other), on))
+
+    def inner_join(self, other, on):
+        return self.product(other).select(on)
+
+    def limit(self, n):
+        return LazyRelation(Limit(self._node, n))
+
+    def order_by(self, attribute_names, descending=False):
+        """Orders the tuples, see Relation.order_by
+
+        The tuples are streamed from the plan into the ordering, so
+        that limiting the ordering never evaluates more than the
+        bounded heap holds on top of what the plan itself needs.
+
+        """
+        from rel.order import Ordered
+        return Ordered(self.attributes, lambda: self.plan.stream(),
+                       attribute_names, descending)
+
+    def top_k(self, k, attribute_names, descending=True):
+        return list(self.order_by(attribute_names, descending).limit(k))
@@ -0,0 +1,479 @@
+"""Selection predicates
+
+Substituting the values of every tuple into a symbolic expression is
+slow, as sympy has to rebuild and simplify the expression for each
+tuple. Instead we turn the expression into a plain Python function
+once and then call it for every tuple.
+
+This module also provides simple comparison predicates. They are
+callables like any other predicate, but unlike arbitrary functions
+their structure can be inspected, which lets a selection use an index
+rather than scanning the relation.
+
+sympy is never imported here. Whoever passes in a sympy expression
+has already imported it, so until then no predicate can be one.
+"""
+import functools
+import math
+import numbers
+import operator
+import sys
+
+from rel import expr as native
+
+# The number of compiled expressions kept around. Once exceeded, the
+# least recently used expression is thrown away.
+CACHE_SIZE = 256
+
+# The largest value of the int64 columns of columnar relations.
+_INT64_MAX = 2 ** 63 - 1
+
+
+def _numeric_domain(domain):
+    # Booleans are numbers to Python but not to sympy, where they
+    # can't take part in arithmetic.
+    return issubclass(domain, numbers.Number) and not issubclass(domain, bool)
+
+
+def _sympy():
+    return sys.modules.get("sympy")
+
+
+def _exact(expr):
+    # Whether Python evaluates the expression as exactly as sympy does
+    # on integers, which rules out division, fractions and floats
+    # along with any function sympy keeps symbolic. Sums, products
+    # and powers of integers stay integers.
+    sympy = _sympy()
+    for node in sympy.preorder_traversal(expr):
+        if isinstance(node, (sympy.Symbol, sympy.Integer, sympy.Add, sympy.Mul,
+                             sympy.core.relational.Relational,
+                             sympy.logic.boolalg.BooleanAtom,
+                             sympy.And, sympy.Or, sympy.Not)):
+            continue
+        if (isinstance(node, sympy.Pow) and node.exp.is_Integer and
+                node.exp >= 0):
+            continue
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _compile(expr, attributes, modules):
+    sympy = _sympy()
+    if not _exact(expr):
+        return None
+    domains = dict((attr.name, attr.type) for attr in attributes)
+    names = []
+    for symbol in expr.free_symbols:
+        # Substitution of a tuple only replaces plain symbols named
+        # after the attributes, symbols carrying assumptions are left
+        # alone. The same goes for attributes which sympy would
+        # treat differently from Python, such as strings.
+        if symbol != sympy.Symbol(symbol.name):
+            return None
+        if symbol.name not in domains or not _numeric_domain(domains[symbol.name]):
+            return None
+        names.append(symbol.name)
+
+    names = tuple(sorted(names))
+    fn = sympy.lambdify([sympy.Symbol(name) for name in names], expr,
+                        modules=modules)
+    return names, fn
+
+
+def compile_predicate(expr, attributes):
+    """Compiles a sympy expression into a predicate on mapping tuples
+
+    The expression is compiled once for every distinct combination of
+    expression and set of attributes, the resulting callable is then
+    cached. The truthiness of the values returned matches that of
+    substituting the tuple into the expression. Expressions which
+    can't be compiled faithfully, such as those dividing and thereby
+    leaving the integers, are evaluated by substitution.
+
+    """
+    compiled = _compile(expr, frozenset(attributes), "math")
+
+    if compiled is None:
+        return lambda t: expr.subs(t.items())
+
+    names, fn = compiled
+
+    def predicate(t):
+        try:
+            return fn(*[t[name] for name in names])
+        except (ArithmeticError, ValueError):
+            # Python gives up where sympy carries on, such as when
+            # floats overflow, so those tuples are substituted instead.
+            return expr.subs(t.items())
+    return predicate
+
+
+def _largest(column):
+    # The largest magnitude of the values of a typed column, computed
+    # without negating them, as that overflows for the smallest int64.
+    if len(column) == 0:
+        return 0
+    if column.dtype.kind == "c":
+        return float(abs(column).max())
+    return max(column.max().item(), -column.min().item())
+
+
+def _magnitude(expr, bounds, limit):
+    # A bound on the magnitude of every value computed while evaluating
+    # the expression, given bounds on the values of its symbols. Bounds
+    # beyond the limit are cut off at it.
+    sympy = _sympy()
+    if expr.is_Symbol:
+        return bounds[expr.name]
+    if expr.is_Integer:
+        return min(abs(int(expr)), limit)
+
+    args = [_magnitude(arg, bounds, limit) for arg in expr.args]
+    if isinstance(expr, sympy.Add):
+        own = sum(args)
+    elif isinstance(expr, sympy.Mul):
+        own = functools.reduce(operator.mul, args, 1)
+    elif isinstance(expr, sympy.Pow):
+        base, exp = args[0], int(expr.exp)
+        try:
+            own = base ** exp if base <= 1 or exp * math.log2(base) < 1024 else limit
+        except OverflowError:
+            own = limit
+    else:
+        # Comparisons and connectives give booleans.
+        own = 0
+    return min(max([own] + args), limit)
+
+
+def compile_columns(expr, attributes):
+    """Compiles a sympy expression into a predicate on columns
+
+    The returned callable takes a mapping from attribute names to numpy
+    arrays along with the number of rows and returns an array of
+    booleans, one for each row. None is returned when the expression
+    can't be evaluated on columns, in which case it has to be evaluated
+    one tuple at the time, and the callable itself returns None for
+    columns it can't evaluate it on.
+
+    Typed arrays overflow where Python numbers don't, so expressions
+    which might overflow them are evaluated on columns of Python
+    numbers instead.
+
+    """
+    compiled = _compile(expr, frozenset(attributes), "numpy")
+
+    if compiled is None:
+        return None
+
+    names, fn = compiled
+
+    def predicate(columns, length):
+        import numpy
+        used = [columns[name] for name in names]
+        typed = all(c.dtype != object for c in used)
+        if typed:
+            if all(c.dtype.kind == "i" for c in used):
+                limit = _INT64_MAX
+            else:
+                limit = sys.float_info.max
+            bounds = dict((name, _largest(c)) for (name, c) in zip(names, used))
+            typed = _magnitude(expr, bounds, limit) < limit
+
+        if not typed:
+            try:
+                result = numpy.asarray(fn(*[c.astype(object) for c in used]))
+            except ArithmeticError:
+                return None
+        else:
+            result = numpy.asarray(fn(*used))
+        # Expressions without any symbols evaluate to a single value,
+        # which applies to all the rows.
+        return numpy.broadcast_to(result.astype(bool), (length, ))
+
+    return predicate
+
+
+def is_expression(expr):
+    """Tells whether a predicate is a sympy expression"""
+    sympy = _sympy()
+    return (sympy is not None and
+            isinstance(expr, (sympy.Expr, sympy.logic.boolalg.Boolean)))
+
+
+def is_boolean(expr):
+    """Tells whether a predicate is a sympy expression with a truth value
+
+    Arithmetic expressions select by their truthiness instead, and
+    can't take part in sympy's logical connectives.
+
+    """
+    sympy = _sympy()
+    return sympy is not None and isinstance(expr, sympy.logic.boolalg.Boolean)
+
+
+def is_native(expr):
+    """Tells whether a predicate is an expression of rel.expr"""
+    return isinstance(expr, native.Expression)
+
+
+def is_tautology(expr):
+    # None stands for no restriction at all.
+    if expr is None or expr is True:
+        return True
+    if is_native(expr):
+        return isinstance(expr, native.Const) and expr.value is True
+    # Anything else equal to True, such as 1, selects every tuple.
+    return bool(expr == True)
+
+
+def is_contradiction(expr):
+    if expr is False:
+        return True
+    if is_native(expr):
+        return isinstance(expr, native.Const) and expr.value is False
+    return bool(expr == False)
+
+
+def as_function(expr, attributes):
+    """Turns a predicate accepted by select into a function on tuples"""
+    if is_tautology(expr):
+        return lambda t: True
+    if is_contradiction(expr):
+        return lambda t: False
+    if is_native(expr):
+        return expr.compile()
+    if is_expression(expr):
+        return compile_predicate(expr, attributes)
+    return expr
+
+
+def referenced(expr):
+    """The names of the attributes a predicate depends on
+
+    Returns None if there is no way of knowing, as is the case for
+    callables.
+
+    """
+    if is_native(expr):
+        return set(expr.attributes())
+    if is_expression(expr):
+        return set(symbol.name for symbol in expr.free_symbols)
+    return None
+
+
+def conjuncts(expr):
+    """Splits a conjunction into the predicates it is made of"""
+    if is_native(expr):
+        return native.conjuncts(expr)
+    sympy = _sympy()
+    if sympy is not None and isinstance(expr, sympy.And):
+        return list(expr.args)
+    return [expr]
+
+
+def conjoin(predicates):
+    """The conjunction of predicates split by conjuncts"""
+    if len(predicates) == 1:
+        return predicates[0]
+    if all(is_native(p) for p in predicates):
+        return native.conjoin(predicates)
+    return _sympy().And(*predicates)
+
+
+def equated(expr):
+    """The names of two attributes compared for equality, or None"""
+    if is_native(expr):
+        return native.equated(expr)
+    sympy = _sympy()
+    if (sympy is not None and isinstance(expr, sympy.Eq) and
+            expr.lhs.is_Symbol and expr.rhs.is_Symbol):
+        return (expr.lhs.name, expr.rhs.name)
+    return None
+
+
+_operators = {
+    "==": operator.eq,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# The comparison obtained by swapping the sides of another.
+_flipped = {"==": "==", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+
+class Comparison(object):
+    """Compares the value of an attribute to a constant"""
+    __slots__ = ("name", "op", "value", "_fn")
+
+    def __init__(self, name, op, value):
+        self.name = name
+        self.op = op
+        self.value = value
+        self._fn = _operators[op]
+
+    def __call__(self, t):
+        return self._fn(t[self.name], self.value)
+
+    @property
+    def names(self):
+        """The names of the attributes checked"""
+        return (self.name, )
+
+    def __repr__(self):
+        return "Comparison({0} {1} {2})".format(self.name, self.op,
+                                                repr(self.value))
+
+
+class Between(object):
+    """Checks that the value of an attribute lies in a range
+
+    Either bound can be left out by passing None.
+    """
+    __slots__ = ("name", "low", "high", "low_inclusive", "high_inclusive")
+
+    def __init__(self, name, low, high, low_inclusive=True, high_inclusive=True):
+        self.name = name
+        self.low = low
+        self.high = high
+        self.low_inclusive = low_inclusive
+        self.high_inclusive = high_inclusive
+
+    def __call__(self, t):
+        v = t[self.name]
+        if self.low is not None:
+            if v < self.low or (v == self.low and not self.low_inclusive):
+                return False
+        if self.high is not None:
+            if v > self.high or (v == self.high and not self.high_inclusive):
+                return False
+        return True
+
+    @property
+    def names(self):
+        """The names of the attributes checked"""
+        return (self.name, )
+
+    def __repr__(self):
+        return "Between({0} in {1}{2}, {3}{4})".format(
+            self.name,
+            "[" if self.low_inclusive else "(", repr(self.low),
+            repr(self.high), "]" if self.high_inclusive else ")")
+
+
+class Match(object):
+    """Checks that several attributes are equal to constants"""
+    __slots__ = ("values", )
+
+    def __init__(self, values):
+        self.values = dict(values)
+
+    def __call__(self, t):
+        return all(t[name] == value for (name, value) in self.values.items())
+
+    @property
+    def names(self):
+        """The names of the attributes checked"""
+        return tuple(self.values)
+
+    def __repr__(self):
+        return "Match({0})".format(repr(self.values))
+
+
+def eq(name, value):
+    return Comparison(name, "==", value)
+
+def lt(name, value):
+    return Comparison(name, "<", value)
+
+def le(name, value):
+    return Comparison(name, "<=", value)
+
+def gt(name, value):
+    return Comparison(name, ">", value)
+
+def ge(name, value):
+    return Comparison(name, ">=", value)
+
+def between(name, low, high):
+    return Between(name, low, high)
+
+def match(**values):
+    return Match(values)
+
+
+def _constant(expr):
+    # Only numbers with an exact Python counterpart are turned into
+    # constants, so the comparison gives the same answer as sympy.
+    if expr.is_Integer:
+        return int(expr)
+    if expr.is_Float:
+        return float(expr)
+    return None
+
+
+def _native_comparison(expr):
+    if isinstance(expr, native.Compare):
+        lhs, op, rhs = expr.lhs, expr.op, expr.rhs
+        if isinstance(rhs, native.Attr) and isinstance(lhs, native.Const):
+            lhs, rhs, op = rhs, lhs, _flipped.get(op)
+        if (op in _operators and isinstance(lhs, native.Attr) and
+                isinstance(rhs, native.Const)):
+            return Comparison(lhs.name, op, rhs.value)
+        return None
+
+    # A conjunction of equalities on distinct attributes is a match.
+    if isinstance(expr, native.And):
+        values = {}
+        for operand in expr.operands:
+            comparison = _native_comparison(operand)
+            if (not isinstance(comparison, Comparison) or comparison.op != "==" or
+                    comparison.name in values):
+                return None
+            values[comparison.name] = comparison.value
+        return Match(values)
+
+    return None
+
+
+def as_comparison(expr):
+    """Turns a simple predicate into a Comparison, Between or Match
+
+    Besides the predicates of this module, sympy relations between a
+    symbol and a number and expressions of rel.expr comparing an
+    attribute to a constant are understood. Returns None for anything
+    else.
+
+    """
+    if isinstance(expr, (Comparison, Between, Match)):
+        return expr
+
+    if is_native(expr):
+        return _native_comparison(expr)
+
+    sympy = _sympy()
+    if sympy is None or not isinstance(expr, sympy.core.relational.Relational):
+        return None
+
+    op = expr.rel_op
+    if op not in _operators:
+        return None
+
+    lhs, rhs = expr.lhs, expr.rhs
+    if rhs.is_Symbol and not lhs.is_Symbol:
+        lhs, rhs, op = rhs, lhs, _flipped[op]
+
+    if not lhs.is_Symbol or lhs != sympy.Symbol(lhs.name):
+        return None
+
+    value = _constant(rhs)
+    if value is None:
+        return None
+    return Comparison(lhs.name, op, value)
+
+
+cache_info = _compile.cache_info
+cache_clear = _compile.cache_clear
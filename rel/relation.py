@@ -1,10 +1,14 @@
 import collections
 import itertools
+import numbers
 
-import sympy
-
+from rel import dependencies
+from rel import encoding
 from rel import exc
-from rel.structure import MappingTuple, values, to_values_notation
+from rel import index
+from rel.predicate import (as_comparison, compile_predicate, is_contradiction,
+                           is_expression, is_native, is_tautology, referenced)
+from rel.structure import Header, MappingTuple, PositionalTuple, values, to_values_notation
 
 
 def in_domain(value, domain):
@@ -47,17 +51,73 @@ class Attribute(object):
     def __hash__(self):
         return hash((self._type, self._name))
 
+_MASK = 2 ** 64 - 1
+
+
+def _mix(h):
+    # The finalizer of splitmix64, spreading the bits of a hash so
+    # that summing the hashes of similar tuples doesn't cancel out.
+    h = (h ^ (h >> 30)) * 0xBF58476D1CE4E5B9 & _MASK
+    h = (h ^ (h >> 27)) * 0x94D049BB133111EB & _MASK
+    return h ^ (h >> 31)
+
+
+def _compute_fingerprint(attributes, tuples):
+    # Summing the mixed hashes of the tuples makes the fingerprint
+    # independent of the order they are visited in.
+    body = 0
+    for t in tuples:
+        body = (body + _mix(hash(t) & _MASK)) & _MASK
+    return hash((frozenset(attributes), len(tuples), body))
+
+
+def _combined(attributes, tuples):
+    # Combining the tuples of two valid relations gives valid tuples,
+    # unless the relations disagree on the domain of an attribute
+    # they share.
+    names = set(attr.name for attr in attributes)
+    if len(names) == len(attributes):
+        return Relation._trusted(attributes, tuples)
+    return Relation(attributes, tuples)
+
+
 class _BaseRelation(object):
     """Class handling the absolute operations for relations"""
 
+    # How tuples passed to the constructor are validated. In "full"
+    # mode every value is checked against the domain of its
+    # attribute. In "batched" mode the values of each attribute are
+    # grouped by their type and the domain is checked once for each
+    # distinct type.
+    validation = "full"
+
     def __init__(self, attributes, tuples):
         self._attributes = set(self._parse_attr(attributes))
         self._tuples = set(self._parse_tuples(tuples))
+        self._index_attributes()
+        self._indexes = {}
 
         self._check_tuples()
 
-
-    def _parse_attr(self, attributes):
+    @classmethod
+    def _trusted(cls, attributes, tuples):
+        # Creates a relation without validating it. This is used by
+        # the operators when the validity of the result follows from
+        # the validity of the inputs, checking it again would be a
+        # waste.
+        relation = cls.__new__(cls)
+        relation._attributes = set(attributes)
+        relation._tuples = set(tuples)
+        relation._index_attributes()
+        relation._indexes = {}
+        return relation
+
+    def _index_attributes(self):
+        self._attributes_by_name = dict((attr.name, attr)
+                                        for attr in self._attributes)
+
+    @staticmethod
+    def _parse_attr(attributes):
         for attr in attributes:
             if isinstance(attr, Attribute):
                 yield attr
@@ -72,21 +132,50 @@ class _BaseRelation(object):
             else:
                 yield MappingTuple(t)
 
-    def _check_tuples(self):
+    def _check_shape(self, t):
         nattr = len(self._attributes)
 
+        if len(t) != nattr or any(name not in self._attributes_by_name
+                                  for name in t):
+            msg = "Tried to place tuple {0} ({1}) into relation with attributes {2} ({3})"
+            raise exc.InvalidTuple(msg.format(t,
+                                              len(t),
+                                              self.attributes,
+                                              len(self.attributes)))
+
+    def _outside_domain(self, val, attr):
+        msg = "Value {0} was outside the domain of {1}"
+        return exc.ValueOutsideDomain(msg.format(val, attr))
+
+    def _check_tuples(self):
+        if self.validation == "batched":
+            self._check_tuples_batched()
+            return
+
         for t in self._tuples:
-            if len(t) != nattr:
-                msg = "Tried to place tuple {0} ({1}) into relation with attributes {2} ({3})"
-                raise exc.InvalidTuple(msg.format(t,
-                                                  len(t),
-                                                  self.attributes, 
-                                                  len(self.attributes)))
+            self._check_shape(t)
 
             for (name, val) in t.items():
-                if not self.attribute(name).in_domain(val):
-                    msg = "Value {0} was outside the domain of {1}"
-                    raise ValueOutsideDomain(msg.format(val, domain))
+                attr = self._attributes_by_name[name]
+                if not attr.in_domain(val):
+                    raise self._outside_domain(val, attr)
+
+    def _check_tuples_batched(self):
+        types = collections.defaultdict(dict)
+
+        for t in self._tuples:
+            self._check_shape(t)
+
+            # Keep a single value of each type around for the error
+            # message.
+            for (name, val) in t.items():
+                types[name].setdefault(type(val), val)
+
+        for (name, seen) in types.items():
+            attr = self._attributes_by_name[name]
+            for (t, val) in seen.items():
+                if not issubclass(t, attr.type):
+                    raise self._outside_domain(val, attr)
 
     # Accessor propertyies for two components of the relation. Right
     # now there is no good reason for these to be properties. In the
@@ -128,19 +217,149 @@ class _BaseRelation(object):
     def __len__(self):
         return self.cardinality
 
+    # The fingerprint is a hash of the attributes and the body of the
+    # relation. As relations never change it is computed once, on
+    # first use.
+    _fingerprint = None
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = _compute_fingerprint(self._attributes,
+                                                     self._tuples)
+        return self._fingerprint
+
+    # Statistics are collected the first time they are needed, see
+    # rel.statistics.
+    _statistics = None
+
+    @property
+    def statistics(self):
+        from rel.statistics import statistics
+        return statistics(self)
+
     # Two relations are equals if and only if they have exactly the
     # same attributes and each the each tuple in the bodies are equal.
     def __eq__(self, other):
+        # Relations whose fingerprints are already known can't be
+        # equal if the fingerprints differ.
+        theirs = getattr(other, "_fingerprint", None)
+        if (self._fingerprint is not None and theirs is not None and
+                self._fingerprint != theirs):
+            return False
         return (
             self.attributes == other.attributes and
             self.tuples == other.tuples
         )
 
     def attribute(self, name):
-        for a in self.attributes:
-            if a._name == name:
-                return a
+        return self._attributes_by_name.get(name)
+
+
+    def create_index(self, attribute_names, kind="hash"):
+        """Declares an index on one or more attributes
+
+        Hash indexes answer equality lookups while sorted indexes also
+        answer range queries on their first attribute. The index is
+        built the first time a selection can make use of it and is
+        kept for as long as the relation lives. As relations are
+        immutable the index never has to be updated. Returns the
+        relation itself.
 
+        """
+        if isinstance(attribute_names, str):
+            attribute_names = (attribute_names, )
+        names = tuple(attribute_names)
+
+        if kind not in index.kinds:
+            raise ValueError("Unknown kind of index {0}".format(repr(kind)))
+        if any(self.attribute(name) is None for name in names):
+            raise exc.InvalidTuple("Can't index {0} of a relation with attributes {1}"
+                                   .format(names, self.attributes))
+
+        self._indexes.setdefault((kind, names), None)
+        return self
+
+    def index(self, attribute_names, kind="hash"):
+        """Returns a declared index, building it if needed"""
+        if isinstance(attribute_names, str):
+            attribute_names = (attribute_names, )
+        key = (kind, tuple(attribute_names))
+
+        built = self._indexes[key]
+        if built is None:
+            built = index.kinds[kind](self._tuples, key[1])
+            self._indexes[key] = built
+        return built
+
+    def _select_by_index(self, expr):
+        comparison = as_comparison(expr)
+        if comparison is None:
+            return None
+
+        # A match without any attributes is left to the generic select.
+        names = comparison.names
+        if not names or any(self.attribute(name) is None for name in names):
+            return None
+
+        # Sympy compares numbers, and would compare anything else
+        # symbolically.
+        if (is_expression(expr) and
+                not issubclass(self.attribute(comparison.name).type, numbers.Number)):
+            return None
+
+        for (kind, indexed) in list(self._indexes):
+            try:
+                found = index.lookup(self.index(indexed, kind), comparison)
+            except TypeError:
+                # Values which can't be ordered can't have a sorted
+                # index either, so we fall back to a scan.
+                continue
+            if found is not None:
+                return found
+        return None
+
+    def _select_encoded(self, expr):
+        comparison = as_comparison(expr)
+        if comparison is None:
+            return None
+
+        # A match without any attributes is left to the generic select.
+        names = comparison.names
+        if not names or any(self.attribute(name) is None for name in names):
+            return None
+        if (is_expression(expr) and
+                not issubclass(self.attribute(comparison.name).type, numbers.Number)):
+            return None
+        return encoding.select(self._tuples, comparison)
+
+    def encode(self, attribute_names=None, dictionaries=None):
+        """Dictionary encodes attributes with few distinct values
+
+        Each named attribute stores codes into a dictionary of its
+        distinct values rather than the values themselves. Without
+        names, the attributes with at most encoding.MAX_DISTINCT
+        distinct values are encoded. Passing the same dictionaries
+        when encoding several relations makes them share codes, which
+        lets joins between them compare codes. The dictionaries are
+        filled in with any dictionary created.
+
+        """
+        names = self.attribute_names
+        if attribute_names is None:
+            encoded = encoding.low_cardinality(self._tuples, names)
+        elif isinstance(attribute_names, str):
+            encoded = set([attribute_names])
+        else:
+            encoded = set(attribute_names)
+
+        tuples = encoding.encode_tuples(self._tuples, names, encoded, dictionaries)
+        return Relation._trusted(self._attributes, tuples)
+
+    def decode(self):
+        """Returns the relation with all values stored as they are"""
+        return Relation._trusted(self._attributes,
+                                 encoding.decode_tuples(self._tuples))
 
     def project(self, attribute_names):
         # Projecting onto the empty set of attribute names returns
@@ -154,7 +373,7 @@ class _BaseRelation(object):
 
         nt = set(t.project(attribute_names) for t in self._tuples)
         attr = set(self.attribute(name) for name in attribute_names)
-        return Relation(attr, nt)
+        return Relation._trusted(attr, nt)
 
     def select(self, expr):
         # None is treated as the empty set of restrictions.
@@ -162,18 +381,32 @@ class _BaseRelation(object):
 
         # Therefore None or True should yield the relation as is and
         # thus are equivalent to the identity function.
-        if expr is None or expr == True:
+        if is_tautology(expr):
             return self
-        elif expr == False:
+        elif is_contradiction(expr):
             # False is treated as a contradiction, yielding an empty body
-            return Relation(self._attributes, ())
+            return Relation._trusted(self._attributes, ())
+
+        # Simple comparisons are answered by an index if there is one.
+        found = self._select_by_index(expr) if self._indexes else None
+        if found is None:
+            found = self._select_encoded(expr)
+        if found is not None:
+            return Relation._trusted(self._attributes, found)
+
+        if is_native(expr):
+            predicate = expr.compile()
+            return Relation._trusted(self._attributes,
+                                     (t for t in self.tuples if predicate(t)))
         elif callable(expr):
-            return Relation(self._attributes,
-                            (t for t in self.tuples if expr(t)))
-        elif isinstance(expr, sympy.Expr):
-            # Sympy expressions 
-            return Relation(self._attributes,
-                            (t for t in self.tuples if expr.subs(t.items())))
+            return Relation._trusted(self._attributes,
+                                     (t for t in self.tuples if expr(t)))
+        elif is_expression(expr):
+            # Sympy expressions are compiled once into a function
+            # which is then applied to each tuple.
+            predicate = compile_predicate(expr, self._attributes)
+            return Relation._trusted(self._attributes,
+                                     (t for t in self.tuples if predicate(t)))
         # Everything else is undefined for now!
         else:
             return None
@@ -186,7 +419,7 @@ class _BaseRelation(object):
         mapping = dict(mapping)
         attr = self._process_rename(mapping)
         tuples = [t.rename(mapping) for t in self._tuples]
-        return Relation(attr, tuples)
+        return Relation._trusted(attr, tuples)
 
 
     def product(self, other):
@@ -199,7 +432,7 @@ class _BaseRelation(object):
         # Furthermore, for any given relation and a
         # zero-cardinality. The null law for products applies.
         if other.cardinality == 0:
-            return Relation(self._attributes, ())
+            return Relation._trusted(self._attributes | other.attributes, ())
         
         # If neither the null or identity laws apply the we go with
         # the generic algorithm.
@@ -212,7 +445,83 @@ class _BaseRelation(object):
         body = (a.union(b) 
                 for (a, b) in
                 itertools.product(self.tuples, other.tuples))
-        return Relation(attr, body)
+        return _combined(attr, body)
+
+
+    def _check_compatible(self, other, operation):
+        # The set operators only make sense for relations with the
+        # same headers.
+        if self.attributes != other.attributes:
+            msg = "Can't take the {0} of relations with attributes {1} and {2}"
+            raise exc.IncompatibleHeaders(msg.format(operation,
+                                                     self.attributes,
+                                                     other.attributes))
+
+    def union(self, other):
+        self._check_compatible(other, "union")
+        return Relation._trusted(self._attributes, self._tuples | other.tuples)
+
+    def minus(self, other):
+        self._check_compatible(other, "difference")
+        return Relation._trusted(self._attributes, self._tuples - other.tuples)
+
+    def intersect(self, other):
+        self._check_compatible(other, "intersection")
+        return Relation._trusted(self._attributes, self._tuples & other.tuples)
+
+    difference = minus
+    intersection = intersect
+
+    def summarize(self, by, **aggregates):
+        """Groups the relation and computes aggregates for each group
+
+        The tuples are grouped on the attributes named in by, and each
+        keyword argument names an aggregate from rel.aggregate to
+        compute for the groups. The result has one tuple per group,
+        made up of the grouping attributes and the aggregates. As the
+        groups are formed from the tuples present, summarizing an
+        empty relation yields an empty relation.
+
+        All the aggregates are computed in a single pass over the
+        tuples, keeping the groups in a hash table.
+
+        """
+        if isinstance(by, str):
+            by = (by, )
+        by = tuple(by)
+        names = sorted(aggregates)
+
+        clashes = set(by) & set(names)
+        if clashes:
+            msg = "The aggregates {0} clash with the grouping attributes"
+            raise exc.IncompatibleHeaders(msg.format(sorted(clashes)))
+
+        aggs = [aggregates[name] for name in names]
+        steps = [a.step for a in aggs]
+
+        groups = {}
+        for t in self._tuples:
+            key = tuple(t[name] for name in by)
+            states = groups.get(key)
+            if states is None:
+                states = groups[key] = [a.initial() for a in aggs]
+            for (i, step) in enumerate(steps):
+                states[i] = step(states[i], t)
+
+        results = [key + tuple(a.final(s) for (a, s) in zip(aggs, states))
+                   for (key, states) in groups.items()]
+
+        attr = set(self.attribute(name) for name in by)
+        for (i, (name, a)) in enumerate(zip(names, aggs), len(by)):
+            column_values = [row[i] for row in results]
+            attr.add(Attribute(a.domain(self.attribute(a.name), column_values),
+                               name))
+
+        header = Header(by + tuple(names))
+        return Relation._trusted(attr, (PositionalTuple(header, row)
+                                        for row in results))
+
+    group_by = summarize
 
 
 class Relation(_BaseRelation):
@@ -225,26 +534,99 @@ class Relation(_BaseRelation):
         else:
             return "Relation({0}, {1})".format(repr(self.attributes), repr(self._tuples))
 
+    def order_by(self, attribute_names, descending=False):
+        """Lists the tuples sorted on one or more attributes
+
+        Descending is either a single flag for all the attributes or
+        one flag for each. Returns a rel.order.Ordered, which is only
+        sorted once its tuples are needed and which can be limited to
+        its first tuples without sorting all of them.
+
+        """
+        from rel.order import Ordered
+        return Ordered(self._attributes, lambda: iter(self._tuples),
+                       attribute_names, descending)
+
+    def limit(self, n):
+        """A relation of at most n of the tuples, in no particular order"""
+        return Relation._trusted(self._attributes, itertools.islice(self._tuples, n))
+
+    def top_k(self, k, attribute_names, descending=True):
+        """The k tuples with the largest values of the attributes
+
+        Only k tuples are kept around while looking for them. Passing
+        descending=False gives the smallest instead.
+
+        """
+        return list(self.order_by(attribute_names, descending).limit(k))
+
+    def lazy(self):
+        """Returns a lazily evaluated view of this relation
+
+        Operators applied to the lazy relation are not evaluated right
+        away, instead they build a plan which is optimized and run
+        once the result is needed.
+
+        """
+        from rel.plan import LazyRelation, Scan
+        return LazyRelation(Scan(self))
+
     def attributes_disjoint(self, other):
-        return self.attributes.disjoint(other.attributes)
+        return self.attributes.isdisjoint(other.attributes)
+
+    def _hash_join_tuples(self, other, self_names, other_names):
+        # The join is performed as a classic build/probe hash
+        # join. The smaller of the two bodies is placed into a hash
+        # table keyed on the values of its join attributes, after
+        # which the larger body is streamed past it. This way each
+        # tuple is only looked at once, rather than once for every
+        # tuple in the other relation.
+        if self.cardinality <= other.cardinality:
+            build, build_names = self.tuples, self_names
+            probe, probe_names = other.tuples, other_names
+        else:
+            build, build_names = other.tuples, other_names
+            probe, probe_names = self.tuples, self_names
+
+        # Tuples encoded with the same dictionaries are matched on
+        # their codes.
+        keys = encoding.join_keys(build, build_names, probe, probe_names)
+        if keys is None:
+            keys = (lambda t: tuple(t[name] for name in build_names),
+                    lambda t: tuple(t[name] for name in probe_names))
+        build_key, probe_key = keys
+
+        table = collections.defaultdict(list)
+        for t in build:
+            table[build_key(t)].append(t)
+
+        for t in probe:
+            key = probe_key(t)
+            # The union of two mapping tuples doesn't care about
+            # which side it came from, so the matches can be
+            # combined in whichever order they are found.
+            for match in table.get(key, ()):
+                yield match.union(t)
+
+    def _nested_loop_tuples(self, other, self_names, other_names):
+        # Compares every pair of tuples, which only beats a hash join
+        # when one of the sides has next to no tuples.
+        pairs = list(zip(self_names, other_names))
+        for a in self.tuples:
+            for b in other.tuples:
+                if all(a[x] == b[y] for (x, y) in pairs):
+                    yield a.union(b)
 
     def _join_tuples_naturally_on(self, other, on):
-        tuples = self.tuples
-        for (l, r) in itertools.product(tuples, other):
-            # If the left side contains the common
-            # attributes and they match
-            if l.matching_superset_of(r.project(on)):
-                # then yield the union
-                yield l.union(r)
-
+        # In a natural join the attributes being matched carry the
+        # same names on both sides.
+        names = sorted(attr.name if isinstance(attr, Attribute) else attr
+                       for attr in on)
+        return self._hash_join_tuples(other, names, names)
 
     def _join_tuples_on(self, other, on):
-        on_self, on_other = zip(on)
-        tuples = self.tuples
-        for (l, r) in itertools.product(tuples, other):
-            transformed = l.project(on_self).rename(on)
-            if transformed == r.project(on_other):
-                yield l.union(r)
+        on_self, on_other = zip(*on)
+        return self._hash_join_tuples(other, on_self, on_other)
 
     def equi_join(self, other, on):
         """Performs an equi-join between two relations
@@ -270,8 +652,8 @@ class Relation(_BaseRelation):
             return self.product(other)
 
         attributes = self.attributes | other.attributes
-        tuples = self._join_tuples_on(self.tuples, other, on)
-        return Relation(attributes, tuples)
+        tuples = self._join_tuples_on(other, on)
+        return _combined(attributes, tuples)
 
     def inner_join(self, other, on):
         """Performs an inner-join between two relations
@@ -294,7 +676,14 @@ class Relation(_BaseRelation):
         inner joins.
 
         """
-        # An inner-join is just sugar for sigma_CRITERIA(a X b)
+        # An inner-join is just sugar for sigma_CRITERIA(a X b). As
+        # the criteria can be any predicate this is the only join
+        # that has to fall back to looking at every pair of tuples.
+        # Criteria which can be inspected are handed to the planner,
+        # which turns equalities between the two sides into an
+        # equi-join and filters each side before joining.
+        if referenced(on) is not None:
+            return self.lazy().inner_join(other, on).evaluate()
         return self.product(other).select(on)
 
     def join(self, other):
@@ -317,19 +706,183 @@ class Relation(_BaseRelation):
             # The new relation will have the union of the two relation's attributes
             attributes = self.attributes | other.attributes
             common = self.attributes & other.attributes
-            tuples = self._join_tuples_on(self.tuples, other.tuples, common)
-            return Relation(attributes, tuples)
+            tuples = self._join_tuples_naturally_on(other, common)
+            return _combined(attributes, tuples)
+
+    def join_all(self, *others):
+        """Naturally joins this relation with several others
+
+        Rather than joining the relations in the order given, the
+        order and the algorithm of each join are chosen based on the
+        statistics of the relations, see rel.statistics.plan_joins.
+
+        """
+        from rel.statistics import join_all
+        return join_all((self, ) + others)
+
+    def external_join(self, other, on=None, memory=None, directory=None):
+        """Joins two relations without holding them both in memory
+
+        Joins naturally, or on pairs of attribute names like
+        equi_join, by sorting both relations into runs on disk within
+        a budget of memory bytes and merging them. Returns a stream
+        relation, see rel.external.join.
+
+        """
+        from rel import external
+        if memory is None:
+            memory = external.MEMORY
+        return external.join(self, other, on, memory, directory)
+
+    def _matching(self, other):
+        # The keys of the other relation on the common attributes. When
+        # there are no common attributes every tuple matches, as long as
+        # the other relation has any tuples at all.
+        names = sorted(attr.name for attr in self.attributes & other.attributes)
+        keys = set(tuple(t[name] for name in names) for t in other.tuples)
+        return names, keys
+
+    def semijoin(self, other):
+        """Keeps the tuples which have a match in the other relation
+
+        The semijoin is the join of the two relations projected back
+        onto the attributes of this relation. Rather than building
+        the join, the values of the common attributes in the other
+        relation are collected into a set which the tuples of this
+        relation are looked up in.
+
+        """
+        names, keys = self._matching(other)
+        return Relation._trusted(self._attributes,
+                                 (t for t in self._tuples
+                                  if tuple(t[name] for name in names) in keys))
+
+    def antijoin(self, other):
+        """Keeps the tuples which have no match in the other relation
+
+        The antijoin is the complement of the semijoin, the relation
+        minus its semijoin with the other relation.
+
+        """
+        names, keys = self._matching(other)
+        return Relation._trusted(self._attributes,
+                                 (t for t in self._tuples
+                                  if tuple(t[name] for name in names) not in keys))
+
+    def _division_header(self, divisor, great):
+        # The attributes shared with the divisor must agree on their
+        # domains, and for the small divide the divisor can't have any
+        # attributes of its own.
+        shared = self.attributes & divisor.attributes
+        names = set(attr.name for attr in shared)
+        rest = [attr for attr in divisor.attributes if attr not in shared]
+        clashing = any(attr.name in self._attributes_by_name for attr in rest)
+        if clashing or (rest and not great):
+            msg = "Can't divide relation with attributes {0} by {1}"
+            raise exc.IncompatibleHeaders(msg.format(self.attributes,
+                                                     divisor.attributes))
+        quotient = set(attr for attr in self._attributes if attr not in shared)
+        return sorted(names), quotient, set(rest)
+
+    def _quotient(self, attributes, tuples):
+        # Like a projection onto the empty set of attributes, a
+        # quotient without attributes is either Dee or Doe.
+        if len(attributes) == 0:
+            return Dee if any(True for t in tuples) else Doe
+        return Relation._trusted(attributes, tuples)
+
+    def divide(self, divisor):
+        """Keeps the tuples matching every tuple of the divisor
+
+        The attributes of the divisor must all be attributes of this
+        relation, the dividend. The quotient has the remaining
+        attributes, and holds those of their values which appear in
+        the dividend together with every tuple of the divisor, as in
+        "the suppliers supplying all of these parts".
+
+        The dividend is grouped on the quotient attributes in a single
+        pass, counting the distinct divisor tuples found in each
+        group. Dividing by an empty divisor gives the projection of
+        the dividend onto the quotient attributes.
+
+        """
+        names, quotient, _ = self._division_header(divisor, False)
+        quotient_names = [attr.name for attr in quotient]
+
+        required = set(tuple(t[name] for name in names) for t in divisor.tuples)
+        # Groups without any matches are kept as well, as they are
+        # all part of the quotient of an empty divisor.
+        found = {}
+        for t in self._tuples:
+            matches = found.setdefault(t.project(quotient_names), set())
+            value = tuple(t[name] for name in names)
+            if value in required:
+                matches.add(value)
+
+        n = len(required)
+        return self._quotient(quotient,
+                              (key for (key, matched) in found.items()
+                               if len(matched) == n))
+
+    def great_divide(self, divisor):
+        """Divides by a divisor with attributes of its own
+
+        The attributes shared by the two relations are divided out.
+        For each tuple of the divisor's own attributes, the quotient
+        pairs it with every tuple of the dividend's own attributes
+        which appears in the dividend with all of the shared values
+        the divisor holds for it. A divisor without attributes of its
+        own gives the same result as divide, unless it is empty.
+
+        Rather than comparing the groups of the two relations pair by
+        pair, each group of the dividend counts how many of the
+        values required by each divisor group it has.
+
+        """
+        names, quotient, extra = self._division_header(divisor, True)
+        quotient_names = [attr.name for attr in quotient]
+        extra_names = [attr.name for attr in extra]
+
+        # The number of shared values required by each group of the
+        # divisor, and the groups requiring each value.
+        required = collections.Counter()
+        needed_by = collections.defaultdict(list)
+        for t in divisor.tuples:
+            group = t.project(extra_names)
+            required[group] += 1
+            needed_by[tuple(t[name] for name in names)].append(group)
+
+        found = collections.defaultdict(set)
+        for t in self._tuples:
+            value = tuple(t[name] for name in names)
+            if value in needed_by:
+                found[t.project(quotient_names)].add(value)
+
+        def tuples():
+            for (key, matched) in found.items():
+                counts = collections.Counter()
+                for value in matched:
+                    counts.update(needed_by[value])
+                for (group, count) in counts.items():
+                    if count == required[group]:
+                        yield key.union(group)
+
+        return self._quotient(quotient | extra, tuples())
 
     def _is_super_key(self, key):
 
         if isinstance(key, str):
             key = (key, )
-        # If the cardinality of the entire relation is the same as
-        # the cardinality of the projection of the relation onto the
-        # key components are equal then the key is a super key.
-        orig = len(self._tuples)
-        
-        return len(self.project(key)) == orig
+        # The key is a super key unless two tuples share the values
+        # of the key components, which is known as soon as the first
+        # such pair is found.
+        seen = set()
+        for t in self._tuples:
+            row_values = tuple(t[name] for name in key)
+            if row_values in seen:
+                return False
+            seen.add(row_values)
+        return True
 
     @property
     def _attributes_powerset(self):
@@ -339,32 +892,66 @@ class Relation(_BaseRelation):
 
     @property
     def super_keys(self):
+        return self.find_super_keys()
+
+    def find_super_keys(self, approximate=False):
+        """Yields the sets of attributes which are keys
+
+        See find_candidate_keys for the approximate search.
+
+        """
         names = set(self.attribute_names)
 
         # The full collection of attributes is always a super key
         yield names
 
+        # Any set of attributes containing a candidate key is a super
+        # key, so there is no need to look at the tuples again.
+        candidates = self.find_candidate_keys(approximate)
         for key in self._attributes_powerset:
-            if self._is_super_key(key):
+            if any(c.issubset(key) for c in candidates):
                 yield set(key)
 
     @property
     def candidate_keys(self):
-        sk = list(self.super_keys)
+        """The minimal sets of attributes which are keys
 
-        # If the set of super-keys is smaller than 2. That is a
-        # relation of either the 0th or 1st order.
+        A super-key is a candidate key unless there exists another
+        super-key such that its attributes are a proper subset of
+        the attributes of the first. The candidate keys are found by
+        a level-wise search over the sets of attributes, smallest
+        first, which never looks at supersets of keys it has already
+        found.
 
-        if len(sk) <= 1:
-            return sk
-        
-        # A super-key is a candidate key unless there exists another
-        # super-key, k2, such that the attributes of key are proper
-        # subset of k2. That is to say something is not a candidate
-        # key if you can use some but not all of its attributes to
-        # create a super-key.
-        return [k for k in sk 
-                if not any(k2 < k for k2 in sk)]
+        """
+        return self.find_candidate_keys()
+
+    def find_candidate_keys(self, approximate=False):
+        """Returns the candidate keys, see candidate_keys
+
+        With approximate set, attribute sets are ruled out using
+        distinct count sketches and a sample of the tuples, and only
+        the remaining sets are checked exactly, see
+        rel.sketch.candidate_keys. This is much faster for wide
+        relations, but may in rare cases miss a key.
+
+        """
+        if approximate:
+            from rel import sketch
+            return sketch.candidate_keys(self)
+        return dependencies.candidate_keys(self)
+
+    @property
+    def functional_dependencies(self):
+        """The minimal functional dependencies holding in the relation
+
+        A functional dependency X -> A holds if no two tuples agree on
+        the attributes X while disagreeing on A. Only the
+        dependencies where A is not part of X and where no subset of
+        X determines A are returned.
+
+        """
+        return dependencies.functional_dependencies(self)
 
 
 # We call the empty tuple et for readability
@@ -0,0 +1,262 @@
+"""Approximate distinct counts and key discovery
+
+Telling whether a set of attributes is a key means counting the
+distinct values the relation has for them, which takes memory and time
+proportional to the relation. A sketch estimates the count instead.
+
+A HyperLogLog sketch hashes every value and keeps, for each of a fixed
+number of registers, the longest run of leading zero bits seen among
+the hashes falling into it. The count is estimated from the registers
+with a relative error of about 1.04 / sqrt(registers), no matter how
+many values were added. A sample of the tuples gives a second, cruder
+estimate, which needs no pass over the relation at all once the
+sample has been drawn.
+
+Approximate key discovery uses both to rule out attribute sets before
+checking them exactly. Two sampled tuples agreeing on a set of
+attributes prove that it isn't a key, while sketches counting clearly
+fewer distinct values than there are tuples make it all but certain.
+Only the sets surviving both are checked against the relation, and
+the check stops at the first duplicate it finds.
+"""
+import math
+import operator
+import random
+
+from rel.dependencies import _next_level
+from rel.relation import _MASK, _mix
+
+
+# The number of bits of the hashes picking the register, giving 2 **
+# PRECISION registers.
+PRECISION = 12
+
+# The number of tuples sampled.
+SAMPLE = 1024
+
+# How many standard errors below the number of tuples a sketch has to
+# be before the attribute set is taken not to be a key.
+MARGIN = 4
+
+
+class HyperLogLog(object):
+    """A sketch estimating the number of distinct values added to it"""
+
+    def __init__(self, precision=PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+        self._bits = 64 - precision
+        self._low = (1 << self._bits) - 1
+
+    def add(self, value):
+        self.add_hash(_mix(hash(value) & _MASK))
+
+    def add_hash(self, h):
+        """Adds a well mixed 64 bit hash"""
+        i = h >> self._bits
+        rank = self._bits - (h & self._low).bit_length() + 1
+        if rank > self.registers[i]:
+            self.registers[i] = rank
+
+    def merge(self, other):
+        """Adds all the values added to another sketch"""
+        if other.precision != self.precision:
+            raise ValueError("Can't merge sketches of different precision")
+        self.registers = bytearray(max(a, b) for (a, b)
+                                   in zip(self.registers, other.registers))
+
+    @property
+    def error(self):
+        """The relative standard error of the estimates"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Few values leave many registers empty, which linear
+            # counting estimates better.
+            estimate = m * math.log(m / zeros)
+        return estimate
+
+    def __repr__(self):
+        return "HyperLogLog(precision={0}, estimate={1})".format(
+            self.precision, int(round(self.estimate())))
+
+
+def gee(values, total):
+    """Estimates the distinct values of a relation from a sample
+
+    The guaranteed error estimator scales up the values seen exactly
+    once in the sample, as those stand in for the values the sample
+    missed, while the values seen more than once are counted as they
+    are. Total is the number of tuples sampled from.
+
+    """
+    counts = {}
+    for v in values:
+        counts[v] = counts.get(v, 0) + 1
+    if not counts:
+        return 0.0
+    once = sum(1 for c in counts.values() if c == 1)
+    return math.sqrt(float(total) / len(values)) * once + (len(counts) - once)
+
+
+def _getter(positions):
+    # Picks the values at the positions out of a tuple of values, as
+    # a tuple even for a single position.
+    if len(positions) == 1:
+        i = positions[0]
+        return lambda values: (values[i], )
+    return operator.itemgetter(*positions)
+
+
+def sketches(tuples, attribute_sets, precision=PRECISION, sample=0, seed=None):
+    """Sketches several sets of attributes in a single pass
+
+    Returns the sketch of each set of attribute names, along with a
+    sample of the tuples of the given size, drawn uniformly at random,
+    and the number of tuples. The seed fixes the random choices, but
+    the sample only repeats if the tuples come in the same order too,
+    which for sets of tuples depends on the hash seed of Python.
+
+    """
+    attribute_sets = [tuple(names) for names in attribute_sets]
+    # The values of every attribute sketched are read from each tuple
+    # once, and the sets pick theirs out of those.
+    names = sorted(set(name for names in attribute_sets for name in names))
+    positions = dict((name, i) for (i, name) in enumerate(names))
+    sketched = [(HyperLogLog(precision),
+                 _getter([positions[name] for name in x]))
+                for x in attribute_sets]
+    rng = random.Random(seed)
+    reservoir = []
+
+    # HyperLogLog.add_hash is inlined, as this is the inner loop.
+    bits = 64 - precision
+    low = (1 << bits) - 1
+    registers = [(sketch.registers, get) for (sketch, get) in sketched]
+
+    n = 0
+    for t in tuples:
+        values = tuple(t[name] for name in names)
+        for (r, get) in registers:
+            h = _mix(hash(get(values)) & _MASK)
+            i = h >> bits
+            rank = bits - (h & low).bit_length() + 1
+            if rank > r[i]:
+                r[i] = rank
+        if n < sample:
+            reservoir.append(t)
+        elif sample:
+            j = rng.randrange(n + 1)
+            if j < sample:
+                reservoir[j] = t
+        n += 1
+
+    found = dict((x, sketch)
+                 for (x, (sketch, _)) in zip(attribute_sets, sketched))
+    return found, reservoir, n
+
+
+def estimate_distinct(relation, attribute_names, precision=PRECISION):
+    """Estimates the cardinality of a projection of the relation"""
+    names = tuple(attribute_names)
+    found, _, _ = sketches(relation.tuples, [names], precision)
+    return found[names].estimate()
+
+
+def estimate_distinct_sampled(relation, attribute_names, size=SAMPLE, seed=None):
+    """Estimates the cardinality of a projection from a sample
+
+    The tuples are sampled in the order of the set holding them, so
+    the estimate varies between runs of Python even with a seed.
+
+    """
+    names = tuple(attribute_names)
+    _, sample, n = sketches(relation.tuples, [], sample=size, seed=seed)
+    return gee([tuple(t[name] for name in names) for t in sample], n)
+
+
+def _duplicated(tuples, names):
+    # Whether two of the tuples agree on the attributes.
+    seen = set()
+    for t in tuples:
+        values = tuple(t[name] for name in names)
+        if values in seen:
+            return True
+        seen.add(values)
+    return False
+
+
+def _keys(tuples, attribute_sets):
+    # Checks exactly which of the sets of attribute names are keys,
+    # in a single pass dropping each set at its first duplicate.
+    names = sorted(set(name for names in attribute_sets for name in names))
+    positions = dict((name, i) for (i, name) in enumerate(names))
+    checks = dict((x, (_getter([positions[name] for name in x]), set()))
+                  for x in attribute_sets)
+    for t in tuples:
+        if not checks:
+            break
+        values = tuple(t[name] for name in names)
+        for (x, (get, seen)) in list(checks.items()):
+            key = get(values)
+            if key in seen:
+                del checks[x]
+            else:
+                seen.add(key)
+    return set(checks)
+
+
+def candidate_keys(relation, precision=PRECISION, sample=SAMPLE, seed=None):
+    """Finds the candidate keys, ruling out most non-keys by estimates
+
+    The attribute sets are searched level-wise like
+    rel.dependencies.candidate_keys, never visiting supersets of keys.
+    A single pass sketches every attribute and draws a sample of the
+    tuples. Sets duplicated in the sample are certainly not keys. A
+    set can't have more distinct values than the product of those of
+    one of its attributes and of the rest of it, and sets whose bound
+    falls clearly short of the number of tuples are taken not to be
+    keys either. The remaining sets of a level are checked exactly in
+    a single pass.
+
+    A key whose sketches underestimate it by more than the margin is
+    missed, which becomes less likely the higher the precision.
+
+    """
+    names = list(relation.attribute_names)
+    if relation.cardinality <= 1:
+        return [set()]
+
+    level = [(name, ) for name in names]
+    found, drawn, n = sketches(relation.tuples, level, precision, sample, seed)
+    tolerance = MARGIN * 1.04 / math.sqrt(1 << precision)
+    short = n * (1 - tolerance)
+
+    # Upper bounds on the number of distinct values of attribute sets.
+    bounds = dict((x, min(n, found[x].estimate() * (1 + tolerance)))
+                  for x in level)
+    keys = []
+    while level:
+        likely = []
+        for x in level:
+            if len(x) > 1:
+                bounds[x] = min(bounds[x[:i] + x[i + 1:]] * bounds[(a, )]
+                                for (i, a) in enumerate(x))
+            if bounds[x] >= short and not _duplicated(drawn, x):
+                likely.append(x)
+
+        confirmed = _keys(relation.tuples, likely) if likely else set()
+        keys.extend(set(x) for x in level if x in confirmed)
+
+        # Attribute sets are handled as tuples of positions while
+        # building the next level, which keeps them in name order.
+        non_keys = set(tuple(names.index(name) for name in x)
+                       for x in level if x not in confirmed)
+        level = [tuple(names[i] for i in candidate)
+                 for (candidate, _, _) in _next_level(non_keys)]
+    return keys
@@ -0,0 +1,335 @@
+"""Statistics on relations and cost based ordering of joins
+
+The statistics of a relation are its cardinality and, for every
+attribute, the number of distinct values and a histogram of how they
+are distributed. They are collected in a single pass the first time
+they are needed and kept with the relation, which never changes.
+
+The statistics let us estimate the size of a join without performing
+it. Joining many relations is planned by searching for the order, and
+the algorithm of each join, whose intermediate results are expected to
+be the smallest. For a handful of relations every order is considered,
+for more the cheapest join is picked greedily one at the time.
+"""
+import bisect
+import itertools
+
+from rel.relation import _combined
+
+
+# The number of buckets of the histograms.
+BUCKETS = 16
+
+# The number of relations up to which every join order is considered.
+EXHAUSTIVE = 10
+
+
+class Histogram(object):
+    """An equi-depth histogram of the values of an attribute
+
+    The boundaries are the values found at evenly spaced ranks among
+    the sorted values, so each bucket holds about as many values as
+    any other.
+    """
+
+    def __init__(self, ordered, buckets=BUCKETS):
+        n = len(ordered)
+        if n == 0:
+            self.bounds = []
+        else:
+            ranks = sorted(set(min(n - 1, (i * n) // buckets)
+                               for i in range(buckets + 1)) | set([n - 1]))
+            self.bounds = [ordered[i] for i in ranks]
+
+    def fraction_below(self, value, inclusive=True):
+        """The estimated fraction of the values below a value"""
+        if not self.bounds:
+            return 0.0
+        find = bisect.bisect_right if inclusive else bisect.bisect_left
+        return find(self.bounds, value) / len(self.bounds)
+
+    def fraction_between(self, low, high):
+        """The estimated fraction of the values within a closed range"""
+        if not self.bounds:
+            return 0.0
+        if high < self.bounds[0] or low > self.bounds[-1]:
+            return 0.0
+        # Ranges reaching past both ends cover everything, which the
+        # coarse buckets would otherwise underestimate.
+        if low <= self.bounds[0] and high >= self.bounds[-1]:
+            return 1.0
+        fraction = (self.fraction_below(high) -
+                    self.fraction_below(low, inclusive=False))
+        return min(1.0, max(fraction, 1.0 / len(self.bounds)))
+
+    def __repr__(self):
+        return "Histogram({0})".format(repr(self.bounds))
+
+
+class ColumnStatistics(object):
+    """The statistics of a single attribute
+
+    Values which can't be ordered have neither a minimum, a maximum
+    nor a histogram.
+    """
+
+    def __init__(self, distinct, minimum=None, maximum=None, histogram=None):
+        self.distinct = distinct
+        self.minimum = minimum
+        self.maximum = maximum
+        self.histogram = histogram
+
+    @classmethod
+    def collect(cls, values):
+        distinct = len(set(values))
+        try:
+            ordered = sorted(values)
+        except TypeError:
+            return cls(distinct)
+        if not ordered:
+            return cls(0)
+        return cls(distinct, ordered[0], ordered[-1], Histogram(ordered))
+
+    def overlap(self, other):
+        # The estimated fraction of our values lying within the range
+        # of the values of the other attribute.
+        if self.histogram is None or other.minimum is None:
+            return 1.0
+        try:
+            return self.histogram.fraction_between(other.minimum, other.maximum)
+        except TypeError:
+            return 1.0
+
+    def __repr__(self):
+        return "ColumnStatistics(distinct={0}, minimum={1}, maximum={2})".format(
+            self.distinct, repr(self.minimum), repr(self.maximum))
+
+
+class Statistics(object):
+    def __init__(self, cardinality, columns):
+        self.cardinality = cardinality
+        self.columns = columns
+
+    @classmethod
+    def collect(cls, relation):
+        names = relation.attribute_names
+        rows = [tuple(t[name] for name in names) for t in relation.tuples]
+        columns = dict((name, ColumnStatistics.collect([row[i] for row in rows]))
+                       for (i, name) in enumerate(names))
+        return cls(len(rows), columns)
+
+    def distinct(self, name):
+        return self.columns[name].distinct
+
+    def __repr__(self):
+        return "Statistics(cardinality={0}, columns={1})".format(
+            self.cardinality, repr(self.columns))
+
+
+def statistics(relation):
+    """The statistics of a relation, collected on first use"""
+    if relation._statistics is None:
+        relation._statistics = Statistics.collect(relation)
+    return relation._statistics
+
+
+def estimate_join(left, right, names):
+    """Estimates the cardinality of a natural join
+
+    Both sides are given as statistics. Each attribute joined on is
+    assumed to match values independently of the others, with the
+    values of the side with fewer distinct values found on the other
+    side, as far as their ranges overlap.
+
+    """
+    rows = float(left.cardinality) * right.cardinality
+    for name in names:
+        l, r = left.columns[name], right.columns[name]
+        fl, fr = l.overlap(r), r.overlap(l)
+        largest = max(l.distinct * fl, r.distinct * fr, 1.0)
+        rows *= fl * fr / largest
+    return rows
+
+
+def _joined_statistics(left, right, names, rows):
+    # Statistics of the result of a join. The values of the attributes
+    # joined on are those the two sides have in common, while the
+    # other attributes keep their values, of which there can't be
+    # more than there are tuples.
+    columns = {}
+    for (name, column) in itertools.chain(left.columns.items(),
+                                          right.columns.items()):
+        if name in names:
+            other = right.columns[name]
+            distinct = min(column.distinct, other.distinct)
+        else:
+            distinct = column.distinct
+        columns[name] = ColumnStatistics(min(distinct, max(1, int(rows))),
+                                         column.minimum, column.maximum,
+                                         column.histogram)
+    return Statistics(rows, columns)
+
+
+# The physical join algorithms.
+HASH = "hash"
+NESTED_LOOP = "nested loop"
+
+
+class Leaf(object):
+    """A relation taking part in a multi-way join"""
+
+    def __init__(self, position, relation):
+        self.position = position
+        self.relation = relation
+        self.attributes = relation.attributes
+        self.statistics = statistics(relation)
+        self.rows = float(relation.cardinality)
+        self.cost = 0.0
+        self.actual = None
+
+    def execute(self):
+        self.actual = self.relation.cardinality
+        return self.relation
+
+    def explain(self, depth=0):
+        return "{0}Relation #{1} (rows={2})".format("  " * depth, self.position,
+                                                     int(self.rows))
+
+
+class JoinStep(object):
+    """A join of two inputs, either leaves or other joins"""
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.attributes = left.attributes | right.attributes
+        self.names = sorted(attr.name for attr in left.attributes & right.attributes)
+
+        if self.names:
+            self.rows = estimate_join(left.statistics, right.statistics, self.names)
+        else:
+            self.rows = left.rows * right.rows
+        self._statistics = None
+
+        # A hash join looks at each tuple once, a nested loop at every
+        # pair of tuples, which only pays off when one side is all but
+        # empty. Without attributes in common there is nothing to
+        # hash on.
+        hashing = left.rows + right.rows
+        looping = left.rows * right.rows
+        if self.names and hashing < looping:
+            self.method, work = HASH, hashing
+        else:
+            self.method, work = NESTED_LOOP, looping
+
+        # The cost of a plan is the work done by all of its joins
+        # along with the size of all the intermediate results.
+        self.cost = left.cost + right.cost + work + self.rows
+        self.actual = None
+
+    @property
+    def statistics(self):
+        # Only the steps which end up in the plan ever need them.
+        if self._statistics is None:
+            self._statistics = _joined_statistics(self.left.statistics,
+                                                  self.right.statistics,
+                                                  self.names, self.rows)
+        return self._statistics
+
+    def execute(self):
+        left, right = self.left.execute(), self.right.execute()
+        attributes = left.attributes | right.attributes
+        if not self.names:
+            result = left.product(right)
+        elif self.method == HASH:
+            result = _combined(attributes,
+                               left._hash_join_tuples(right, self.names, self.names))
+        else:
+            result = _combined(attributes,
+                               left._nested_loop_tuples(right, self.names, self.names))
+        self.actual = result.cardinality
+        return result
+
+    def explain(self, depth=0):
+        if self.names:
+            label = "{0} join on {1}".format(self.method.capitalize(),
+                                             ", ".join(self.names))
+        else:
+            label = "Product"
+        line = "{0}{1} (rows={2}, cost={3}".format("  " * depth, label,
+                                                   int(round(self.rows)),
+                                                   int(round(self.cost)))
+        if self.actual is not None:
+            line += ", actual={0}".format(self.actual)
+        return "\n".join([line + ")",
+                          self.left.explain(depth + 1),
+                          self.right.explain(depth + 1)])
+
+
+class JoinPlan(object):
+    """The order and algorithms chosen for joining several relations"""
+
+    def __init__(self, root):
+        self.root = root
+
+    @property
+    def cost(self):
+        return self.root.cost
+
+    def execute(self):
+        return self.root.execute()
+
+    def explain(self):
+        return self.root.explain()
+
+
+def _exhaustive(leaves):
+    # Dynamic programming over the subsets of the relations, where the
+    # cheapest plan for a subset combines the cheapest plans of two
+    # complementary parts of it.
+    best = dict((1 << i, leaf) for (i, leaf) in enumerate(leaves))
+    full = (1 << len(leaves)) - 1
+
+    for size in range(2, len(leaves) + 1):
+        for members in itertools.combinations(range(len(leaves)), size):
+            mask = sum(1 << i for i in members)
+            candidate = None
+            part = (mask - 1) & mask
+            while part:
+                rest = mask ^ part
+                # Each split is visited twice, once from either side.
+                if part < rest:
+                    step = JoinStep(best[part], best[rest])
+                    if candidate is None or step.cost < candidate.cost:
+                        candidate = step
+                part = (part - 1) & mask
+            best[mask] = candidate
+    return best[full]
+
+
+def _greedy(leaves):
+    # Repeatedly joins the pair of inputs with the cheapest join.
+    nodes = list(leaves)
+    while len(nodes) > 1:
+        step = min((JoinStep(a, b) for (a, b) in itertools.combinations(nodes, 2)),
+                   key=lambda s: s.cost)
+        nodes = [n for n in nodes if n is not step.left and n is not step.right]
+        nodes.append(step)
+    return nodes[0]
+
+
+def plan_joins(relations):
+    """Plans the natural join of several relations"""
+    relations = list(relations)
+    if not relations:
+        raise ValueError("Can't join an empty collection of relations")
+
+    leaves = [Leaf(i, relation) for (i, relation) in enumerate(relations)]
+    if len(leaves) <= EXHAUSTIVE:
+        return JoinPlan(_exhaustive(leaves))
+    return JoinPlan(_greedy(leaves))
+
+
+def join_all(relations):
+    """Naturally joins several relations in the cheapest order found"""
+    return plan_joins(relations).execute()
@@ -0,0 +1,392 @@
+"""Binary on-disk storage of relations
+
+Relations are saved column by column. The file starts with a small
+header describing the attributes and where the column of each one is
+stored, after which the columns follow. Integers, floats and booleans
+are stored as raw machine values, strings and bytes as a table of
+offsets into a blob of data, and anything else as a single pickled
+list per column.
+
+Loading a file maps it into memory rather than reading it, and the
+columns of the relation are views straight into the mapped file. Only
+the columns actually used by an operator are ever touched, and no
+tuple is built before it is needed.
+
+Files are not trusted by default. Domains other than the builtin types
+and pickled values other than those of the builtin types are refused,
+as loading them means importing modules and calling functions named by
+the file, which lets whoever wrote it run arbitrary code. Only load
+files you trust with trusted=True.
+"""
+import array
+import builtins
+import importlib
+import io
+import json
+import mmap
+import pickle
+import struct
+import sys
+
+from rel import exc
+from rel.predicate import (compile_predicate, is_contradiction, is_expression,
+                           is_tautology, referenced)
+from rel.relation import Attribute, Relation
+from rel.structure import Header, PositionalTuple
+
+
+MAGIC = b"RELB"
+VERSION = 1
+
+# Magic, version and the length of the JSON header.
+_preamble = struct.Struct("<4sIQ")
+
+# The formats of the columns stored as raw machine values, as
+# understood by memoryview.cast and the array module.
+_fixed = {
+    "int64": "q",
+    "float64": "d",
+    "bool": "?",
+}
+
+_builtin_types = dict((t.__name__, t)
+                      for t in (int, float, bool, str, bytes, complex, object))
+
+
+def _type_name(t):
+    # Domains made up of several types are stored as lists of names.
+    if isinstance(t, tuple):
+        return [_type_name(member) for member in t]
+    if _builtin_types.get(t.__name__) is t:
+        return t.__name__
+    return "{0}:{1}".format(t.__module__, t.__qualname__)
+
+
+# The builtin types whose values pickled columns of untrusted files
+# may contain, besides the types of the domains.
+_pickled_types = frozenset(["int", "float", "bool", "str", "bytes", "complex",
+                            "tuple", "list", "dict", "set", "frozenset"])
+
+
+def _type_from_name(name, trusted):
+    if isinstance(name, list):
+        return tuple(_type_from_name(member, trusted) for member in name)
+    if name in _builtin_types:
+        return _builtin_types[name]
+    if not trusted:
+        raise exc.UntrustedFile("Refusing to import the domain {0} of an "
+                                "untrusted file".format(name))
+
+    module, qualname = name.split(":")
+    t = importlib.import_module(module)
+    for part in qualname.split("."):
+        t = getattr(t, part)
+    return t
+
+
+class _Unpickler(pickle.Unpickler):
+    # Unpickles the values of the builtin types only.
+
+    def find_class(self, module, name):
+        if module == "builtins" and name in _pickled_types:
+            return getattr(builtins, name)
+        raise exc.UntrustedFile("Refusing to unpickle {0}.{1} from an "
+                                "untrusted file".format(module, name))
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def _kind(values):
+    # The most compact way of storing a column, depending on the
+    # values it actually contains.
+    types = set(type(v) for v in values)
+
+    if types == set([bool]):
+        return "bool"
+    if types == set([float]):
+        return "float64"
+    if types == set([int]) and all(-2 ** 63 <= v < 2 ** 63 for v in values):
+        return "int64"
+    if types == set([str]):
+        return "str"
+    if types == set([bytes]):
+        return "bytes"
+    return "pickle"
+
+
+def _encode(kind, values):
+    if kind == "bool":
+        # The array module has no booleans, so they are written as
+        # single bytes the way memoryview reads them.
+        return bytes(values)
+
+    if kind in _fixed:
+        return array.array(_fixed[kind], values).tobytes()
+
+    if kind in ("str", "bytes"):
+        if kind == "str":
+            values = [v.encode("utf-8") for v in values]
+        offsets = array.array("q", [0])
+        for v in values:
+            offsets.append(offsets[-1] + len(v))
+        return offsets.tobytes() + b"".join(values)
+
+    return pickle.dumps(list(values), pickle.HIGHEST_PROTOCOL)
+
+
+def save(relation, path):
+    """Saves a relation to a file which can later be loaded with load"""
+    names = sorted(relation.attribute_names)
+    rows = [tuple(t[name] for name in names) for t in relation.tuples]
+
+    columns, blocks = [], []
+    offset = 0
+    for (i, name) in enumerate(names):
+        values = [row[i] for row in rows]
+        kind = _kind(values)
+        block = _encode(kind, values)
+
+        columns.append({
+            "name": name,
+            "type": _type_name(relation.attribute(name).type),
+            "kind": kind,
+            "offset": offset,
+            "length": len(block),
+        })
+        blocks.append(block)
+        offset = _align(offset + len(block))
+
+    header = json.dumps({
+        "cardinality": len(rows),
+        "byteorder": sys.byteorder,
+        "columns": columns,
+    }).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(_preamble.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        start = _align(_preamble.size + len(header))
+        f.write(b"\0" * (start - _preamble.size - len(header)))
+
+        for (column, block) in zip(columns, blocks):
+            f.write(b"\0" * (start + column["offset"] - f.tell()))
+            f.write(block)
+
+
+class _VariableColumn(object):
+    # A column of strings or bytes, decoding values one at the time
+    # from the mapped file.
+
+    def __init__(self, offsets, data, decode):
+        self._offsets = offsets
+        self._data = data
+        self._decode = decode
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        value = self._data[self._offsets[i]:self._offsets[i + 1]]
+        return self._decode(value)
+
+    def __iter__(self):
+        offsets, data, decode = self._offsets, self._data, self._decode
+        for i in range(len(self)):
+            yield decode(data[offsets[i]:offsets[i + 1]])
+
+
+class MappedRelation(object):
+    """A relation backed by a memory mapped file
+
+    Unless trusted, only files with builtin domains and values can be
+    read, see the module documentation.
+
+    """
+
+    def __init__(self, path, trusted=False):
+        self._trusted = trusted
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+
+        magic, version, length = _preamble.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise exc.InvalidTuple("{0} is not a saved relation".format(path))
+
+        header = json.loads(self._map[_preamble.size:_preamble.size + length]
+                            .decode("utf-8"))
+        self._start = _align(_preamble.size + length)
+        self._length = header["cardinality"]
+        self._swap = header["byteorder"] != sys.byteorder
+
+        self._layout = dict((c["name"], c) for c in header["columns"])
+        try:
+            self._attributes = set(
+                Attribute(_type_from_name(c["type"], trusted), c["name"])
+                for c in header["columns"])
+        except exc.UntrustedFile:
+            self.close()
+            raise
+        self._attributes_by_name = dict((attr.name, attr)
+                                        for attr in self._attributes)
+        self._columns = {}
+
+    def close(self):
+        # The views into the mapping have to be released before it can
+        # be closed, views derived from others first.
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._columns = {}
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _view(self, offset, length):
+        start = self._start + offset
+        view = memoryview(self._map)[start:start + length]
+        self._views.append(view)
+        return view
+
+    def _fixed_view(self, fmt, offset, length):
+        view = self._view(offset, length)
+        if self._swap and struct.calcsize(fmt) > 1:
+            # Files written on a machine with the other byte order
+            # have to be copied and swapped.
+            values = array.array(fmt, view.tobytes())
+            values.byteswap()
+            return values
+
+        cast = view.cast(fmt)
+        self._views.append(cast)
+        return cast
+
+    def column(self, name):
+        """Returns the values of an attribute as a sequence"""
+        if name in self._columns:
+            return self._columns[name]
+
+        layout = self._layout[name]
+        kind, offset, length = layout["kind"], layout["offset"], layout["length"]
+
+        if kind in _fixed:
+            column = self._fixed_view(_fixed[kind], offset, length)
+        elif kind in ("str", "bytes"):
+            size = 8 * (self._length + 1)
+            offsets = self._fixed_view("q", offset, size)
+            data = self._view(offset + size, length - size)
+            if kind == "str":
+                decode = lambda v: str(v, "utf-8")
+            else:
+                decode = bytes
+            column = _VariableColumn(offsets, data, decode)
+        elif self._trusted:
+            column = pickle.loads(self._view(offset, length))
+        else:
+            column = _Unpickler(io.BytesIO(self._view(offset, length))).load()
+
+        self._columns[name] = column
+        return column
+
+    @property
+    def attributes(self):
+        return self._attributes
+
+    @property
+    def attribute_names(self):
+        return [attr.name for attr in self._attributes]
+
+    def attribute(self, name):
+        return self._attributes_by_name.get(name)
+
+    @property
+    def cardinality(self):
+        return self._length
+
+    @property
+    def order(self):
+        return len(self._attributes)
+
+    def __len__(self):
+        return self.cardinality
+
+    def _rows(self, names=None):
+        if names is None:
+            names = sorted(self._layout)
+        header = Header(names)
+        columns = [self.column(name) for name in names]
+
+        if len(columns) == 0:
+            return (PositionalTuple(header, ()) for _ in range(self._length))
+        return (PositionalTuple(header, values) for values in zip(*columns))
+
+    @property
+    def tuples(self):
+        return set(self._rows())
+
+    def __eq__(self, other):
+        return (
+            self.attributes == other.attributes and
+            self.tuples == other.tuples
+        )
+
+    def __repr__(self):
+        return "MappedRelation({0}, {1})".format(repr(self._attributes),
+                                                 self._length)
+
+    def to_relation(self):
+        return Relation._trusted(self._attributes, self._rows())
+
+    def project(self, attribute_names):
+        # Only the columns being projected onto are read.
+        names = sorted(set(attribute_names))
+        attr = set(self.attribute(name) for name in names)
+        return Relation._trusted(attr, self._rows(names))
+
+    def select(self, expr):
+        if is_tautology(expr):
+            return self.to_relation()
+        elif is_contradiction(expr):
+            return Relation._trusted(self._attributes, ())
+        elif callable(expr):
+            predicate = expr
+        elif is_expression(expr):
+            predicate = compile_predicate(expr, self._attributes)
+        else:
+            return None
+
+        names = referenced(expr)
+        if names is None:
+            return Relation._trusted(self._attributes,
+                                     (t for t in self._rows() if predicate(t)))
+
+        # Only the columns the predicate depends on are read for every
+        # row, the rest only for the rows selected.
+        matching = [i for (i, t) in enumerate(self._rows(sorted(names)))
+                    if predicate(t)]
+        names = sorted(self._layout)
+        header = Header(names)
+        columns = [self.column(name) for name in names]
+        return Relation._trusted(self._attributes,
+                                 (PositionalTuple(header, [c[i] for c in columns])
+                                  for i in matching))
+
+
+def load(path, trusted=False):
+    """Opens a file written by save as a memory mapped relation
+
+    Loading a file with domains or values other than those of the
+    builtin types raises UntrustedFile, unless it is trusted. Never
+    pass trusted=True for a file from an untrusted source, as loading
+    it may run any code it names.
+
+    """
+    return MappedRelation(path, trusted)
@@ -0,0 +1,248 @@
+"""Streaming relations
+
+A stream relation doesn't hold its body in memory, instead it reads
+its tuples from a source, such as a file, every time it is iterated
+over. Selections, projections and renames are applied one tuple at a
+time as the tuples pass through, so a stream can be narrowed down
+before it is ever materialized into an ordinary relation.
+
+As the tuples are never collected into a set, a stream may contain
+duplicates. They are removed when the stream is materialized, or by an
+explicit distinct stage.
+"""
+import csv
+import datetime
+
+from rel import exc
+from rel.predicate import (compile_predicate, is_contradiction, is_expression,
+                           is_tautology)
+from rel.relation import Relation
+from rel.structure import Header, PositionalTuple, distinct
+
+
+_true = frozenset(["true", "t", "yes", "y", "1"])
+_false = frozenset(["false", "f", "no", "n", "0", ""])
+
+def _parse_bool(text):
+    lowered = text.strip().lower()
+    if lowered in _true:
+        return True
+    elif lowered in _false:
+        return False
+    raise ValueError("{0} is not a boolean".format(repr(text)))
+
+
+# Parsers of domains which can't parse text by being called with it.
+_parsers = {
+    bool: _parse_bool,
+    datetime.date: datetime.date.fromisoformat,
+    datetime.datetime: datetime.datetime.fromisoformat,
+    datetime.time: datetime.time.fromisoformat,
+}
+
+
+def _parser(attribute):
+    # The domain of an attribute doubles as its parser, except for
+    # booleans, as any non-empty string is true to Python, and dates,
+    # which are parsed from their ISO format. Each type of a domain
+    # made up of several is tried in turn, and text which can't be
+    # parsed is kept as it is if it lies in the domain. Values outside
+    # the domain raise ValueError.
+    domain = attribute.type
+    types = domain if isinstance(domain, tuple) else (domain, )
+    parsers = [_parsers.get(t, t) for t in types]
+
+    def parse(text):
+        for parser in parsers:
+            try:
+                value = parser(text)
+            except (ArithmeticError, TypeError, ValueError):
+                continue
+            if attribute.in_domain(value):
+                return value
+        if attribute.in_domain(text):
+            return text
+        raise ValueError("{0} is outside of {1}".format(repr(text), attribute))
+    return parse
+
+
+def _typed_rows(rows, attributes, columns, location):
+    header = Header(attr.name for attr in attributes)
+    parsers = [_parser(attr) for attr in attributes]
+
+    for (number, row) in enumerate(rows, 1):
+        # Blank lines are skipped rather than treated as tuples
+        # without values.
+        if len(row) == 0:
+            continue
+
+        try:
+            fields = [row[i] for i in columns]
+        except IndexError:
+            msg = "Line {0} of {1} has {2} fields, expected at least {3}"
+            raise exc.InvalidTuple(msg.format(number, location, len(row),
+                                              max(columns) + 1))
+
+        values = []
+        for (parse, attr, field) in zip(parsers, attributes, fields):
+            try:
+                values.append(parse(field))
+            except ValueError:
+                msg = "Value {0} on line {1} of {2} was outside the domain of {3}"
+                raise exc.ValueOutsideDomain(msg.format(repr(field), number,
+                                                        location, attr))
+
+        yield PositionalTuple(header, values)
+
+
+def _read_csv(path, attributes, header, fmtparams):
+    with open(path, newline="") as f:
+        reader = csv.reader(f, **fmtparams)
+
+        if header:
+            names = next(reader, [])
+            try:
+                columns = [names.index(attr.name) for attr in attributes]
+            except ValueError:
+                msg = "The header {0} of {1} doesn't contain all of {2}"
+                raise exc.InvalidTuple(msg.format(names, path,
+                                                  [a.name for a in attributes]))
+        else:
+            columns = list(range(len(attributes)))
+
+        for t in _typed_rows(reader, attributes, columns, path):
+            yield t
+
+
+def _read_lines(path, attributes, separator):
+    with open(path) as f:
+        rows = (line.rstrip("\r\n").split(separator) if line.strip() else []
+                for line in f)
+        columns = list(range(len(attributes)))
+        for t in _typed_rows(rows, attributes, columns, path):
+            yield t
+
+
+def iter_tuples(relation):
+    """Iterates over the tuples of any kind of relation
+
+    Lazy relations are evaluated as they are iterated over rather than
+    materialized first.
+
+    """
+    plan = getattr(relation, "plan", None)
+    if plan is not None:
+        return plan.stream()
+    return iter(getattr(relation, "tuples", relation))
+
+
+class StreamRelation(object):
+    """A relation whose tuples are produced on demand
+
+    The source is a function returning a fresh iterator over the
+    tuples of the relation, it is called every time the stream is
+    iterated over. Tuples from untrusted sources are validated when
+    the stream is materialized, while trusted sources, such as other
+    relations, are known to give valid tuples.
+
+    """
+
+    def __init__(self, attributes, source, trusted=False):
+        self._attributes = set(Relation._parse_attr(attributes))
+        self._source = source
+        self._trusted = trusted
+
+    @classmethod
+    def from_csv(cls, path, attributes, header=True, **fmtparams):
+        """Streams the rows of a CSV file
+
+        Each field is parsed using the domain of its attribute. If the
+        file has a header the columns are matched to the attributes by
+        name, otherwise the attributes are taken to be in the order of
+        the columns. Any extra arguments are passed on to csv.reader.
+
+        """
+        attributes = list(Relation._parse_attr(attributes))
+        # The fields are parsed into the domains of the attributes.
+        return cls(attributes,
+                   lambda: _read_csv(path, attributes, header, fmtparams),
+                   trusted=True)
+
+    @classmethod
+    def from_lines(cls, path, attributes, separator=None):
+        """Streams the lines of a text file
+
+        Each line is split on the separator, whitespace by default,
+        and the fields are assigned to the attributes in order.
+
+        """
+        attributes = list(Relation._parse_attr(attributes))
+        return cls(attributes,
+                   lambda: _read_lines(path, attributes, separator),
+                   trusted=True)
+
+    @property
+    def attributes(self):
+        return self._attributes
+
+    @property
+    def attribute_names(self):
+        return [attr.name for attr in self._attributes]
+
+    @property
+    def order(self):
+        return len(self._attributes)
+
+    def __iter__(self):
+        return iter(self._source())
+
+    def __repr__(self):
+        return "StreamRelation({0})".format(repr(self._attributes))
+
+    def _stage(self, attributes, stage):
+        source = self._source
+        return StreamRelation(attributes, lambda: stage(source()),
+                              self._trusted)
+
+    def select(self, expr):
+        if is_tautology(expr):
+            return self
+        elif is_contradiction(expr):
+            return StreamRelation(self._attributes, lambda: iter(()), True)
+        elif callable(expr):
+            predicate = expr
+        elif is_expression(expr):
+            predicate = compile_predicate(expr, self._attributes)
+        else:
+            return None
+
+        return self._stage(self._attributes,
+                           lambda tuples: (t for t in tuples if predicate(t)))
+
+    def project(self, attribute_names):
+        names = set(attribute_names)
+        attr = set(a for a in self._attributes if a.name in names)
+        return self._stage(attr,
+                           lambda tuples: (t.project(names) for t in tuples))
+
+    def rename(self, mapping):
+        mapping = dict(mapping)
+        attr = set(a.rename(mapping.get(a.name, a.name))
+                   for a in self._attributes)
+        return self._stage(attr,
+                           lambda tuples: (t.rename(mapping) for t in tuples))
+
+    def distinct(self):
+        """Removes duplicates from the stream
+
+        The tuples seen so far are remembered, so this stage takes
+        memory proportional to the number of distinct tuples.
+
+        """
+        return self._stage(self._attributes, distinct)
+
+    def materialize(self):
+        """Reads the whole stream into an ordinary relation"""
+        if self._trusted:
+            return Relation._trusted(self._attributes, self)
+        return Relation(self._attributes, self)
@@ -1,11 +1,15 @@
-import collections
-import itertools
+import weakref
 
-class MappingTuple(collections.Mapping):
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+class MappingTuple(Mapping):
     __slots__ = ("_fields",)
 
     def __init__(self, d):
-        if isinstance(d, collections.Mapping):
+        if isinstance(d, Mapping):
             keys = sorted(d.keys())
             self._fields = tuple((k, d[k]) for k in keys)
         else:
@@ -100,10 +104,162 @@ class MappingTuple(collections.Mapping):
 
 MappingTuple.Empty = MappingTuple(())
 
+
+class Header(object):
+    """The names of a positional tuple along with their positions
+
+    Headers are interned, so all the tuples sharing a set of names in
+    the same order share a single header. The header maps each name
+    to the position of its value, which makes looking up a value by
+    name a dictionary lookup.
+    """
+    __slots__ = ("names", "positions", "order",
+                 "_projections", "_renames", "__weakref__")
+
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, names):
+        names = tuple(names)
+        header = cls._interned.get(names)
+        if header is not None:
+            return header
+
+        positions = dict((name, i) for (i, name) in enumerate(names))
+        if len(positions) != len(names):
+            raise RuntimeError("found duplicate keys in {0}".format(names))
+
+        header = object.__new__(cls)
+        header.names = names
+        header.positions = positions
+        # The positions in the order of the sorted names, which is
+        # the order mapping tuples keep their fields in.
+        header.order = tuple(positions[name] for name in sorted(names))
+        header._projections = {}
+        header._renames = {}
+
+        cls._interned[names] = header
+        return header
+
+    def __reduce__(self):
+        return (Header, (self.names, ))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return "Header({0})".format(repr(self.names))
+
+    def project(self, names):
+        # Returns the header of the projection and the positions of
+        # the values to keep, both of which are the same for every
+        # tuple sharing this header.
+        names = frozenset(names)
+        projection = self._projections.get(names)
+        if projection is None:
+            kept = tuple(n for n in self.names if n in names)
+            projection = (Header(kept),
+                          tuple(self.positions[n] for n in kept))
+            self._projections[names] = projection
+        return projection
+
+    def rename(self, mapping):
+        key = tuple(sorted((k, v) for (k, v) in mapping.items()
+                           if k in self.positions))
+        renamed = self._renames.get(key)
+        if renamed is None:
+            renamed = Header(mapping.get(n, n) for n in self.names)
+            self._renames[key] = renamed
+        return renamed
+
+
+class PositionalTuple(MappingTuple):
+    """A mapping tuple storing only its values
+
+    The names are kept in a header shared between all tuples with the
+    same names. Positional tuples hash and compare equal to mapping
+    tuples with the same names and values and can be used in their
+    place.
+    """
+    __slots__ = ("_header", "_values", "_hash")
+
+    def __init__(self, header, values):
+        if not isinstance(header, Header):
+            header = Header(header)
+        values = tuple(values)
+        if len(values) != len(header):
+            msg = "expected {0} values for {1} but got {2}"
+            raise RuntimeError(msg.format(len(header), header, values))
+
+        self._header = header
+        self._values = values
+        self._hash = None
+
+    def __reduce__(self):
+        return (PositionalTuple, (self._header, self._values))
+
+    @property
+    def _fields(self):
+        names, values = self._header.names, self._values
+        return tuple((names[i], values[i]) for i in self._header.order)
+
+    def __getitem__(self, name):
+        return self._values[self._header.positions[name]]
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        names = self._header.names
+        return iter(names[i] for i in self._header.order)
+
+    def __repr__(self):
+        if len(self._values) == 0:
+            return "MappingTuple.Empty"
+        return "PositionalTuple({0})".format(dict(self._fields))
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self._fields)
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, PositionalTuple) and other._header is self._header:
+            return self._values == other._values
+        return isinstance(other, MappingTuple) and self._fields == other._fields
+
+    def project(self, names):
+        fixed_names = set(getattr(name, "name", name) for name in names)
+        if len(fixed_names) == 0:
+            return MappingTuple.Empty
+
+        header, positions = self._header.project(fixed_names)
+        values = self._values
+        return PositionalTuple(header, tuple(values[i] for i in positions))
+
+    def rename(self, mapping):
+        # Only the header changes, the values stay where they are.
+        return PositionalTuple(self._header.rename(mapping), self._values)
+
+    rho = rename
+    pi = project
+
 def values(keys, tuples):
     for t in tuples:
         yield MappingTuple(zip(keys, t))
 
+def compact_values(keys, tuples):
+    header = Header(keys)
+    for t in tuples:
+        yield PositionalTuple(header, t)
+
+def distinct(tuples):
+    # Drops repeated tuples, remembering every tuple seen so far.
+    seen = set()
+    for t in tuples:
+        if t not in seen:
+            seen.add(t)
+            yield t
+
 def to_values_notation(tuples):
     # cast to an iterator so we can call next
     tuples = iter(tuples)
@@ -0,0 +1,233 @@
+"""Incrementally maintained views
+
+A view is the materialized result of an operator applied to a table
+or to other views. When a table changes, only the change, the delta,
+is passed on to the views depending on it, and each view works out
+how its own result changes from the delta alone rather than
+recomputing everything.
+
+Selections simply filter the delta. Projections keep count of how many
+tuples support each projected tuple, as a projected tuple only
+disappears once the last tuple projecting onto it is gone. Joins keep
+both sides hashed on the attributes being joined on, and probe the
+delta of one side against the other side.
+"""
+import collections
+
+from rel.predicate import as_function
+from rel.relation import Relation
+from rel.structure import MappingTuple
+
+
+Delta = collections.namedtuple("Delta", ["inserted", "deleted"])
+
+
+class _Changes(object):
+    # Collects the changes of a view, where inserting a tuple cancels
+    # out an earlier deletion of it and the other way around.
+
+    def __init__(self):
+        self.inserted = set()
+        self.deleted = set()
+
+    def insert(self, t):
+        if t in self.deleted:
+            self.deleted.discard(t)
+        else:
+            self.inserted.add(t)
+
+    def delete(self, t):
+        if t in self.inserted:
+            self.inserted.discard(t)
+        else:
+            self.deleted.add(t)
+
+    def delta(self):
+        return Delta(frozenset(self.inserted), frozenset(self.deleted))
+
+
+class View(object):
+    """Base class of tables and views"""
+
+    def __init__(self, attributes):
+        self._attributes = set(attributes)
+        self._tuples = set()
+        self._dependents = []
+
+    @property
+    def attributes(self):
+        return self._attributes
+
+    @property
+    def relation(self):
+        """The current contents of the view as a relation"""
+        return Relation._trusted(self._attributes, self._tuples)
+
+    def __len__(self):
+        return len(self._tuples)
+
+    def _subscribe(self, dependent):
+        self._dependents.append(dependent)
+
+    def _propagate(self, delta):
+        if delta.inserted or delta.deleted:
+            for dependent in self._dependents:
+                dependent._receive(self, delta)
+        return delta
+
+    def _receive(self, source, delta):
+        raise NotImplementedError
+
+    def select(self, expr):
+        return SelectView(self, expr)
+
+    def project(self, attribute_names):
+        return ProjectView(self, attribute_names)
+
+    def join(self, other, on=None):
+        return JoinView(self, other, on)
+
+
+class Table(View):
+    """A base relation which can be changed"""
+
+    def __init__(self, relation):
+        View.__init__(self, relation.attributes)
+        self._tuples = set(relation.tuples)
+
+    def apply(self, inserted=(), deleted=()):
+        """Inserts and deletes tuples, updating all dependent views
+
+        Deletions are applied before insertions. Returns the delta
+        actually applied, leaving out deletions of missing tuples and
+        insertions of tuples already present.
+
+        """
+        # Inserted tuples are validated like any other tuples coming
+        # from the outside.
+        inserted = Relation(self._attributes, inserted).tuples
+        deleted = set(t if isinstance(t, MappingTuple) else MappingTuple(t)
+                      for t in deleted)
+
+        before = self._tuples
+        after = (before - deleted) | inserted
+        self._tuples = after
+        return self._propagate(Delta(frozenset(after - before),
+                                     frozenset(before - after)))
+
+
+class SelectView(View):
+    def __init__(self, parent, expr):
+        View.__init__(self, parent.attributes)
+        self._predicate = as_function(expr, parent.attributes)
+        self._tuples = set(t for t in parent._tuples if self._predicate(t))
+        parent._subscribe(self)
+
+    def _receive(self, source, delta):
+        changes = _Changes()
+        for t in delta.deleted:
+            if t in self._tuples:
+                self._tuples.discard(t)
+                changes.delete(t)
+        for t in delta.inserted:
+            if self._predicate(t):
+                self._tuples.add(t)
+                changes.insert(t)
+        self._propagate(changes.delta())
+
+
+class ProjectView(View):
+    def __init__(self, parent, attribute_names):
+        self._names = set(attribute_names)
+        View.__init__(self, (attr for attr in parent.attributes
+                             if attr.name in self._names))
+
+        # The number of tuples of the parent projecting onto each
+        # tuple of the view.
+        self._support = collections.Counter(t.project(self._names)
+                                            for t in parent._tuples)
+        self._tuples = set(self._support)
+        parent._subscribe(self)
+
+    def _receive(self, source, delta):
+        changes = _Changes()
+        for t in delta.deleted:
+            p = t.project(self._names)
+            self._support[p] -= 1
+            if self._support[p] == 0:
+                del self._support[p]
+                self._tuples.discard(p)
+                changes.delete(p)
+        for t in delta.inserted:
+            p = t.project(self._names)
+            self._support[p] += 1
+            if self._support[p] == 1:
+                self._tuples.add(p)
+                changes.insert(p)
+        self._propagate(changes.delta())
+
+
+class JoinView(View):
+    """A natural join, or an equi-join if pairs of attributes are given"""
+
+    def __init__(self, left, right, on=None):
+        View.__init__(self, left.attributes | right.attributes)
+
+        if on is None:
+            common = sorted(attr.name for attr in left.attributes & right.attributes)
+            self._left_names = self._right_names = tuple(common)
+        else:
+            self._left_names, self._right_names = (tuple(names)
+                                                   for names in zip(*on))
+
+        self._left, self._right = left, right
+        self._left_index = self._build(left._tuples, self._left_names)
+        self._right_index = self._build(right._tuples, self._right_names)
+
+        for l in left._tuples:
+            for r in self._right_index.get(self._key(l, self._left_names), ()):
+                self._tuples.add(l.union(r))
+
+        left._subscribe(self)
+        if right is not left:
+            right._subscribe(self)
+
+    def _key(self, t, names):
+        return tuple(t[name] for name in names)
+
+    def _build(self, tuples, names):
+        index = collections.defaultdict(set)
+        for t in tuples:
+            index[self._key(t, names)].add(t)
+        return index
+
+    def _apply(self, delta, names, own, other, changes):
+        # Updates the index of one side with its delta and probes the
+        # delta against the index of the other side.
+        for t in delta.deleted:
+            key = self._key(t, names)
+            own[key].discard(t)
+            for match in other.get(key, ()):
+                joined = t.union(match)
+                self._tuples.discard(joined)
+                changes.delete(joined)
+        for t in delta.inserted:
+            key = self._key(t, names)
+            own[key].add(t)
+            for match in other.get(key, ()):
+                joined = t.union(match)
+                self._tuples.add(joined)
+                changes.insert(joined)
+
+    def _receive(self, source, delta):
+        changes = _Changes()
+        # A view joined with itself receives the delta on both
+        # sides. The left side is updated first, and the right side
+        # is then probed against the updated left side.
+        if source is self._left:
+            self._apply(delta, self._left_names,
+                        self._left_index, self._right_index, changes)
+        if source is self._right:
+            self._apply(delta, self._right_names,
+                        self._right_index, self._left_index, changes)
+        self._propagate(changes.delta())
@@ -0,0 +1,58 @@
+"""Tests for summarizing relations"""
+from nose.tools import eq_, raises
+
+import rel.relation as r
+from rel import exc
+from rel import values
+from rel.aggregate import Count, Sum, Min, Max, Avg, Reduce
+
+
+class TestSummarize(object):
+    @property
+    def ex(self):
+        return r.Relation([(str, "dept"), (str, "name"), (int, "salary")],
+                          values(("dept", "name", "salary"), [
+                              ("a", "alice", 10),
+                              ("a", "bob", 20),
+                              ("b", "carol", 30),
+                          ]))
+
+    def test_summarize(self):
+        summary = self.ex.summarize(["dept"],
+                                    n=Count(),
+                                    total=Sum("salary"),
+                                    low=Min("salary"),
+                                    high=Max("salary"),
+                                    mean=Avg("salary"))
+        expected = r.Relation([(str, "dept"), (int, "n"), (int, "total"),
+                               (int, "low"), (int, "high"), (float, "mean")],
+                              values(("dept", "n", "total", "low", "high", "mean"), [
+                                  ("a", 2, 30, 10, 20, 15.0),
+                                  ("b", 1, 30, 30, 30, 30.0),
+                              ]))
+        eq_(summary,
+            expected,
+            "Every aggregate should be computed for every group")
+
+    def test_no_grouping(self):
+        eq_(self.ex.summarize([], n=Count()),
+            r.Relation([(int, "n")], values(("n", ), [(3, )])),
+            "Summarizing without grouping attributes should give a single tuple")
+
+    def test_empty(self):
+        eq_(len(self.ex.select(False).summarize([], n=Count())),
+            0,
+            "Summarizing an empty relation should give an empty relation")
+
+    def test_custom_reducer(self):
+        summary = self.ex.summarize("dept",
+                                    names=Reduce("name",
+                                                 lambda s, v: s | frozenset([v]),
+                                                 frozenset()))
+        eq_(summary.attribute("names").type,
+            frozenset,
+            "The domain of a custom aggregate should be inferred from its results")
+
+    @raises(exc.IncompatibleHeaders)
+    def test_clash(self):
+        self.ex.summarize(["dept"], dept=Count())
@@ -0,0 +1,175 @@
+"""Tests for building and consuming relations from asyncio code"""
+import asyncio
+
+from nose.tools import eq_, ok_, raises
+
+import rel.relation as r
+from rel import aio
+from rel import exc
+from rel import values
+from rel.expr import attr
+
+
+header = [(int, "id"), (str, "name")]
+
+
+def people():
+    return r.Relation(header, values(("id", "name"), [
+        (i, "p{0}".format(i % 7)) for i in range(100)
+    ]))
+
+
+async def rows(n, delay=False):
+    for i in range(n):
+        if delay:
+            await asyncio.sleep(0)
+        yield {"id": i, "name": "p{0}".format(i % 7)}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class TestBuild(object):
+    def test_async_source(self):
+        eq_(run(aio.build(header, rows(100), chunk=16)), people())
+
+    def test_sync_source(self):
+        eq_(run(aio.build(header, list(rows_sync(100)))), people())
+
+    @raises(exc.ValueOutsideDomain)
+    def test_validates(self):
+        run(aio.build([(int, "id")], [{"id": "one"}]))
+
+    def test_yields_to_loop(self):
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0)
+
+        async def main():
+            task = asyncio.ensure_future(ticker())
+            await asyncio.sleep(0)
+            before = len(ticks)
+            relation = await aio.build(header, rows_sync(1000), chunk=10)
+            task.cancel()
+            return relation, len(ticks) - before
+
+        relation, ticked = run(main())
+        eq_(relation.cardinality, 1000)
+        ok_(ticked >= 50, "The loop should run between chunks")
+
+
+def rows_sync(n):
+    for i in range(n):
+        yield {"id": i, "name": "p{0}".format(i % 7)}
+
+
+class TestBuilder(object):
+    def test_builder(self):
+        async def main():
+            async with aio.Builder(header, chunk=8, max_pending=4) as builder:
+                async for row in rows(100):
+                    await builder.put(row)
+            return builder.relation
+        eq_(run(main()), people())
+
+    def test_backpressure(self):
+        async def main():
+            builder = aio.Builder(header, max_pending=3)
+            async with builder:
+                for row in rows_sync(3):
+                    await builder.put(row)
+                ok_(builder._queue.full())
+                put = asyncio.ensure_future(builder.put({"id": 3, "name": "x"}))
+                await asyncio.sleep(0)
+                ok_(builder._queue.qsize() <= 3,
+                    "Producers should wait while the queue is full")
+                await put
+            return builder.relation
+        eq_(run(main()).cardinality, 4)
+
+    @raises(exc.InvalidTuple)
+    def test_invalid(self):
+        async def main():
+            async with aio.Builder(header, chunk=2, max_pending=1) as builder:
+                for row in [{"id": 1}] * 10:
+                    await builder.put(row)
+        run(main())
+
+    def test_cancelled(self):
+        async def main():
+            builder = aio.Builder(header)
+            try:
+                async with builder:
+                    await builder.put({"id": 1, "name": "a"})
+                    raise KeyError("producer failed")
+            except KeyError:
+                pass
+            return builder._task.cancelled(), builder.relation
+        cancelled, relation = run(main())
+        ok_(cancelled,
+            "Leaving the block with an error should wait for the cancellation")
+        eq_(relation, None, "No relation should be built after an error")
+
+class TestStream(object):
+    def collect(self, stream):
+        async def main():
+            return [t async for t in stream]
+        return run(main())
+
+    def test_aiter_tuples(self):
+        async def main():
+            return [t async for t in aio.aiter_tuples(people(), chunk=10)]
+        eq_(set(run(main())), people().tuples)
+
+    def test_lazy(self):
+        lazy = people().lazy().select(attr("id") < 10)
+        eq_(len(self.collect(aio.AsyncStream.from_relation(lazy))), 10)
+
+    def test_pipeline(self):
+        stream = (aio.AsyncStream(header, lambda: rows(100))
+                  .select(attr("id") < 50)
+                  .project(["name"])
+                  .rename({"name": "who"}))
+        eq_(len(self.collect(stream)), 50)
+        eq_(len(self.collect(stream.distinct())), 7)
+        eq_(run(stream.materialize()),
+            people().select(lambda t: t["id"] < 50).project(["name"])
+                    .rename({"name": "who"}))
+
+    def test_join(self):
+        names = r.Relation([(str, "name"), (int, "rank")],
+                           values(("name", "rank"), [("p1", 1), ("p2", 2)]))
+        stream = aio.AsyncStream(header, lambda: rows(100, delay=True)).join(names)
+        eq_(run(stream.materialize()), people().join(names))
+        trusted = aio.AsyncStream.from_relation(people()).join(names)
+        eq_(run(trusted.materialize()), people().join(names))
+
+    def test_join_yields(self):
+        ranks = r.Relation([(int, "id"), (int, "rank")],
+                           values(("id", "rank"), [(i, -i) for i in range(100)]))
+        stream = aio.AsyncStream(header, lambda: rows(1), chunk=10).join(ranks)
+        ticks = []
+
+        async def ticker():
+            for i in range(5):
+                ticks.append(i)
+                await asyncio.sleep(0)
+
+        async def both():
+            task = asyncio.ensure_future(ticker())
+            await asyncio.sleep(0)
+            joined = await stream.materialize()
+            ok_(len(ticks) > 1,
+                "Other tasks should run while the hash table is built")
+            await task
+            return joined
+        eq_(run(both()), people().select(lambda t: t["id"] < 1).join(ranks))
+
+    @raises(exc.ValueOutsideDomain)
+    def test_validates_untrusted(self):
+        stream = aio.AsyncStream([(int, "id")], lambda: [{"id": "one"}])
+        run(stream.materialize())
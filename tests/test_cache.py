@@ -0,0 +1,142 @@
+"""Tests for fingerprints and the result cache"""
+from nose.tools import eq_, ok_
+
+import rel.relation as r
+from rel import cache
+from rel import instrument
+from rel import values
+
+
+def people(rows):
+    return r.Relation([(int, "id"), (str, "name")],
+                      values(("id", "name"), rows))
+
+
+class TestFingerprint(object):
+    def test_order_independent(self):
+        a = people([(1, "a"), (2, "b"), (3, "c")])
+        b = people([(3, "c"), (1, "a"), (2, "b")])
+        eq_(a.fingerprint, b.fingerprint)
+
+    def test_differs(self):
+        a = people([(1, "a"), (2, "b")])
+        ok_(a.fingerprint != people([(1, "a"), (2, "c")]).fingerprint)
+        ok_(a.fingerprint != a.rename({"name": "label"}).fingerprint,
+            "The header should be part of the fingerprint")
+
+    def test_positional_tuples(self):
+        a = people([(1, "a"), (2, "b")])
+        eq_(a.project(["id", "name"]).fingerprint, a.fingerprint,
+            "Fingerprints shouldn't depend on how tuples are stored")
+
+    def test_eq_short_circuit(self):
+        a = people([(1, "a"), (2, "b")])
+        b = people([(1, "a"), (2, "c")])
+        a.fingerprint, b.fingerprint
+        ok_(a != b)
+        c = people([(2, "b"), (1, "a")])
+        c.fingerprint
+        eq_(a, c)
+
+
+class TestResultCache(object):
+    def setup_method(self):
+        self.rel = people([(1, "a"), (2, "b"), (3, "a")])
+
+    setup = setup_method
+
+    def teardown_method(self):
+        cache.disable()
+        cache.default.clear()
+
+    teardown = teardown_method
+
+    def test_hits(self):
+        c = cache.ResultCache()
+        first = c.call(self.rel, "project", ["name"])
+        second = c.call(people([(3, "a"), (2, "b"), (1, "a")]), "project", ["name"])
+        ok_(first is second, "Equal relations should share results")
+        eq_(c.stats.hits, 1)
+        eq_(c.stats.misses, 1)
+
+    def test_arguments(self):
+        c = cache.ResultCache()
+        c.call(self.rel, "project", ["name"])
+        eq_(c.call(self.rel, "project", ["id"]), self.rel.project(["id"]))
+        eq_(c.stats.misses, 2)
+
+    def test_relation_arguments(self):
+        c = cache.ResultCache()
+        other = r.Relation([(int, "id"), (int, "score")],
+                           values(("id", "score"), [(1, 10)]))
+        c.call(self.rel, "join", other)
+        c.call(self.rel, "join", other)
+        eq_(c.stats.hits, 1)
+
+    def test_bypass(self):
+        class Above(object):
+            # Defining equality without hashing makes instances
+            # unhashable.
+            def __init__(self, limit):
+                self.limit = limit
+
+            def __eq__(self, other):
+                return isinstance(other, Above) and self.limit == other.limit
+
+            def __call__(self, t):
+                return t["id"] > self.limit
+
+        c = cache.ResultCache()
+        eq_(c.call(self.rel, "select", Above(1)).cardinality, 2)
+        eq_(c.stats.bypasses, 1)
+        eq_(len(c), 0)
+
+    def test_eviction(self):
+        size = cache.estimate_size(self.rel.project(["id"]))
+        c = cache.ResultCache(max_bytes=int(size * 1.5))
+        c.call(self.rel, "project", ["id"])
+        c.call(self.rel, "project", ["name", "id"])
+        eq_(len(c), 1, "Results beyond the bound should be evicted")
+        ok_(c.stats.evictions >= 1)
+        ok_(c.stats.bytes <= c.max_bytes)
+
+    def test_enable(self):
+        c = cache.enable(cache.ResultCache())
+        pred = lambda t: t["id"] > 1
+        first = self.rel.select(pred)
+        ok_(self.rel.select(pred) is first)
+        eq_(c.stats.hits, 1)
+        cache.disable()
+        ok_(self.rel.select(pred) is not first)
+
+    def test_with_instrumentation(self):
+        original = r.Relation.select
+        instrument.enable()
+        c = cache.enable(cache.ResultCache())
+        instrument.disable()
+        pred = lambda t: t["id"] > 1
+        first = self.rel.select(pred)
+        ok_(self.rel.select(pred) is first,
+            "Caching should outlive instrumentation enabled before it")
+        with instrument.recording() as session:
+            self.rel.select(pred)
+        eq_((c.stats.hits, len(session.records)), (2, 1))
+        cache.disable()
+        ok_(r.Relation.select is original,
+            "Disabling both should restore the original operators")
+
+    def test_enable_empty(self):
+        c = cache.ResultCache()
+        ok_(cache.enable(c) is c,
+            "An empty cache should be used rather than the default one")
+        self.rel.project(["id"])
+        eq_((len(c), len(cache.default)), (1, 0))
+
+    def test_limit(self):
+        c = cache.enable(cache.ResultCache())
+        first = self.rel.limit(2)
+        ok_(self.rel.limit(2) is first, "Limited relations should be cached")
+        eq_(self.rel.top_k(1, ["id"]), self.rel.top_k(1, ["id"]),
+            "Lists of tuples should be computed anew rather than cached")
+        eq_((c.stats.hits, len(c)), (1, 1),
+            "Only relations should be kept in the cache")
@@ -0,0 +1,155 @@
+"""Tests for the columnar storage of relations"""
+import warnings
+
+from nose.tools import eq_, raises
+from nose.plugins.skip import SkipTest
+
+try:
+    import numpy
+except ImportError:
+    raise SkipTest("numpy is not installed")
+
+import sympy
+
+import rel.relation as r
+from rel import values
+from rel.columnar import ColumnarRelation
+
+
+class TestColumnar(object):
+    @property
+    def ex(self):
+        return r.Relation([(int, "a"), (float, "b"), (str, "c")],
+                          values(("a", "b", "c"), [
+                              (1, 0.5, "x"),
+                              (2, 0.5, "y"),
+                              (3, 1.5, "x"),
+                              (2 ** 70, 2.5, "z"),
+                          ]))
+
+    @property
+    def col(self):
+        return ColumnarRelation.from_relation(self.ex)
+
+    def test_round_trip(self):
+        eq_(self.col.to_relation(),
+            self.ex,
+            "Converting to columns and back should be lossless")
+
+    def test_typed_columns(self):
+        eq_(self.col.column("b").dtype,
+            numpy.float64,
+            "Numeric attributes should be stored in typed arrays")
+        eq_(self.col.column("c").dtype,
+            object,
+            "Other attributes should fall back to objects")
+
+    def test_overflow_falls_back(self):
+        eq_(self.col.column("a").dtype,
+            object,
+            "Integers outside of int64 should be stored as objects")
+
+    def test_project_dedup(self):
+        eq_(self.col.project(["c"]),
+            self.ex.project(["c"]),
+            "Projections should remove the duplicate rows")
+        eq_(len(self.col.project(["b"])),
+            3,
+            "Projections should remove the duplicate rows")
+
+    def test_project_empty(self):
+        eq_(self.col.project([]),
+            r.Dee,
+            "Projecting onto no attributes should give Dee")
+
+    def test_select(self):
+        a, b = sympy.symbols("a b")
+        eq_(self.col.select(b > 1),
+            self.ex.select(b > 1),
+            "Selecting on columns should agree with selecting on tuples")
+        eq_(self.col.select(lambda t: t["c"] == "x"),
+            self.ex.select(lambda t: t["c"] == "x"),
+            "Selecting on columns should agree with selecting on tuples")
+
+    def test_select_constants(self):
+        for expr in [None, True, 1, False, 0]:
+            eq_(self.col.select(expr),
+                self.ex.select(expr),
+                "Constant predicates should agree with selecting on tuples")
+
+    def test_select_overflow(self):
+        rel = r.Relation([(int, "a"), (int, "b")],
+                         values(("a", "b"), [(2 ** 40, 1), (0, 2), (-2 ** 40, 3),
+                                             (2 ** 62, 4)]))
+        col = ColumnarRelation.from_relation(rel)
+        eq_(col.column("a").dtype, numpy.int64)
+        a, b = sympy.symbols("a b")
+        for expr in [a ** 2 > 0, sympy.Eq(a ** 3, 0), a + a > 0,
+                     sympy.Eq(a * b, 2 ** 63), b * 3 < 10]:
+            eq_(col.select(expr),
+                rel.select(expr),
+                "Selecting on columns should be exact where int64 overflows")
+
+    def test_select_division_by_zero(self):
+        rel = r.Relation([(int, "a"), (int, "b")],
+                         values(("a", "b"), [(1, 0), (2, 1), (0, 2)]))
+        col = ColumnarRelation.from_relation(rel)
+        a, b = sympy.symbols("a b")
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            eq_(col.select(a / b),
+                rel.select(a / b),
+                "Dividing by zero should agree with selecting on tuples")
+
+    def test_rename(self):
+        eq_(self.col.rename({"a": "d"}),
+            self.ex.rename({"a": "d"}),
+            "Renaming columns should agree with renaming tuples")
+
+    def test_product(self):
+        other = r.Relation([(int, "d")], values(("d", ), [(1, ), (2, )]))
+        eq_(self.col.product(other),
+            self.ex.product(other),
+            "The product of columns should agree with the product of tuples")
+        eq_(self.col.product(r.Dee),
+            self.col,
+            "Dee should be the identity of the product")
+
+    @raises(RuntimeError)
+    def test_product_shared(self):
+        a = r.Relation([(int, "a")], values(("a", ), [(1, ), (2, )]))
+        b = r.Relation([(int, "a")], values(("a", ), [(2, ), (3, )]))
+        ColumnarRelation.from_relation(a).product(b)
+
+    def test_candidate_keys(self):
+        eq_(sorted(map(sorted, self.col.candidate_keys)),
+            sorted(map(sorted, self.ex.candidate_keys)),
+            "Candidate keys should be the same in both forms")
+
+
+class TestColumnarSummarize(object):
+    @property
+    def ex(self):
+        return r.Relation([(int, "g"), (int, "x"), (float, "y")],
+                          values(("g", "x", "y"), [
+                              (i % 3, i, i / 2.0) for i in range(12)
+                          ]))
+
+    def test_vectorized_agrees(self):
+        from rel.aggregate import Count, Sum, Min, Max, Avg
+        aggregates = dict(n=Count(), sx=Sum("x"), sy=Sum("y"),
+                          lo=Min("x"), hi=Max("y"), mean=Avg("x"))
+        col = ColumnarRelation.from_relation(self.ex)
+        eq_(col.summarize(["g"], **aggregates),
+            self.ex.summarize(["g"], **aggregates),
+            "The vectorized summary should agree with the tuple summary")
+
+    def test_smallest_int64(self):
+        from rel.aggregate import Sum
+        rel = r.Relation([(int, "g"), (int, "x")],
+                         values(("g", "x"), [(0, -2 ** 63), (0, 1), (1, 2)]))
+        col = ColumnarRelation.from_relation(rel)
+        eq_(col.column("x").dtype, numpy.int64)
+        eq_(col.summarize(["g"], s=Sum("x")),
+            rel.summarize(["g"], s=Sum("x")),
+            "Sums near the smallest int64 should not wrap around")
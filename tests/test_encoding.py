@@ -0,0 +1,128 @@
+"""Tests for dictionary encoded relations"""
+from nose.tools import eq_, ok_
+
+import sympy
+
+import rel.relation as r
+from rel import values
+from rel.encoding import Dictionary, EncodedTuple, low_cardinality
+from rel.predicate import eq, lt, between, match
+from rel.structure import MappingTuple
+
+
+def orders():
+    return r.Relation([(int, "id"), (str, "status"), (str, "country")],
+                      values(("id", "status", "country"), [
+                          (i, ["open", "paid", "shipped"][i % 3],
+                           ["se", "no", "dk", "fi"][i % 4])
+                          for i in range(24)
+                      ]))
+
+
+def countries():
+    return r.Relation([(str, "country"), (str, "name")],
+                      values(("country", "name"), [
+                          ("se", "Sweden"), ("no", "Norway"), ("is", "Iceland")
+                      ]))
+
+
+class TestDictionary(object):
+    def test_codes(self):
+        d = Dictionary(["a", "b", "a"])
+        eq_(len(d), 2)
+        eq_(d.code("b"), 1)
+        eq_(d[d.code("c")], "c")
+
+    def test_keeps_types(self):
+        d = Dictionary([1, True, 1.0])
+        eq_(len(d), 3, "Equal values of different types need their own codes")
+        ok_(d[1] is True)
+        ok_(d.aliased, "Equal values with different codes should be noticed")
+        ok_(not Dictionary(["a", "b"]).aliased)
+
+
+class TestEncoding(object):
+    def test_round_trip(self):
+        enc = orders().encode(["status", "country"])
+        eq_(enc, orders())
+        eq_(enc.decode(), orders())
+        ok_(all(isinstance(t, EncodedTuple) for t in enc.tuples))
+
+    def test_mixes_with_plain_tuples(self):
+        t = next(iter(orders().encode(["status"]).tuples))
+        plain = MappingTuple(dict(t.items()))
+        eq_(t, plain)
+        eq_(plain, t)
+        eq_(hash(t), hash(plain))
+        ok_(t in orders().tuples)
+
+    def test_shared_values(self):
+        enc = orders().encode(["status"])
+        encodings = set(t._encoding for t in enc.tuples)
+        eq_(len(encodings), 1, "All tuples should share the encoding")
+        d = [d for d in encodings.pop().dictionaries if d is not None][0]
+        eq_(sorted(d.values), ["open", "paid", "shipped"])
+
+    def test_low_cardinality(self):
+        rel = orders()
+        eq_(low_cardinality(rel.tuples, rel.attribute_names, 4),
+            set(["status", "country"]))
+
+    def test_default_names(self):
+        enc = orders().encode()
+        eq_(enc, orders())
+
+    def test_select(self):
+        enc = orders().encode(["status", "country"])
+        for expr in [eq("status", "paid"), lt("country", "f"),
+                     between("country", "dk", "no"),
+                     match(status="open", country="se"), match(),
+                     eq("status", "missing"),
+                     lambda t: t["status"] == "open"]:
+            eq_(enc.select(expr), orders().select(expr))
+
+    def test_select_numeric(self):
+        enc = orders().encode(["id"])
+        expr = sympy.Symbol("id") < 5
+        eq_(enc.select(expr), orders().select(expr))
+
+    def test_project_rename(self):
+        enc = orders().encode(["status"])
+        eq_(enc.project(["status"]), orders().project(["status"]))
+        eq_(enc.rename({"status": "state"}), orders().rename({"status": "state"}))
+        eq_(enc.project(["status", "id"]).select(eq("status", "open")),
+            orders().project(["status", "id"]).select(eq("status", "open")))
+
+    def test_join_shared_dictionaries(self):
+        shared = {}
+        left = orders().encode(["country"], shared)
+        right = countries().encode(["country"], shared)
+        joined = left.join(right)
+        eq_(joined, orders().join(countries()))
+        ok_(all(isinstance(t, EncodedTuple) for t in joined.tuples),
+            "Joined encoded tuples should stay encoded")
+
+    def test_join_separate_dictionaries(self):
+        left = orders().encode(["country"])
+        right = countries().encode(["country"])
+        eq_(left.join(right), orders().join(countries()))
+        eq_(left.join(countries()), orders().join(countries()))
+
+    def test_join_equal_values(self):
+        left = r.Relation([(object, "x"), (str, "a")],
+                          values(("x", "a"), [(1, "one")]))
+        right = r.Relation([(object, "x"), (str, "b")],
+                           values(("x", "b"), [(True, "true")]))
+        shared = {}
+        eq_(left.encode(["x"], shared).join(right.encode(["x"], shared)),
+            left.join(right),
+            "Values equal to each other should join even with different codes")
+
+    def test_equi_join(self):
+        shared = {}
+        left = orders().encode(["country"], shared)
+        right = countries().rename({"country": "code"})
+        right = right.encode(["code"], {"code": shared["country"]})
+        eq_(left.equi_join(right, [("country", "code")]),
+            orders().equi_join(countries().rename({"country": "code"}),
+                               [("country", "code")]))
@@ -0,0 +1,114 @@
+"""Tests for the native expression language"""
+import pickle
+import subprocess
+import sys
+
+from nose.tools import eq_, ok_, raises
+
+import rel.relation as r
+from rel import values
+from rel.expr import And, attr, attrs, const
+from rel.predicate import Comparison, Match, as_comparison
+
+
+def people():
+    return r.Relation([(int, "id"), (str, "name"), (int, "age")],
+                      values(("id", "name", "age"), [
+                          (1, "ann", 31), (2, "bob", 17), (3, "cy", 45),
+                          (4, "di", 17),
+                      ]))
+
+
+def pets():
+    return r.Relation([(int, "owner"), (str, "pet")],
+                      values(("owner", "pet"), [
+                          (1, "cat"), (1, "dog"), (3, "fish"), (5, "owl"),
+                      ]))
+
+
+class TestExpression(object):
+    def test_builds_trees(self):
+        expr = (attr("age") >= 18) & (attr("name") != "bob")
+        ok_(isinstance(expr, And))
+        eq_(expr.attributes(), frozenset(["age", "name"]))
+        eq_(repr(expr), "((age >= 18) & (name != 'bob'))")
+
+    def test_evaluates(self):
+        id, age = attrs("id age")
+        t = {"id": 3, "age": 45}
+        ok_((age - 5 * id == 30)(t))
+        ok_(((age > 50) | ~(id == 2))(t))
+        ok_(id.isin([1, 3])(t))
+        ok_(not (age % 2 == 0)(t))
+        ok_((-id < 0)(t))
+        ok_((10 - id == 7)(t))
+
+    @raises(TypeError)
+    def test_no_truth_value(self):
+        (attr("a") > 1) and (attr("b") > 1)
+
+    def test_hashes_by_identity(self):
+        a = attr("a") == 1
+        eq_(len(set([a, a, attr("a") == 1])), 2)
+
+    def test_pickles(self):
+        expr = (attr("age") > 18) & attr("name").isin(["ann"])
+        expr(people().tuples.pop())
+        copy = pickle.loads(pickle.dumps(expr))
+        eq_(people().select(copy), people().select(expr))
+
+    def test_as_comparison(self):
+        c = as_comparison(const(18) < attr("age"))
+        ok_(isinstance(c, Comparison))
+        eq_((c.name, c.op, c.value), ("age", ">", 18))
+        m = as_comparison((attr("id") == 1) & (attr("name") == "ann"))
+        ok_(isinstance(m, Match))
+        eq_(as_comparison(attr("id") != 1), None)
+        eq_(as_comparison(attr("id") == attr("age")), None)
+
+
+class TestSelect(object):
+    def test_select(self):
+        expr = (attr("age") < 18) | (attr("name") == "cy")
+        eq_(people().select(expr),
+            people().select(lambda t: t["age"] < 18 or t["name"] == "cy"))
+
+    def test_constants(self):
+        eq_(people().select(const(True)), people())
+        eq_(people().select(const(False)).cardinality, 0)
+
+    def test_index(self):
+        rel = people().create_index("age", "sorted")
+        expr = attr("age") > 20
+        eq_(rel.select(expr), people().select(lambda t: t["age"] > 20))
+        ok_(rel._indexes[("sorted", ("age", ))] is not None,
+            "Simple comparisons should be answered by the index")
+
+    def test_inner_join(self):
+        on = (attr("id") == attr("owner")) & (attr("age") > 20)
+        expected = people().product(pets()).select(
+            lambda t: t["id"] == t["owner"] and t["age"] > 20)
+        eq_(people().inner_join(pets(), on), expected)
+
+    def test_plan(self):
+        on = (attr("id") == attr("owner")) & (attr("pet") != "owl")
+        lazy = people().lazy().inner_join(pets(), on)
+        plan = lazy.explain()
+        ok_(plan.startswith("EquiJoin(id = owner)"), plan)
+        ok_("Select((pet != 'owl'))" in plan, plan)
+        eq_(lazy.evaluate(),
+            people().product(pets()).select(on))
+
+    def test_merges_selections(self):
+        lazy = people().lazy().select(attr("age") > 10).select(attr("id") < 4)
+        eq_(lazy.explain().count("Select"), 1)
+        eq_(lazy.evaluate().cardinality, 3)
+
+
+def test_sympy_not_imported():
+    code = ("import sys, rel, rel.plan, rel.view, rel.expr\n"
+            "from rel.expr import attr\n"
+            "rel.Relation([(int, 'a')], [{'a': 1}]).select(attr('a') > 0)\n"
+            "sys.exit('sympy' in sys.modules)\n")
+    eq_(subprocess.call([sys.executable, "-c", code]), 0,
+        "sympy should only be imported by those using it")
@@ -0,0 +1,127 @@
+"""Tests for joins in bounded memory"""
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_, raises
+
+import rel.relation as r
+from rel import exc
+from rel import external
+from rel import values
+from rel.stream import StreamRelation
+
+
+def orders():
+    return r.Relation([(int, "id"), (int, "customer")],
+                      values(("id", "customer"),
+                             [(i, i % 37) for i in range(500)]))
+
+
+def customers():
+    return r.Relation([(int, "customer"), (str, "name")],
+                      values(("customer", "name"),
+                             [(i, "c{0}".format(i)) for i in range(0, 60, 2)]))
+
+
+class TestExternalJoin(object):
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.fan_in = external.FAN_IN
+
+    def teardown_method(self, method):
+        external.FAN_IN = self.fan_in
+        shutil.rmtree(self.directory)
+
+    setup = setup_method
+    teardown = teardown_method
+
+    def spilled(self):
+        # Counts the run files created in the directory while joining.
+        created = []
+        original = tempfile.TemporaryFile
+
+        def tracking(*args, **kwargs):
+            f = original(*args, **kwargs)
+            created.append(f)
+            return f
+        return created, original, tracking
+
+    def test_in_memory(self):
+        joined = orders().external_join(customers())
+        eq_(joined.materialize(), orders().join(customers()))
+
+    def test_spills(self):
+        created, original, tracking = self.spilled()
+        tempfile.TemporaryFile = tracking
+        try:
+            joined = orders().external_join(customers(), memory=4096,
+                                            directory=self.directory)
+            eq_(joined.materialize(), orders().join(customers()))
+        finally:
+            tempfile.TemporaryFile = original
+        ok_(len(created) > 2, "The inputs should have been spilled as runs")
+        ok_(all(f.closed for f in created), "The runs should be removed")
+        eq_(os.listdir(self.directory), [])
+
+    def test_multiple_passes(self):
+        external.FAN_IN = 2
+        joined = orders().external_join(customers(), memory=2048)
+        eq_(joined.materialize(), orders().join(customers()))
+
+    def test_equi_join(self):
+        names = customers().rename({"customer": "who"})
+        on = [("customer", "who")]
+        eq_(orders().external_join(names, on, memory=4096).materialize(),
+            orders().equi_join(names, on))
+
+    def test_product(self):
+        left = orders().select(lambda t: t["id"] < 50).project(["id"])
+        right = customers().project(["name"])
+        eq_(left.external_join(right, memory=2048).materialize(),
+            left.product(right))
+
+    def test_mixed_domains(self):
+        left = r.Relation([(object, "k"), (int, "a")],
+                          values(("k", "a"), [(1, 1), ("x", 2), (None, 3), (2.0, 4)]))
+        right = r.Relation([(object, "k"), (int, "b")],
+                           values(("k", "b"), [(2, 5), ("x", 6), (None, 7)]))
+        eq_(external.join(left, right, memory=64).materialize(), left.join(right))
+
+    def test_streams(self):
+        path = os.path.join(self.directory, "orders.csv")
+        with open(path, "w") as f:
+            f.write("id,customer\n")
+            for i in range(500):
+                f.write("{0},{1}\n".format(i, i % 37))
+        stream = StreamRelation.from_csv(path, [(int, "id"), (int, "customer")])
+        joined = external.join(stream, customers().lazy(), memory=4096)
+        eq_(joined.materialize(), orders().join(customers()))
+
+    def test_partially_ordered(self):
+        keys = [frozenset([i]) for i in range(40)] + [frozenset([1, 2])]
+        left = r.Relation([(frozenset, "k"), (int, "a")],
+                          values(("k", "a"), [(k, i) for (i, k) in enumerate(keys)]))
+        right = r.Relation([(frozenset, "k"), (int, "b")],
+                           values(("k", "b"), [(k, i) for (i, k) in enumerate(keys)
+                                               if i % 3 == 0]))
+        eq_(external.join(left, right).materialize(), left.join(right),
+            "Keys which aren't totally ordered should be hash joined")
+        eq_(external.join(left, right, memory=256).materialize(), left.join(right),
+            "Partitioning should give the same result as the hash join")
+
+    def test_several_types(self):
+        left = r.Relation([((int, str), "k"), (int, "a")],
+                          values(("k", "a"), [(1, 1), ("x", 2), (3, 3)]))
+        right = r.Relation([((int, str), "k"), (int, "b")],
+                           values(("k", "b"), [(1, 4), (3, 5), (7, 6)]))
+        eq_(external.join(left, right).materialize(), left.join(right),
+            "Domains made up of several types should be hash joined")
+        eq_(external.join(left, right, memory=64).materialize(), left.join(right),
+            "Partitioning should give the same result as the hash join")
+
+    @raises(exc.InvalidTuple)
+    def test_conflicting_domains(self):
+        left = r.Relation([(int, "k"), (int, "a")], values(("k", "a"), [(1, 1)]))
+        right = r.Relation([(int, "j"), (object, "a")], values(("j", "a"), [(1, 1)]))
+        external.join(left, right, [("k", "j")]).materialize()
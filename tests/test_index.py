@@ -0,0 +1,66 @@
+"""Tests for secondary indexes"""
+from nose.tools import eq_, ok_, raises
+
+import sympy
+
+import rel.relation as r
+from rel import exc
+from rel import values
+from rel.predicate import eq, lt, ge, between, match
+
+
+class TestIndex(object):
+    @property
+    def ex(self):
+        return r.Relation([(int, "id"), (int, "score"), (str, "name")],
+                          values(("id", "score", "name"), [
+                              (i, i % 10, "n{0}".format(i % 3))
+                              for i in range(100)
+                          ]))
+
+    def check(self, rel, expr):
+        scanned = self.ex.select(expr)
+        eq_(rel.select(expr),
+            scanned,
+            "Selecting through an index should agree with a scan")
+        return scanned
+
+    def test_hash_equality(self):
+        rel = self.ex.create_index("id")
+        self.check(rel, eq("id", 42))
+        ok_(rel._indexes[("hash", ("id", ))] is not None,
+            "The index should be built on first use")
+
+    def test_lazy_build(self):
+        rel = self.ex.create_index("id")
+        rel.select(lambda t: t["id"] == 42)
+        ok_(rel._indexes[("hash", ("id", ))] is None,
+            "Opaque predicates should not build the index")
+
+    def test_sorted_ranges(self):
+        rel = self.ex.create_index("score", kind="sorted")
+        for expr in (lt("score", 3), ge("score", 7), between("score", 2, 4),
+                     eq("score", 5)):
+            self.check(rel, expr)
+
+    def test_sympy_relationals(self):
+        rel = self.ex.create_index("score", kind="sorted")
+        score = sympy.Symbol("score")
+        self.check(rel, score < 3)
+        self.check(rel, sympy.Eq(score, 4))
+        self.check(rel, sympy.Integer(8) <= score)
+
+    def test_multiple_attributes(self):
+        rel = self.ex.create_index(["score", "name"])
+        found = self.check(rel, match(score=1, name="n2"))
+        ok_(len(found) > 0,
+            "There should be tuples matching on both attributes")
+
+    def test_empty_match(self):
+        rel = self.ex.create_index(["score", "name"])
+        eq_(self.check(rel, match()), self.ex,
+            "A match without any attributes should select every tuple")
+
+    @raises(exc.InvalidTuple)
+    def test_unknown_attribute(self):
+        self.ex.create_index("nope")
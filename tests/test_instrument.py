@@ -0,0 +1,130 @@
+"""Tests for the instrumentation of the operators"""
+from nose.tools import eq_, ok_, raises
+
+import rel.relation as r
+from rel import exc
+from rel import instrument
+from rel import values
+
+
+class TestInstrument(object):
+    @property
+    def ex(self):
+        return r.Relation([(int, "id"), (str, "name")],
+                          values(("id", "name"), [(1, "a"), (2, "b"), (3, "c")]))
+
+    @property
+    def other(self):
+        return r.Relation([(int, "key"), (int, "score")],
+                          values(("key", "score"), [(1, 10), (2, 20)]))
+
+    def teardown_method(self):
+        instrument.disable()
+
+    teardown = teardown_method
+
+    def test_disabled_by_default(self):
+        ok_(r.Relation.select is r._BaseRelation.__dict__["select"],
+            "The operators should be untouched unless enabled")
+
+    def test_restores_operators(self):
+        select = r._BaseRelation.__dict__["select"]
+        with instrument.recording():
+            ok_(r._BaseRelation.__dict__["select"] is not select)
+        ok_(r._BaseRelation.__dict__["select"] is select,
+            "Leaving the block should put the operators back")
+
+    def test_cardinalities(self):
+        ex = self.ex
+        with instrument.recording() as session:
+            ex.select(lambda t: t["id"] > 1).project(["name"])
+
+        eq_([rec.operator for rec in session.records], ["select", "project"])
+        eq_(session.records[0].inputs, [3])
+        eq_(session.records[0].output, 2)
+        eq_(session.records[1].inputs, [2])
+
+    def test_tree(self):
+        ex, other = self.ex, self.other
+        with instrument.recording() as session:
+            ex.inner_join(other, lambda t: t["id"] == t["key"])
+
+        root, = session.records
+        eq_(root.operator, "inner_join")
+        eq_(root.inputs, [3, 2])
+        eq_(root.output, 2)
+        eq_([c.operator for c in root.children], ["product", "select"],
+            "Nested operators should be recorded as children")
+        ok_("  product" in session.explain())
+
+    def test_validated(self):
+        with instrument.recording() as session:
+            self.ex
+        eq_(session.records[0].operator, "validate")
+        eq_(session.records[0].validated, 3)
+
+    def test_hooks(self):
+        seen = []
+        instrument.add_hook(seen.append)
+        try:
+            ex = self.ex
+            with instrument.recording():
+                ex.rename({"id": "ident"})
+        finally:
+            instrument.remove_hook(seen.append)
+        eq_([rec.operator for rec in seen], ["rename"])
+
+    def test_memory(self):
+        ex = self.ex
+        with instrument.recording(memory=True) as session:
+            ex.product(self.other.rename({"key": "k", "score": "s"}))
+        product = [rec for rec in session.records if rec.operator == "product"][0]
+        ok_(product.peak > 0, "The allocations of the product should be traced")
+
+    def test_properties(self):
+        ex = self.ex
+        with instrument.recording() as session:
+            list(ex.candidate_keys)
+        eq_(session.records[0].operator, "candidate_keys")
+
+    def test_join_all(self):
+        ex, other = self.ex, self.other
+        scores, ids = other.rename({"key": "id"}), ex.project(["id"])
+        with instrument.recording() as session:
+            ex.join_all(scores, ids)
+        root, = session.records
+        eq_(root.operator, "join_all")
+        eq_(root.inputs, [3, 2, 3])
+        eq_(root.output, 2)
+
+    def test_external_join(self):
+        ex, scores = self.ex, self.other.rename({"key": "id"})
+        with instrument.recording() as session:
+            joined = ex.external_join(scores)
+        root, = session.records
+        eq_(root.operator, "external_join")
+        eq_(root.inputs, [3, 2])
+        eq_(root.output, None,
+            "The joined stream shouldn't be read just to count its tuples")
+        eq_(joined.materialize(), ex.join(scores))
+
+    def test_ordering(self):
+        ex = self.ex
+        with instrument.recording() as session:
+            ex.limit(2)
+            ex.top_k(2, ["id"])
+        eq_([rec.operator for rec in session.records], ["limit", "top_k"],
+            "Ordering operators should be recorded")
+        eq_([rec.output for rec in session.records], [2, 2],
+            "The tuples listed by top_k should be counted")
+        eq_([c.operator for c in session.records[1].children], ["order_by"],
+            "Ordering before taking the top tuples should be recorded as a child")
+
+    @raises(exc.IncompatibleHeaders)
+    def test_errors(self):
+        ex, other = self.ex, self.other
+        with instrument.recording() as session:
+            try:
+                ex.union(other)
+            finally:
+                ok_(session.records[0].error is not None)
@@ -0,0 +1,124 @@
+"""Tests for ordering, limits and top-k"""
+import random
+
+from nose.tools import eq_, ok_, raises
+
+import rel.relation as r
+from rel import values
+from rel.expr import attr
+
+
+def scores():
+    return r.Relation([(int, "id"), (str, "team"), (int, "score")],
+                      values(("id", "team", "score"), [
+                          (1, "b", 10), (2, "a", 30), (3, "b", 30),
+                          (4, "a", 20), (5, "c", 10), (6, "a", 30),
+                      ]))
+
+
+def ids(tuples):
+    return [t["id"] for t in tuples]
+
+
+class TestOrderBy(object):
+    def test_single_key(self):
+        eq_(ids(scores().order_by("id")), [1, 2, 3, 4, 5, 6])
+        eq_(ids(scores().order_by("id", descending=True)), [6, 5, 4, 3, 2, 1])
+
+    def test_multiple_keys(self):
+        ordered = scores().order_by(["score", "id"], descending=[True, False])
+        eq_(ids(ordered), [2, 3, 6, 4, 1, 5])
+        ordered = scores().order_by(["team", "score", "id"])
+        eq_(ids(ordered), [4, 2, 6, 1, 3, 5])
+
+    def test_limit(self):
+        ordered = scores().order_by(["score", "id"], descending=[True, False])
+        eq_(ids(ordered.limit(4)), [2, 3, 6, 4])
+        eq_(ids(ordered.limit(4).limit(10)), [2, 3, 6, 4])
+        eq_(ordered.limit(0).tuples, [])
+
+    def test_matches_sorted(self):
+        rng = random.Random(7)
+        rows = [(i, rng.randint(0, 5), rng.randint(0, 5)) for i in range(300)]
+        rel = r.Relation([(int, "id"), (int, "x"), (int, "y")],
+                         values(("id", "x", "y"), rows))
+        expected = sorted(rows, key=lambda row: (-row[1], row[2], row[0]))
+        eq_(ids(rel.order_by(["x", "y", "id"], [True, False, False]).limit(25)),
+            [row[0] for row in expected[:25]])
+
+    def test_domains(self):
+        rel = r.Relation([(int, "id"), (complex, "z"), (object, "o")],
+                         values(("id", "z", "o"), [
+                             (1, 2 + 1j, "x"), (2, 1 + 5j, 3), (3, 2 + 0j, None),
+                         ]))
+        eq_(ids(rel.order_by("z")), [2, 3, 1])
+        eq_(ids(rel.order_by("o")), [3, 2, 1])
+
+    def test_several_types(self):
+        rel = r.Relation([(int, "id"), ((int, str), "k")],
+                         values(("id", "k"), [(1, "x"), (2, 3), (3, 1), (4, "a")]))
+        eq_(ids(rel.order_by("k")), [3, 2, 4, 1])
+        eq_(ids(rel.top_k(2, "k", descending=True)), [1, 4])
+
+    def test_to_relation(self):
+        eq_(scores().order_by("id").limit(2).to_relation(),
+            scores().select(lambda t: t["id"] <= 2))
+
+    @raises(KeyError)
+    def test_unknown_attribute(self):
+        scores().order_by("nope")
+
+    @raises(ValueError)
+    def test_directions(self):
+        scores().order_by(["id", "score"], descending=[True])
+
+
+class TestTopK(object):
+    def test_top_k(self):
+        eq_([t["score"] for t in scores().top_k(3, "score")], [30, 30, 30])
+        eq_(ids(scores().top_k(2, ["score", "id"], descending=False)), [1, 5])
+
+    def test_limit(self):
+        limited = scores().limit(4)
+        eq_(limited.cardinality, 4)
+        ok_(limited.tuples <= scores().tuples)
+        eq_(scores().limit(100), scores())
+
+
+class TestLazy(object):
+    def setup_method(self, method):
+        self.checked = 0
+
+    setup = setup_method
+
+    def counting(self, t):
+        self.checked += 1
+        return t["score"] >= 0
+
+    def big(self):
+        return r.Relation([(int, "id"), (int, "score")],
+                          values(("id", "score"),
+                                 [(i, i % 100) for i in range(1000)]))
+
+    def test_limit_stops_early(self):
+        limited = self.big().lazy().select(self.counting).limit(5)
+        eq_(limited.cardinality, 5)
+        eq_(self.checked, 5)
+        ok_(limited.explain().startswith("Limit(5)"), limited.explain())
+
+    def test_project_stops_early(self):
+        limited = self.big().lazy().select(self.counting).project(["score"]).limit(3)
+        eq_(limited.cardinality, 3)
+        ok_(self.checked < 1000, "Only a prefix should have been selected")
+
+    def test_top_k(self):
+        lazy = self.big().lazy().select(attr("score") > 90)
+        top = lazy.top_k(4, ["score", "id"])
+        eq_([(t["score"], t["id"]) for t in top],
+            [(99, 999), (99, 899), (99, 799), (99, 699)])
+        eq_(ids(lazy.order_by("id").limit(2)), [91, 92])
+
+    def test_selection_above_limit(self):
+        limited = self.big().lazy().limit(10).select(attr("score") > 1000)
+        eq_(limited.cardinality, 0)
+        ok_("Limit(10)" in limited.explain())
@@ -0,0 +1,77 @@
+"""Tests for the parallel executor"""
+from nose.tools import eq_, ok_
+
+import rel.relation as r
+from rel import values
+from rel.parallel import ParallelExecutor
+
+
+def even(t):
+    return t["a"] % 2 == 0
+
+
+class TestParallel(object):
+    def setup_method(self, method=None):
+        self.executor = ParallelExecutor(max_workers=2, threshold=0)
+
+    def teardown_method(self, method=None):
+        self.executor.close()
+
+    setup = setup_method
+    teardown = teardown_method
+
+    @property
+    def left(self):
+        return r.Relation([(int, "a"), (int, "b")],
+                          values(("a", "b"), [(i, i % 7) for i in range(50)]))
+
+    @property
+    def right(self):
+        return r.Relation([(int, "b"), (str, "c")],
+                          values(("b", "c"), [(i, str(i)) for i in range(5)]))
+
+    def test_select(self):
+        eq_(self.executor.select(self.left, even),
+            self.left.select(even),
+            "A parallel selection should agree with the serial one")
+
+    def test_select_constants(self):
+        for expr in [1, 0]:
+            eq_(self.executor.select(self.left, expr),
+                self.left.select(expr),
+                "Constant predicates should agree with the serial selection")
+        ok_(self.executor._pool is None,
+            "Constant predicates should not start the pool")
+
+    def test_join(self):
+        eq_(self.executor.join(self.left, self.right),
+            self.left.join(self.right),
+            "A parallel join should agree with the serial one")
+
+    def test_equi_join(self):
+        right = self.right.rename({"b": "d"})
+        eq_(self.executor.equi_join(self.left, right, [("b", "d")]),
+            self.left.equi_join(right, [("b", "d")]),
+            "A parallel equi-join should agree with the serial one")
+
+    def test_product(self):
+        right = self.right.rename({"b": "d"})
+        eq_(self.executor.product(self.left, right),
+            self.left.product(right),
+            "A parallel product should agree with the serial one")
+
+    def test_empty(self):
+        empty = r.Relation([(int, "a"), (int, "b")], [])
+        right = self.right.rename({"b": "d"})
+        eq_(self.executor.select(empty, even),
+            empty,
+            "Selecting from an empty relation should give it back")
+        eq_(self.executor.product(empty, right),
+            empty.product(right),
+            "The product with an empty relation should be empty")
+
+    def test_small_relations_stay_serial(self):
+        executor = ParallelExecutor(max_workers=2)
+        executor.select(self.left, lambda t: True)
+        ok_(executor._pool is None,
+            "Relations below the threshold should not start the pool")
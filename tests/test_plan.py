@@ -0,0 +1,82 @@
+"""Tests for lazy relations and their optimizer"""
+from nose.tools import eq_, ok_
+
+import sympy
+
+import rel.relation as r
+from rel import values
+from rel import plan
+
+
+a, b, c, d = sympy.symbols("a b c d")
+
+class TestLazy(object):
+    @property
+    def left(self):
+        return r.Relation([(int, "a"), (int, "b")],
+                          values(("a", "b"), [(1, 10), (2, 20), (3, 30)]))
+
+    @property
+    def right(self):
+        return r.Relation([(int, "c"), (int, "d")],
+                          values(("c", "d"), [(1, 5), (2, 6), (4, 7)]))
+
+    def test_evaluates_like_eager(self):
+        expr = sympy.And(sympy.Eq(a, c), b > 10)
+        lazy = self.left.lazy().product(self.right).select(expr).project(["b", "d"])
+        eager = self.left.product(self.right).select(expr).project(["b", "d"])
+        eq_(lazy,
+            eager,
+            "A lazy plan should evaluate to the same relation as the eager one")
+        eq_(len(lazy),
+            1,
+            "Taking the length should evaluate the plan")
+
+    def test_select_over_product_becomes_join(self):
+        lazy = self.left.lazy().inner_join(self.right, sympy.Eq(a, c))
+        ok_(isinstance(lazy.plan, plan.EquiJoin),
+            "An equality selection on a product should become an equi-join")
+
+    def test_selection_pushed_down(self):
+        lazy = self.left.lazy().product(self.right).select(sympy.And(b > 10, d < 7))
+        ok_(isinstance(lazy.plan, plan.Product),
+            "Selections on a single side should be pushed below the product")
+        eq_(lazy,
+            self.left.product(self.right).select(sympy.And(b > 10, d < 7)),
+            "Pushing the selections down should not change the result")
+
+    def test_projection_pushed_down(self):
+        lazy = self.left.lazy().product(self.right).project(["a", "c"])
+        node = lazy.plan
+        ok_(isinstance(node, plan.Product) and
+            all(isinstance(child, plan.Project) for child in node.children),
+            "The projection of a product should be the product of projections")
+
+    def test_dee_identity(self):
+        lazy = self.left.lazy().product(r.Dee)
+        ok_(isinstance(lazy.plan, plan.Scan),
+            "Dee should be removed from products as the identity")
+
+    def test_doe_null(self):
+        lazy = self.left.lazy().product(r.Doe).project(["a"])
+        eq_(len(lazy),
+            0,
+            "A product with Doe should be empty")
+
+    def test_callable_stays(self):
+        lazy = self.left.lazy().product(self.right).select(lambda t: t["a"] == t["c"])
+        ok_(isinstance(lazy.plan, plan.Select),
+            "Callables are opaque and should stay where they were placed")
+        eq_(len(lazy),
+            2,
+            "Opaque selections should still be evaluated")
+
+    def test_arithmetic_selections(self):
+        lazy = self.left.lazy().select(b - 10 * a).select(a > 1)
+        eq_(lazy,
+            self.left.select(b - 10 * a).select(a > 1),
+            "Arithmetic selections can't be conjoined and should stay separate")
+        for on in (b - 10, a - c):
+            eq_(self.left.inner_join(self.right, on),
+                self.left.product(self.right).select(on),
+                "Arithmetic join conditions should select like the eager select")
@@ -0,0 +1,100 @@
+"""Tests for the compilation of selection predicates"""
+from nose.tools import eq_, ok_
+
+import sympy
+
+import rel.relation as r
+from rel import values
+from rel import predicate
+
+
+a, b = sympy.symbols("a b")
+
+class TestCompiledSelect(object):
+    @property
+    def ex(self):
+        return r.Relation([(int, "a"), (int, "b"), (str, "c")],
+                          values(("a", "b", "c"), [
+                              (1, 2, "x"),
+                              (2, 2, "y"),
+                              (3, 1, "z"),
+                          ]))
+
+    def by_substitution(self, rel, expr):
+        return set(t for t in rel.tuples if expr.subs(t.items()))
+
+    def test_arithmetic_truthiness(self):
+        expr = a - b
+        eq_(self.ex.select(expr).tuples,
+            self.by_substitution(self.ex, expr),
+            """An arithmetic expression should select the tuples for which it is
+            non-zero, just like substitution""")
+
+    def test_relational(self):
+        expr = sympy.And(a >= 2, sympy.Eq(b, 2))
+        eq_(self.ex.select(expr).tuples,
+            self.by_substitution(self.ex, expr),
+            "Relational expressions should be usable as selections")
+
+    def test_cache_reused(self):
+        predicate.cache_clear()
+        self.ex.select(a + b - 3)
+        self.ex.select(a + b - 3)
+        info = predicate.cache_info()
+        eq_((info.hits, info.misses),
+            (1, 1),
+            "Selecting twice with the same expression should compile it once")
+
+    def test_assumptions_fall_back(self):
+        positive = sympy.Symbol("a", positive=True)
+        compiled = predicate.compile_predicate(positive - 1,
+                                               self.ex.attributes)
+        t = next(iter(self.ex.select(lambda t: t["a"] == 1).tuples))
+        ok_(compiled(t),
+            """Symbols with assumptions aren't substituted from tuples and should
+            therefore remain symbolic""")
+
+    def test_division_by_zero(self):
+        rel = r.Relation([(int, "a"), (int, "b")],
+                         values(("a", "b"), [(1, 0), (2, 1), (0, 2)]))
+        expr = a / b
+        eq_(rel.select(expr).tuples,
+            self.by_substitution(rel, expr),
+            """Dividing by zero gives complex infinity when substituting, which
+            should be kept rather than raising""")
+
+    def test_negative_square_root(self):
+        rel = r.Relation([(int, "a")], values(("a", ), [(-4, ), (0, ), (9, )]))
+        expr = sympy.sqrt(a)
+        eq_(rel.select(expr).tuples,
+            self.by_substitution(rel, expr),
+            "The square root of a negative number should be imaginary, not an error")
+
+    def test_constants(self):
+        eq_(self.ex.select(sympy.Integer(1)), self.ex,
+            "A sympy number equal to true should select every tuple")
+        eq_(self.ex.select(sympy.Integer(0)).cardinality, 0,
+            "A sympy number equal to false should select nothing")
+
+    def test_exact_fractions(self):
+        rel = r.Relation([(int, "a"), (int, "b")],
+                         values(("a", "b"), [(1, 2), (2, 2)]))
+        expr = a / 10 + b / 10 - sympy.Rational(3, 10)
+        eq_(rel.select(expr).tuples,
+            self.by_substitution(rel, expr),
+            "Fractions should be exact like they are when substituting")
+
+    def test_exact_large_division(self):
+        rel = r.Relation([(int, "a")],
+                         values(("a", ), [(2 ** 60, ), (2 ** 60 + 1, )]))
+        expr = sympy.Eq(a / 2 ** 60, 1)
+        eq_(rel.select(expr).tuples,
+            self.by_substitution(rel, expr),
+            "Dividing large integers shouldn't round them to floats")
+
+    def test_compiles_integer_arithmetic(self):
+        expr = sympy.And(a ** 2 + 3 * b > 4, sympy.Ne(a, b))
+        ok_(predicate._compile(expr, frozenset(self.ex.attributes), "math"),
+            "Sums, products and powers of integers should be compiled")
+        ok_(predicate._compile(a / b, frozenset(self.ex.attributes), "math") is None,
+            "Division should be left to substitution")
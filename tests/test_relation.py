@@ -1,6 +1,7 @@
-from nose.tools import eq_, ok_
+from nose.tools import eq_, ok_, raises
 
 import rel.relation as r
+from rel import exc
 from rel import values
 
 class TestRelationAxioms(object):
@@ -66,6 +67,15 @@ class TestRelationAxioms(object):
             """Selecting on a tautology indicated by the python Boolean value of
             true should be equivalent to the identity function.""")
 
+    def test_select_tautology_one(self):
+        eq_(self.ex.select(1),
+            self.ex,
+            """Values equal to true, such as the number one, should be treated as
+            tautologies""")
+        eq_(self.ex.select(0),
+            self.ex_emp,
+            "Values equal to false should be treated as contradictions")
+
     def test_select_tautology_none(self):
         selection = self.ex.select(None)
 
@@ -76,6 +86,42 @@ class TestRelationAxioms(object):
             to the identity function""")
 
 
+class TestValidation(object):
+    def teardown_method(self, method=None):
+        r.Relation.validation = "full"
+
+    teardown = teardown_method
+
+    @raises(exc.ValueOutsideDomain)
+    def test_outside_domain(self):
+        r.Relation([(int, "id")], values(("id", ), [(1, ), ("2", )]))
+
+    @raises(exc.ValueOutsideDomain)
+    def test_outside_domain_batched(self):
+        r.Relation.validation = "batched"
+        r.Relation([(int, "id")], values(("id", ), [(1, ), ("2", )]))
+
+    @raises(exc.InvalidTuple)
+    def test_unknown_attribute(self):
+        r.Relation([(int, "id")], values(("name", ), [(1, )]))
+
+    def test_batched_accepts_subclasses(self):
+        r.Relation.validation = "batched"
+        rel = r.Relation([(int, "id")], values(("id", ), [(2, ), (True, )]))
+        eq_(len(rel),
+            2,
+            "Batched validation should accept values of subclasses of the domain")
+
+    def test_attribute_lookup(self):
+        rel = r.Relation([(int, "id"), (str, "name")], ())
+        eq_(rel.attribute("name"),
+            r.Attribute(str, "name"),
+            "Attributes should be looked up by name")
+        eq_(rel.project(["id"]).attribute("id"),
+            r.Attribute(int, "id"),
+            "Derived relations should be able to look up their attributes")
+
+
 abc_header = [(int, "a"), (int, "b"), (int, "c")]
 
 class TestKeys(object):
@@ -126,3 +172,244 @@ class TestKeys(object):
            """There should only be a single candidate key if it is the only
            unique attribute. All the superkeys (including itself) are
            therefore supersets of this key.""")
+
+
+class TestJoins(object):
+    @property
+    def people(self):
+        return r.Relation([(int, "id"), (str, "name")],
+                          values(("id", "name"), [
+                              (1, "alice"),
+                              (2, "bob"),
+                              (3, "carol"),
+                          ]))
+
+    @property
+    def orders(self):
+        return r.Relation([(int, "id"), (str, "item")],
+                          values(("id", "item"), [
+                              (1, "book"),
+                              (1, "pen"),
+                              (3, "lamp"),
+                              (4, "desk"),
+                          ]))
+
+    @property
+    def owners(self):
+        return r.Relation([(int, "owner"), (str, "item")],
+                          values(("owner", "item"), [
+                              (1, "book"),
+                              (2, "pen"),
+                          ]))
+
+    def test_natural_join(self):
+        joined = self.people.join(self.orders)
+        expected = r.Relation([(int, "id"), (str, "name"), (str, "item")],
+                              values(("id", "name", "item"), [
+                                  (1, "alice", "book"),
+                                  (1, "alice", "pen"),
+                                  (3, "carol", "lamp"),
+                              ]))
+        eq_(joined,
+            expected,
+            """A natural join should keep exactly the pairs of tuples agreeing
+            on the shared attributes""")
+
+    def test_natural_join_commutes(self):
+        eq_(self.people.join(self.orders),
+            self.orders.join(self.people),
+            """The natural join should not depend on which side is used to
+            build the hash table""")
+
+    def test_join_disjoint_is_product(self):
+        eq_(self.people.project(["name"]).join(self.owners),
+            self.people.project(["name"]).product(self.owners),
+            """Joining relations without common attributes should be the
+            product""")
+
+    def test_equi_join(self):
+        joined = self.people.equi_join(self.owners, [("id", "owner")])
+        expected = r.Relation([(int, "id"), (str, "name"),
+                               (int, "owner"), (str, "item")],
+                              values(("id", "name", "owner", "item"), [
+                                  (1, "alice", 1, "book"),
+                                  (2, "bob", 2, "pen"),
+                              ]))
+        eq_(joined,
+            expected,
+            """An equi-join should match the paired attributes even when their
+            names differ""")
+
+    def test_equi_join_matches_inner_join(self):
+        eq_(self.people.equi_join(self.owners, [("id", "owner")]),
+            self.people.inner_join(self.owners,
+                                   lambda t: t["id"] == t["owner"]),
+            """The hash based equi-join should agree with the nested loop inner
+            join""")
+
+
+class TestDependencies(object):
+    @property
+    def ex(self):
+        return r.Relation(abc_header,
+                          values(("a", "b", "c"), [
+                              (1, 10, 7),
+                              (2, 10, 7),
+                              (3, 20, 8),
+                              (4, 20, 8),
+                          ]))
+
+    def test_candidate_keys(self):
+        eq_(self.ex.candidate_keys,
+            [set(["a"])],
+            """Only the attribute that is unique on its own should be a candidate
+            key""")
+
+    def test_candidate_keys_dee(self):
+        eq_(r.Dee.candidate_keys,
+            [set()],
+            "The empty set of attributes should be the only key of Dee")
+
+    def test_functional_dependencies(self):
+        fds = set(self.ex.functional_dependencies)
+        eq_(fds,
+            set([(frozenset(["a"]), "b"),
+                 (frozenset(["a"]), "c"),
+                 (frozenset(["b"]), "c"),
+                 (frozenset(["c"]), "b")]),
+            "Only the minimal functional dependencies should be found")
+
+    def test_super_keys_contain_candidate(self):
+        ok_(all("a" in k for k in self.ex.super_keys),
+            "Every super key should contain the candidate key")
+
+
+class TestSetOperators(object):
+    @property
+    def ab(self):
+        return r.Relation([(int, "id")], values(("id", ), [(1, ), (2, )]))
+
+    @property
+    def bc(self):
+        return r.Relation([(int, "id")], values(("id", ), [(2, ), (3, )]))
+
+    @property
+    def names(self):
+        return r.Relation([(int, "id"), (str, "name")],
+                          values(("id", "name"), [(2, "b"), (3, "c"), (4, "d")]))
+
+    def test_union(self):
+        eq_(self.ab.union(self.bc),
+            r.Relation([(int, "id")], values(("id", ), [(1, ), (2, ), (3, )])),
+            "The union should contain the tuples of both relations")
+
+    def test_minus(self):
+        eq_(self.ab.minus(self.bc),
+            r.Relation([(int, "id")], values(("id", ), [(1, )])),
+            "The difference should remove the tuples of the other relation")
+
+    def test_intersect(self):
+        eq_(self.ab.intersect(self.bc),
+            r.Relation([(int, "id")], values(("id", ), [(2, )])),
+            "The intersection should keep the tuples in both relations")
+
+    @raises(exc.IncompatibleHeaders)
+    def test_incompatible(self):
+        self.ab.union(self.names)
+
+    def test_semijoin(self):
+        eq_(self.names.semijoin(self.ab),
+            self.names.join(self.ab).project(self.names.attribute_names),
+            "The semijoin should be the join projected onto the left side")
+
+    def test_antijoin(self):
+        eq_(self.names.antijoin(self.ab),
+            self.names.minus(self.names.semijoin(self.ab)),
+            "The antijoin should be the complement of the semijoin")
+
+    def test_semijoin_disjoint(self):
+        eq_(self.ab.semijoin(r.Dee),
+            self.ab,
+            "Every tuple should match a non-empty relation without common attributes")
+        eq_(len(self.ab.semijoin(r.Doe)),
+            0,
+            "No tuple should match an empty relation")
+
+
+class TestDivision(object):
+    @property
+    def supplies(self):
+        return r.Relation([(str, "supplier"), (str, "part")],
+                          values(("supplier", "part"), [
+                              ("s1", "p1"), ("s1", "p2"), ("s1", "p3"),
+                              ("s2", "p1"), ("s2", "p2"),
+                              ("s3", "p2"),
+                          ]))
+
+    def parts(self, *names):
+        return r.Relation([(str, "part")], values(("part", ), [(n, ) for n in names]))
+
+    def suppliers(self, *names):
+        return r.Relation([(str, "supplier")],
+                          values(("supplier", ), [(n, ) for n in names]))
+
+    def codd(self, dividend, divisor):
+        # Division written out with the other operators.
+        names = [attr.name for attr in dividend.attributes - divisor.attributes]
+        quotient = dividend.project(names)
+        missing = quotient.product(divisor).minus(dividend).project(names)
+        return quotient.minus(missing)
+
+    def test_divide(self):
+        eq_(self.supplies.divide(self.parts("p1", "p2")),
+            self.suppliers("s1", "s2"),
+            "Only suppliers supplying every part should remain")
+        eq_(self.supplies.divide(self.parts("p1", "p2")),
+            self.codd(self.supplies, self.parts("p1", "p2")),
+            "The divide should agree with Codd's definition")
+        eq_(self.supplies.divide(self.parts("p1", "p4")).cardinality, 0,
+            "No supplier supplies a part nobody supplies")
+
+    def test_divide_empty(self):
+        eq_(self.supplies.divide(self.parts()),
+            self.supplies.project(["supplier"]),
+            "Dividing by an empty divisor should give the projection")
+
+    def test_divide_dee_doe(self):
+        eq_(self.supplies.divide(r.Dee), self.supplies,
+            "Dividing by Dee should give the dividend")
+        eq_(self.supplies.divide(r.Doe), self.supplies,
+            "Like dividing by an empty divisor, dividing by Doe should give the dividend")
+        ok_(self.parts("p1").divide(self.parts("p1")) is r.Dee,
+            "A quotient without attributes should be Dee when the divisor is contained")
+        ok_(self.parts("p1").divide(self.parts("p1", "p2")) is r.Doe,
+            "A quotient without attributes should be Doe when the divisor isn't contained")
+        ok_(self.parts().divide(self.parts()) is r.Doe,
+            "Like the projection, an empty dividend should give Doe")
+
+    @raises(exc.IncompatibleHeaders)
+    def test_divide_incompatible(self):
+        self.parts("p1").divide(self.supplies)
+
+    def test_great_divide(self):
+        needs = r.Relation([(str, "part"), (str, "project")],
+                           values(("part", "project"), [
+                               ("p1", "j1"), ("p2", "j1"),
+                               ("p3", "j2"),
+                               ("p2", "j3"),
+                           ]))
+        expected = r.Relation([(str, "supplier"), (str, "project")],
+                              values(("supplier", "project"), [
+                                  ("s1", "j1"), ("s2", "j1"),
+                                  ("s1", "j2"),
+                                  ("s1", "j3"), ("s2", "j3"), ("s3", "j3"),
+                              ]))
+        eq_(self.supplies.great_divide(needs), expected,
+            "Suppliers should be paired with the projects whose parts they all supply")
+        eq_(self.supplies.great_divide(self.parts("p1", "p2")),
+            self.supplies.divide(self.parts("p1", "p2")),
+            "Without attributes of its own the great divide should be the divide")
+
+    @raises(exc.IncompatibleHeaders)
+    def test_great_divide_clashing(self):
+        self.supplies.great_divide(r.Relation([(int, "part")], ()))
@@ -0,0 +1,114 @@
+"""Tests for distinct count sketches and approximate key discovery"""
+import random
+
+from nose.tools import eq_, ok_, raises
+
+import rel.relation as r
+from rel import sketch
+from rel import values
+
+
+def relation(names, rows):
+    return r.Relation([(int, name) for name in names], values(names, rows))
+
+
+def random_relation(n, width, domain, seed=1):
+    rng = random.Random(seed)
+    names = ["a{0}".format(i) for i in range(width)]
+    return relation(names, [tuple(rng.randint(0, domain) for _ in names)
+                            for _ in range(n)])
+
+
+def normalized(keys):
+    return sorted(sorted(key) for key in keys)
+
+
+class TestHyperLogLog(object):
+    def test_estimate(self):
+        h = sketch.HyperLogLog()
+        for i in range(50000):
+            h.add(i)
+            h.add(i)
+        ok_(abs(h.estimate() - 50000) < 50000 * 3 * h.error, h)
+
+    def test_small(self):
+        h = sketch.HyperLogLog()
+        for v in ["a", "b", "c", "a"]:
+            h.add(v)
+        eq_(round(h.estimate()), 3)
+        eq_(sketch.HyperLogLog().estimate(), 0)
+
+    def test_merge(self):
+        a, b = sketch.HyperLogLog(10), sketch.HyperLogLog(10)
+        for i in range(3000):
+            a.add(i)
+            b.add(i + 1500)
+        a.merge(b)
+        ok_(abs(a.estimate() - 4500) < 4500 * 3 * a.error, a)
+
+    @raises(ValueError)
+    def test_merge_precision(self):
+        sketch.HyperLogLog(10).merge(sketch.HyperLogLog(12))
+
+
+class TestEstimates(object):
+    def test_projection(self):
+        rel = relation(("a", "b"), [(i, i % 100) for i in range(20000)])
+        estimate = sketch.estimate_distinct(rel, ["b"])
+        ok_(abs(estimate - 100) < 5, estimate)
+        estimate = sketch.estimate_distinct(rel, ["a", "b"])
+        ok_(abs(estimate - 20000) < 20000 * 0.1, estimate)
+
+    def test_sampled(self):
+        rel = relation(("a", "b"), [(i, i % 100) for i in range(20000)])
+        # The sample depends on the order of the set of tuples, which
+        # the hash seed decides, so only a bound can be relied on.
+        estimate = sketch.estimate_distinct_sampled(rel, ["b"], seed=3)
+        ok_(90 <= estimate <= 110, estimate)
+        ok_(sketch.estimate_distinct_sampled(rel, ["a"], seed=3) > 1000)
+        eq_(sketch.gee([], 10), 0.0)
+
+    def test_single_pass(self):
+        rel = random_relation(3000, 3, 20)
+        found, sample, n = sketch.sketches(rel.tuples, [["a0"], ["a1", "a2"]],
+                                           sample=100, seed=1)
+        eq_(n, rel.cardinality)
+        eq_(len(sample), 100)
+        ok_(set(sample) <= rel.tuples)
+        eq_(sorted(found), [("a0", ), ("a1", "a2")])
+
+
+class TestApproximateKeys(object):
+    def test_same_keys(self):
+        for (n, width, domain) in [(2000, 6, 20), (500, 5, 3), (300, 4, 1000)]:
+            rel = random_relation(n, width, domain)
+            eq_(normalized(rel.find_candidate_keys(approximate=True)),
+                normalized(rel.candidate_keys))
+
+    def test_super_keys(self):
+        rel = random_relation(1000, 4, 40)
+        eq_(normalized(rel.find_super_keys(approximate=True)),
+            normalized(rel.super_keys))
+
+    def test_dee_doe(self):
+        eq_(r.Dee.find_candidate_keys(approximate=True), [set()])
+        eq_(r.Doe.find_candidate_keys(approximate=True), [set()])
+        eq_(r.Dee.find_candidate_keys(approximate=True), r.Dee.candidate_keys)
+
+    def test_pruned(self):
+        checked = []
+        original = sketch._keys
+
+        def counting(tuples, attribute_sets):
+            checked.extend(attribute_sets)
+            return original(tuples, attribute_sets)
+
+        sketch._keys = counting
+        try:
+            rel = relation(("id", "a", "b"),
+                           [(i, i % 3, i % 5) for i in range(5000)])
+            eq_(rel.find_candidate_keys(approximate=True), [set(["id"])])
+        finally:
+            sketch._keys = original
+        eq_(checked, [("id", )],
+            "Only the attribute sets surviving the estimates should be checked")
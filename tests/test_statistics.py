@@ -0,0 +1,92 @@
+"""Tests for statistics and the ordering of multi-way joins"""
+from nose.tools import eq_, ok_
+
+import rel.relation as r
+from rel import statistics
+from rel import values
+
+
+def relation(names, rows):
+    return r.Relation([(int, name) for name in names], values(names, rows))
+
+
+class TestStatistics(object):
+    def test_collect(self):
+        rel = relation(("a", "b"), [(i, i % 3) for i in range(100)])
+        stats = rel.statistics
+        eq_(stats.cardinality, 100)
+        eq_(stats.distinct("a"), 100)
+        eq_(stats.distinct("b"), 3)
+        eq_((stats.columns["a"].minimum, stats.columns["a"].maximum), (0, 99))
+        ok_(rel.statistics is stats, "Statistics should be collected once")
+
+    def test_unorderable(self):
+        rel = r.Relation([(object, "x")], values(("x", ), [(1, ), ("a", )]))
+        column = rel.statistics.columns["x"]
+        eq_(column.distinct, 2)
+        eq_(column.histogram, None)
+
+    def test_histogram(self):
+        h = statistics.Histogram(list(range(1000)))
+        ok_(abs(h.fraction_below(250) - 0.25) < 0.1)
+        ok_(abs(h.fraction_between(100, 599) - 0.5) < 0.1)
+        eq_(h.fraction_between(2000, 3000), 0.0)
+        eq_(h.fraction_between(-5, 5000), 1.0)
+
+    def test_estimate(self):
+        left = relation(("k", "x"), [(i % 10, i) for i in range(100)])
+        right = relation(("k", "y"), [(i, i) for i in range(10)])
+        estimate = statistics.estimate_join(left.statistics, right.statistics, ["k"])
+        eq_(round(estimate), left.join(right).cardinality)
+
+        disjoint = relation(("k", "y"), [(i, i) for i in range(100, 110)])
+        eq_(statistics.estimate_join(left.statistics, disjoint.statistics, ["k"]), 0)
+
+
+class TestJoinOrder(object):
+    def setup_method(self):
+        self.a = relation(("a", "x"), [(i, i % 50) for i in range(500)])
+        self.b = relation(("x", "y"), [(i % 50, i) for i in range(500)])
+        self.c = relation(("y", "z"), [(i, i % 7) for i in range(500)])
+        self.d = relation(("z", ), [(3, )])
+
+    setup = setup_method
+
+    def expected(self):
+        return self.a.join(self.b).join(self.c).join(self.d)
+
+    def test_same_result(self):
+        eq_(self.a.join_all(self.b, self.c, self.d), self.expected())
+
+    def test_order(self):
+        plan = statistics.plan_joins([self.a, self.b, self.c, self.d])
+        naive = statistics.JoinStep(statistics.JoinStep(
+            statistics.JoinStep(statistics.Leaf(0, self.a), statistics.Leaf(1, self.b)),
+            statistics.Leaf(2, self.c)), statistics.Leaf(3, self.d))
+        ok_(plan.cost < naive.cost,
+            "The plan should be cheaper than joining in the order given")
+
+        # The selective relation d should be joined with c before the
+        # large join between a and b takes place.
+        lines = plan.explain().splitlines()
+        ok_(any("Relation #3" in line for line in lines[-4:]), plan.explain())
+
+    def test_nested_loop(self):
+        plan = statistics.plan_joins([self.c, self.d])
+        eq_(plan.root.method, statistics.NESTED_LOOP)
+        eq_(plan.execute(), self.c.join(self.d))
+        ok_("actual=" in plan.explain())
+
+    def test_greedy(self):
+        exhaustive = statistics.EXHAUSTIVE
+        statistics.EXHAUSTIVE = 2
+        try:
+            eq_(statistics.join_all([self.a, self.b, self.c, self.d]),
+                self.expected())
+        finally:
+            statistics.EXHAUSTIVE = exhaustive
+
+    def test_products(self):
+        e = relation(("w", ), [(1, ), (2, )])
+        eq_(statistics.join_all([self.d, e]), self.d.product(e))
+        eq_(statistics.join_all([self.d]), self.d)
@@ -0,0 +1,125 @@
+"""Tests for the on-disk storage of relations"""
+import fractions
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_, raises
+
+import sympy
+
+import rel.relation as r
+from rel import exc
+from rel import values
+from rel import storage
+
+
+class TestStorage(object):
+    def setup_method(self, method=None):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "ex.rel")
+
+    def teardown_method(self, method=None):
+        shutil.rmtree(self.directory)
+
+    setup = setup_method
+    teardown = teardown_method
+
+    @property
+    def ex(self):
+        return r.Relation([(int, "id"), (float, "score"), (str, "name"),
+                           (bool, "active"), (object, "extra")],
+                          values(("id", "score", "name", "active", "extra"), [
+                              (1, 0.5, "alice", True, (1, 2)),
+                              (2, 1.5, "b\xf6b", False, None),
+                              (2 ** 80, 2.5, "", True, "x"),
+                          ]))
+
+    def test_round_trip(self):
+        storage.save(self.ex, self.path)
+        with storage.load(self.path) as loaded:
+            eq_(loaded.to_relation(),
+                self.ex,
+                "Saving and loading a relation should give back the same relation")
+            eq_(loaded,
+                self.ex,
+                "The mapped relation should compare equal to the original")
+
+    def test_columns_are_views(self):
+        storage.save(self.ex, self.path)
+        with storage.load(self.path) as loaded:
+            ok_(isinstance(loaded.column("score"), memoryview),
+                "Fixed width columns should be read straight from the mapping")
+
+    def test_operators(self):
+        storage.save(self.ex, self.path)
+        score = sympy.Symbol("score")
+        with storage.load(self.path) as loaded:
+            eq_(loaded.project(["name", "active"]),
+                self.ex.project(["name", "active"]),
+                "Projecting the mapped relation should agree with the original")
+            eq_(loaded.select(score > 1),
+                self.ex.select(score > 1),
+                "Selecting on the mapped relation should agree with the original")
+            eq_(loaded.project([]),
+                r.Dee,
+                "Projecting onto nothing should give Dee")
+
+    def test_empty(self):
+        empty = r.Relation([(int, "id")], ())
+        storage.save(empty, self.path)
+        with storage.load(self.path) as loaded:
+            eq_(loaded.to_relation(),
+                empty,
+                "Empty relations should survive a round trip")
+
+    @property
+    def fractions(self):
+        return r.Relation([(fractions.Fraction, "f"), (object, "o")],
+                          values(("f", "o"), [
+                              (fractions.Fraction(1, 2), fractions.Fraction(1, 3)),
+                              (fractions.Fraction(3, 2), 1),
+                          ]))
+
+    @raises(exc.UntrustedFile)
+    def test_untrusted_domains(self):
+        storage.save(self.fractions, self.path)
+        storage.load(self.path)
+
+    @raises(exc.UntrustedFile)
+    def test_untrusted_values(self):
+        rel = r.Relation([(object, "o")],
+                         values(("o", ), [(fractions.Fraction(1, 3), ), (1, )]))
+        storage.save(rel, self.path)
+        with storage.load(self.path) as loaded:
+            loaded.column("o")
+
+    def test_trusted(self):
+        storage.save(self.fractions, self.path)
+        with storage.load(self.path, trusted=True) as loaded:
+            eq_(loaded.to_relation(),
+                self.fractions,
+                "Trusted files should be able to hold any picklable value")
+
+    def test_several_types(self):
+        rel = r.Relation([((int, str), "k")], values(("k", ), [(1, ), ("x", )]))
+        storage.save(rel, self.path)
+        with storage.load(self.path) as loaded:
+            eq_(loaded.attributes,
+                rel.attributes,
+                "Domains of several types should survive a round trip")
+            eq_(loaded.to_relation(), rel)
+
+    def test_select_reads_referenced(self):
+        storage.save(self.ex, self.path)
+        score = sympy.Symbol("score")
+        decoded = []
+        with storage.load(self.path) as loaded:
+            names = loaded.column("name")
+            decode = names._decode
+            names._decode = lambda v: decoded.append(decode(v)) or decoded[-1]
+            eq_(loaded.select(score > 2),
+                self.ex.select(score > 2),
+                "Selecting should agree with the original")
+        eq_(len(decoded), 1,
+            "Unreferenced columns should only be decoded for the selected rows")
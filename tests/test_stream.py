@@ -0,0 +1,127 @@
+"""Tests for streaming relations"""
+import datetime
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_, raises
+
+import rel.relation as r
+from rel import exc
+from rel import values
+from rel.stream import StreamRelation
+
+
+header = [(int, "id"), (str, "name"), (bool, "active")]
+
+class TestStream(object):
+    def setup_method(self, method=None):
+        self.directory = tempfile.mkdtemp()
+        self.csv = os.path.join(self.directory, "people.csv")
+        with open(self.csv, "w") as f:
+            f.write("name,id,active\n"
+                    "alice,1,true\n"
+                    "bob,2,false\n"
+                    "\n"
+                    "alice,3,true\n")
+
+        self.lines = os.path.join(self.directory, "people.txt")
+        with open(self.lines, "w") as f:
+            f.write("1 alice yes\n2 bob no\n")
+
+    def teardown_method(self, method=None):
+        shutil.rmtree(self.directory)
+
+    setup = setup_method
+    teardown = teardown_method
+
+    @property
+    def expected(self):
+        return r.Relation(header, values(("id", "name", "active"), [
+            (1, "alice", True),
+            (2, "bob", False),
+            (3, "alice", True),
+        ]))
+
+    def test_csv(self):
+        eq_(StreamRelation.from_csv(self.csv, header).materialize(),
+            self.expected,
+            "Fields should be parsed using the domains of the attributes")
+
+    def test_lines(self):
+        eq_(StreamRelation.from_lines(self.lines, header).materialize(),
+            self.expected.select(lambda t: t["id"] < 3),
+            "Lines should be split into fields in attribute order")
+
+    def test_pipeline(self):
+        stream = (StreamRelation.from_csv(self.csv, header)
+                  .select(lambda t: t["active"])
+                  .project(["name"])
+                  .rename({"name": "who"}))
+        eq_(len(list(stream)),
+            2,
+            "Stages should not remove duplicates on their own")
+        eq_(len(list(stream.distinct())),
+            1,
+            "The distinct stage should remove duplicates")
+        eq_(stream.materialize(),
+            self.expected.select(lambda t: t["active"])
+                         .project(["name"]).rename({"name": "who"}),
+            "Materializing should give the same relation as the eager operators")
+
+    def test_restartable(self):
+        stream = StreamRelation.from_csv(self.csv, header)
+        eq_(len(list(stream)),
+            len(list(stream)),
+            "A stream should be readable more than once")
+
+    @raises(exc.ValueOutsideDomain)
+    def test_outside_domain(self):
+        stream = StreamRelation.from_csv(self.csv, [(int, "name")])
+        list(stream)
+
+    @raises(exc.ValueOutsideDomain)
+    def test_validates_sources(self):
+        stream = StreamRelation(header, lambda: iter([
+            {"id": "1", "name": "alice", "active": True},
+        ]))
+        stream.materialize()
+
+    def test_unvalidated_stages(self):
+        stream = StreamRelation(header, lambda: iter([
+            {"id": 1, "name": "alice", "active": True},
+            {"id": 2, "name": 2, "active": False},
+        ]))
+        eq_(stream.select(lambda t: t["id"] < 2).materialize(),
+            self.expected.select(lambda t: t["id"] < 2),
+            "Stages of a stream should validate what's left of it")
+
+    def test_domains(self):
+        path = os.path.join(self.directory, "events.csv")
+        with open(path, "w") as f:
+            f.write("day,note,size\n"
+                    "2020-01-02,x,3\n"
+                    "2021-12-31,y,big\n")
+        attributes = [(datetime.date, "day"), (object, "note"), ((int, str), "size")]
+        eq_(StreamRelation.from_csv(path, attributes).materialize(),
+            r.Relation(attributes, values(("day", "note", "size"), [
+                (datetime.date(2020, 1, 2), "x", 3),
+                (datetime.date(2021, 12, 31), "y", "big"),
+            ])),
+            "Dates, objects and domains of several types should be parsed")
+
+    @raises(exc.ValueOutsideDomain)
+    def test_unparsable_domain(self):
+        class Point(object):
+            def __init__(self, x, y):
+                self.x, self.y = x, y
+
+        list(StreamRelation.from_lines(self.lines, [(Point, "p"), (str, "name"),
+                                                    (bool, "active")]))
+
+    def test_select_tautology(self):
+        stream = StreamRelation.from_csv(self.csv, header)
+        ok_(stream.select(1) is stream,
+            "Values equal to true should select the whole stream")
+        eq_(list(stream.select(0)), [],
+            "Values equal to false should select nothing")
@@ -0,0 +1,59 @@
+"""Tests for the tuple structures"""
+from nose.tools import eq_, ok_
+
+import rel.relation as r
+from rel import values, compact_values
+from rel.structure import Header, to_values_notation
+
+
+class TestPositionalTuple(object):
+    @property
+    def compact(self):
+        return list(compact_values(("b", "a"), [(1, 2), (3, 4)]))
+
+    @property
+    def mapping(self):
+        return list(values(("b", "a"), [(1, 2), (3, 4)]))
+
+    def test_compatible_with_mapping_tuple(self):
+        eq_(set(self.compact),
+            set(self.mapping),
+            """Positional tuples should hash and compare equal to the mapping
+            tuples with the same fields""")
+
+    def test_shared_header(self):
+        first, second = self.compact
+        ok_(first._header is second._header,
+            "Tuples with the same names should share a single header")
+        ok_(Header(("b", "a")) is first._header,
+            "Headers should be interned")
+
+    def test_getitem(self):
+        eq_(self.compact[0]["a"],
+            2,
+            "Values should be looked up by name")
+
+    def test_project_and_rename(self):
+        for (c, m) in zip(self.compact, self.mapping):
+            eq_(c.project(["a"]),
+                m.project(["a"]),
+                "Projecting should agree with mapping tuples")
+            eq_(c.rename({"a": "z"}),
+                m.rename({"a": "z"}),
+                "Renaming should agree with mapping tuples")
+
+    def test_rename_keeps_values(self):
+        t = self.compact[0]
+        ok_(t.rename({"a": "z"})._values is t._values,
+            "Renaming should only replace the header")
+
+    def test_values_notation(self):
+        eq_(to_values_notation(self.compact),
+            to_values_notation(self.mapping),
+            "The values notation should not depend on the representation")
+
+    def test_in_relation(self):
+        header = [(int, "a"), (int, "b")]
+        eq_(r.Relation(header, self.compact),
+            r.Relation(header, self.mapping),
+            "Relations should accept positional tuples")
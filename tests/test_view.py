@@ -0,0 +1,119 @@
+"""Tests for incrementally maintained views"""
+import random
+
+from nose.tools import eq_, ok_
+
+import sympy
+
+import rel.relation as r
+from rel import values
+from rel.view import Table
+
+
+def people(rows):
+    return r.Relation([(int, "id"), (str, "name"), (int, "dept")],
+                      values(("id", "name", "dept"), rows))
+
+
+def depts(rows):
+    return r.Relation([(int, "dept"), (str, "title")],
+                      values(("dept", "title"), rows))
+
+
+class TestView(object):
+    def setup_method(self):
+        self.people = Table(people([(1, "ann", 1), (2, "bob", 1), (3, "cy", 2)]))
+        self.depts = Table(depts([(1, "ops"), (2, "dev")]))
+
+    setup = setup_method
+
+    def test_select(self):
+        view = self.people.select(lambda t: t["dept"] == 1)
+        self.people.apply(inserted=[{"id": 4, "name": "di", "dept": 1}],
+                          deleted=[{"id": 1, "name": "ann", "dept": 1}])
+        eq_(view.relation,
+            people([(2, "bob", 1), (4, "di", 1)]),
+            "Selections should follow the changes of the table")
+
+    def test_select_sympy(self):
+        view = self.people.select(sympy.Symbol("id") > 2)
+        self.people.apply(inserted=[{"id": 5, "name": "ed", "dept": 2}])
+        eq_(view.relation, people([(3, "cy", 2), (5, "ed", 2)]),
+            "Inserted tuples should be selected by sympy expressions")
+
+    def test_select_tautology(self):
+        views = [self.people.select(None), self.people.select(True)]
+        self.people.apply(inserted=[{"id": 4, "name": "di", "dept": 1}])
+        for view in views:
+            eq_(view.relation, self.people.relation,
+                "Tautologies should select every tuple of the table")
+
+    def test_select_contradiction(self):
+        view = self.people.select(False)
+        self.people.apply(inserted=[{"id": 4, "name": "di", "dept": 1}])
+        eq_(view.relation, people([]),
+            "Contradictions should select no tuples at all")
+
+    def test_project_support(self):
+        view = self.people.project(["dept"])
+        delta = self.people.apply(deleted=[{"id": 1, "name": "ann", "dept": 1}])
+        eq_(len(delta.deleted), 1,
+            "Deleting a tuple from the table should be reported as a change")
+        eq_(len(view), 2,
+            "A projected tuple should stay while it is still supported")
+
+        self.people.apply(deleted=[{"id": 2, "name": "bob", "dept": 1}])
+        eq_(view.relation,
+            r.Relation([(int, "dept")], values(("dept", ), [(2, )])),
+            "A projected tuple should go once its support is gone")
+
+    def test_join(self):
+        view = self.people.join(self.depts)
+        self.depts.apply(inserted=[{"dept": 3, "title": "qa"}],
+                         deleted=[{"dept": 2, "title": "dev"}])
+        self.people.apply(inserted=[{"id": 4, "name": "di", "dept": 3}])
+        eq_(view.relation,
+            self.people.relation.join(self.depts.relation),
+            "Changes to either side should be reflected in the join")
+
+    def test_equi_join(self):
+        other = Table(r.Relation([(int, "key"), (str, "label")],
+                                 values(("key", "label"), [(1, "a"), (3, "c")])))
+        view = self.people.join(other, [("id", "key")])
+        self.people.apply(deleted=[{"id": 1, "name": "ann", "dept": 1}])
+        other.apply(inserted=[{"key": 2, "label": "b"}])
+        eq_(view.relation,
+            self.people.relation.equi_join(other.relation, [("id", "key")]),
+            "Changes to either side should be reflected in the equi-join")
+
+    def test_self_join(self):
+        view = self.people.join(self.people)
+        self.people.apply(inserted=[{"id": 4, "name": "di", "dept": 3}])
+        eq_(view.relation, self.people.relation,
+            "Joining a table with itself should give the table")
+
+    def test_unchanged(self):
+        view = self.people.project(["dept"])
+        delta = self.people.apply(inserted=[{"id": 1, "name": "ann", "dept": 1}],
+                                  deleted=[{"id": 9, "name": "zed", "dept": 9}])
+        ok_(not delta.inserted and not delta.deleted,
+            "Changes which don't change anything should be left out")
+        eq_(len(view), 2, "The view should be left as it was")
+
+    def test_random_changes(self):
+        rng = random.Random(14)
+        pool = [{"id": i, "name": "n{0}".format(i % 4), "dept": i % 3}
+                for i in range(30)]
+        table = Table(people([]))
+        other = Table(depts([(0, "a"), (1, "b")]))
+
+        selected = table.select(lambda t: t["id"] % 2 == 0)
+        chain = selected.project(["name", "dept"]).join(other)
+
+        for _ in range(20):
+            table.apply(inserted=rng.sample(pool, 5),
+                        deleted=rng.sample(pool, 5))
+            expected = (table.relation.select(lambda t: t["id"] % 2 == 0)
+                        .project(["name", "dept"]).join(other.relation))
+            eq_(chain.relation, expected,
+                "Views should agree with recomputing from scratch")